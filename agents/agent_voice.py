@@ -1,16 +1,14 @@
 import logging
 import numpy as np
 import os
+import sys
 import urllib.request
 from dotenv import load_dotenv
 import cv2
 import asyncio
 from livekit import rtc
-from livekit.rtc import VideoFrame
-from livekit.rtc import VideoBufferType
 from livekit.agents import (
     Agent,
-    AgentSession,
     JobContext,
     JobRequest,
     JobProcess,
@@ -21,10 +19,16 @@ from livekit.agents import (
     cli,
     metrics,
 )
-from livekit.agents.llm import function_tool
-from livekit.agents.voice import MetricsCollectedEvent
-from livekit.plugins import deepgram, openai, silero
-from livekit.plugins.turn_detector.english import EnglishModel
+from livekit.agents.llm import ChatMessage, function_tool
+from livekit.agents.voice import ConversationItemAddedEvent, MetricsCollectedEvent
+
+from artifacts.pipeline import artifact_sink, null_artifacts, supervise_artifact_writer
+from media.phrase_cache import phrase_cache
+from media.publisher import ScreenSharePublisher
+from pipeline_profiles import build_session, load_vads, profile_selector
+from idle_manager import IdleManager, idle_stats
+from tool_runner import filler_audio, tool_stats, with_filler
+from telemetry.logs import bind_session, overhead_stats, setup_logging
 
 # uncomment to enable Krisp background voice/noise cancellation
 # currently supported on Linux and MacOS
@@ -37,6 +41,7 @@ load_dotenv()
 AGENT_DISPLAY_NAME = "Suresh"
 TEST_VIDEO_URL = "https://commondatastorage.googleapis.com/gtv-videos-bucket/sample/BigBuckBunny.mp4"
 VIDEO_PATH = "agents/data/BigBuckBunny.mp4"
+GREETING = "Hey I'm Suresh, your real estate agent. How can I help you today?"
 
 
 class MyAgent(Agent):
@@ -45,11 +50,13 @@ class MyAgent(Agent):
             instructions="Your name is Suresh. You would interact with users via voice. with that in mind keep your responses concise and to the point. You are curious and friendly, and have a sense of humor. your job is to help the client find the right property and then share screen and play video of the property. ",
         )
         self.room = None 
-        self.screen_share_source = None
+        self.screen_share = None
         self.video_playing = False
         self.video_task = None
+        self.voice_key = None
+        self.artifacts = null_artifacts
     async def on_enter(self):
-        self.session.generate_reply(instructions="Hey I'm Suresh, your real estate agent. How can I help you today?")
+        phrase_cache.say(self.session, self.voice_key, GREETING)
   
     def _frame_to_argb(self, frame):
         frame_resized = cv2.resize(frame, (1280, 720))
@@ -73,16 +80,14 @@ class MyAgent(Agent):
         return os.path.abspath(local_path)
     
     @function_tool
+    @with_filler
     async def share_property_video(self):
         if self.room is None:
             return "Room not available"
         try:
-            self.screen_share_source = rtc.VideoSource(1280, 720)
-            track = rtc.LocalVideoTrack.create_video_track("property_video", self.screen_share_source)
-            await self.room.local_participant.publish_track(
-                track,
-                rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_SCREENSHARE)
-            )
+            await self.stop_media()
+            self.screen_share = ScreenSharePublisher(self.room, "property_video")
+            await self.screen_share.start()
 
             video_path = self.get_sample_video()  # Get video automatically
             self.video_playing = True
@@ -94,64 +99,74 @@ class MyAgent(Agent):
             return f"Failed to share screen: {str(e)}"
 
 
+    async def stop_media(self):
+        """Stop the video loop and unpublish the screen share"""
+        self.video_playing = False
+        if self.video_task is not None and not self.video_task.done():
+            # a loop paused for viewers would otherwise wait forever
+            self.video_task.cancel()
+        self.video_task = None
+        if self.screen_share is not None:
+            await self.screen_share.aclose()
+            self.screen_share = None
+
     async def _play_video(self, video_path: str):
+        if not os.path.exists(video_path):
+            logger.error(f"Video file does not exist: {video_path}")
+            return False
+        cap = cv2.VideoCapture(video_path)
+        if not cap.isOpened():
+            logger.error(f"Could not open video file: {video_path}")
+            return False
         try:
-            if not os.path.exists(video_path):
-                logger.error(f"Video file does not exist: {video_path}")
-                return False
-            cap = cv2.VideoCapture(video_path)
-            if not cap.isOpened():
-                logger.error(f"Could not open video file: {video_path}")
-                return False
-            fps = cap.get(cv2.CAP_PROP_FPS)
-            frame_delay = 1.0 / fps if fps > 0 else 1.0 / 30
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            publisher = self.screen_share
             self.video_playing = True
             logger.info(f"Starting video playback at {fps} fps")
             while self.video_playing:
+                await publisher.wait_until_watched()
+                # Skip the frames a lower output rate would drop instead of decoding them
+                for _ in range(max(1, round(fps * publisher.frame_interval(fps))) - 1):
+                    cap.grab()
                 ret, frame = cap.read()
                 if not ret:
                     cap.set(cv2.CAP_PROP_POS_FRAMES, 0)  # Loop video
                     continue
-                frame_resized = cv2.resize(frame, (1280, 720))
-                frame_rgb = cv2.cvtColor(frame_resized, cv2.COLOR_BGR2RGB)
-                frame_bytes = frame_rgb.tobytes()
-                video_frame = VideoFrame(
-                    width=1280,
-                    height=720,
-                    type=VideoBufferType.RGB24,  # instead of proto_video.VideoBufferType.RGB24
-                    data=frame_bytes
-                )
-                if self.screen_share_source:
-                    self.screen_share_source.capture_frame(video_frame)
-                await asyncio.sleep(frame_delay)
-            cap.release()
+                level = publisher.level
+                frame_rgb = cv2.cvtColor(cv2.resize(frame, (level.width, level.height)), cv2.COLOR_BGR2RGB)
+                publisher.capture(frame_rgb)
+                await asyncio.sleep(publisher.frame_interval(fps))
             logger.info("Video playback stopped")
             return True
 
         except Exception as e:
             logger.error(f"Error playing video: {e}")
             return False
+        finally:
+            cap.release()
 
 
 
 def prewarm(proc: JobProcess):
-    proc.userdata["vad"] = silero.VAD.load()
+    setup_logging()
+    load_vads(proc.userdata)
 
 
 async def entrypoint(ctx: JobContext):
     await ctx.connect()
+    bind_session(ctx.room.name)
     logger.info(f"Context: {ctx}")
     logger.info(f"Room Beep Boop: {ctx.room}")
     
     
-    session = AgentSession(
-
-        vad=ctx.proc.userdata["vad"],
-        llm=openai.LLM(model="gpt-4o-mini"),
-        stt=deepgram.STT(model="nova-3"),
-        tts=openai.TTS(voice="alloy"),
-        turn_detection=EnglishModel(),
-    )
+    profile = profile_selector.select()
+    logger.info(f"Using pipeline profile: {profile.name}")
+    session = build_session(profile, ctx.proc.userdata)
+    voice_key = f"{profile.tts_model}:{profile.tts_voice}"
+    # synthesized while we wait for the user, if no earlier session stored it
+    phrase_cache.warm(voice_key, session.tts, [GREETING])
+    artifacts = artifact_sink.session(ctx.room.name)
+    artifacts.emit("session_start", agent="agent-voice", profile=profile.name)
 
     usage_collector = metrics.UsageCollector()
 
@@ -159,17 +174,36 @@ async def entrypoint(ctx: JobContext):
     def _on_metrics_collected(ev: MetricsCollectedEvent):
         metrics.log_metrics(ev.metrics)
         usage_collector.collect(ev.metrics)
+        profile_selector.observe(ev.metrics)
+        artifacts.emit("metrics", metrics=ev.metrics)
 
     async def log_usage():
         summary = usage_collector.get_summary()
         logger.info(f"Usage: {summary}")
+        profile_selector.flush()
+        logger.info(f"Pipeline profiles: {profile_selector.stats()}")
+        logger.info(f"Tool latency: {tool_stats()}")
+        logger.info(f"Log overhead: {overhead_stats()}")
+        logger.info(f"Phrase cache: {phrase_cache.stats()}")
+        artifacts.emit("session_end")
+        await artifact_sink.aclose()
+        logger.info(f"Session artifacts: {artifact_sink.stats()}")
+        logger.info(f"Idle reclamation: {idle_stats()}")
 
     ctx.add_shutdown_callback(log_usage)
 
+    @session.on("conversation_item_added")
+    def _on_conversation_item_added(ev: ConversationItemAddedEvent):
+        if isinstance(ev.item, ChatMessage):
+            artifacts.emit("transcript", role=ev.item.role, text=ev.item.text_content)
+
     await ctx.wait_for_participant()
 
     agent = MyAgent()
     agent.room = ctx.room
+    agent.artifacts = artifacts
+    agent.voice_key = voice_key
+    filler_audio.warm(agent.voice_key, session.tts)
     
     await session.start(
         agent=agent,
@@ -179,12 +213,24 @@ async def entrypoint(ctx: JobContext):
         room_output_options=RoomOutputOptions(transcription_enabled=True),
     )
 
+    idle = IdleManager(ctx, session, agent)
+
+    async def stop_idle_manager():
+        idle.stop()
+        await agent.stop_media()
+
+    ctx.add_shutdown_callback(stop_idle_manager)
+    idle.start()
+
 async def request_fnc(req: JobRequest):
     await req.accept(
         name=AGENT_DISPLAY_NAME,
     )
 
 if __name__ == "__main__":
+    # only a worker that runs jobs needs the host's writer, not e.g. download-files at build time
+    if sys.argv[1:2] in (["start"], ["dev"]):
+        supervise_artifact_writer()
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
@@ -0,0 +1,394 @@
+"""
+Session artifacts (transcripts, tool calls, slides, timings) for offline analytics
+
+    python -m artifacts.pipeline writer                  # run the host's writer by hand
+    python -m artifacts.pipeline bench --events 20000    # per-event cost on the caller
+
+Agents hand events to a bounded in-process queue and never wait on it; a
+drain thread batches them to the host's writer process, which writes
+compressed files partitioned by day under SESSION_ARTIFACT_DIR. Parquet
+(zstd) is used when pyarrow is installed, gzipped JSONL otherwise.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from shared_cache import ipc
+
+logger = logging.getLogger("session-artifacts")
+
+ARTIFACT_DIR = os.environ.get("SESSION_ARTIFACT_DIR")
+QUEUE_SIZE = int(os.environ.get("SESSION_ARTIFACT_QUEUE_SIZE", "10000"))
+# What emit() may cost the event loop per event, on average
+OVERHEAD_BUDGET_US = float(os.environ.get("SESSION_ARTIFACT_OVERHEAD_BUDGET_US", "20"))
+BATCH_SIZE = 500
+SEND_INTERVAL = 1.0
+RETRY_CONNECT_AFTER = 10.0
+# How long a finishing job waits for its queued events to reach the writer
+CLOSE_TIMEOUT = float(os.environ.get("SESSION_ARTIFACT_CLOSE_TIMEOUT", "2"))
+# How long the drain thread waits for the writer to acknowledge a batch
+ACK_TIMEOUT = 5.0
+WRITE_INTERVAL = float(os.environ.get("SESSION_ARTIFACT_WRITE_INTERVAL", "30"))
+ROWS_PER_FILE = 50000
+
+
+def _load_parquet_writer():
+    """Return a rows -> parquet file writer, or None to fall back to JSONL"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except Exception as e:
+        logger.warning(f"pyarrow unavailable ({e}), writing session artifacts as gzipped JSONL")
+        return None
+
+    def write(path: str, rows: List[Dict[str, Any]]):
+        table = pa.Table.from_pylist(rows)
+        pq.write_table(table, path, compression="zstd")
+
+    return write
+
+
+def _plain(value: Any) -> Any:
+    """Metrics and other pydantic objects become dicts before they cross processes"""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    return value
+
+
+class ArtifactSink:
+    """
+    Per-process producer side
+
+    emit() only timestamps the event and puts it on a bounded queue; when
+    the queue is full the event is dropped and counted. Serializing and
+    sending happen on the drain thread, which a job delivers the rest to
+    with aclose() before it exits. A batch counts as delivered once the
+    writer acknowledges it holds the rows, which it keeps through SIGTERM. Off unless SESSION_ARTIFACT_DIR
+    is set, in which case emit() returns immediately.
+    """
+
+    def __init__(self, artifact_dir: Optional[str] = ARTIFACT_DIR, queue_size: int = QUEUE_SIZE):
+        self.artifact_dir = artifact_dir
+        self.enabled = bool(artifact_dir)
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._closing = threading.Event()
+        self._conn = None
+        self._conn_failed_at = 0.0
+        self.emitted = 0
+        self.dropped = 0
+        self.undelivered = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def emit(self, session_id: str, kind: str, fields: Dict[str, Any]):
+        if not self.enabled:
+            return
+        start = time.perf_counter_ns()
+        try:
+            self._queue.put_nowait((time.time(), session_id, kind, fields))
+        except queue.Full:
+            self.dropped += 1
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._drain, name="session-artifacts", daemon=True)
+            self._thread.start()
+        elapsed = time.perf_counter_ns() - start
+        self.total_ns += elapsed
+        self.max_ns = max(self.max_ns, elapsed)
+        self.emitted += 1
+
+    def session(self, session_id: str) -> "SessionArtifacts":
+        return SessionArtifacts(self, session_id)
+
+    def close(self, timeout: float = CLOSE_TIMEOUT) -> bool:
+        """Deliver what is still queued, waiting at most timeout; True if it all went out"""
+        if self._thread is None:
+            return True
+        self._closing.set()
+        try:
+            # wakes the drain thread; a full queue wakes it anyway
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            logger.warning(f"Gave up on {self._queue.qsize()} queued session artifacts after {timeout}s")
+            return False
+        return True
+
+    async def aclose(self, timeout: float = CLOSE_TIMEOUT) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(None, self.close, timeout)
+
+    def _drain(self):
+        while not (self._closing.is_set() and self._queue.empty()):
+            batch = self._next_batch()
+            if not batch:
+                continue
+            try:
+                rows = [
+                    {"ts": ts, "session_id": session_id, "kind": kind,
+                     "data": {key: _plain(value) for key, value in fields.items()}}
+                    for ts, session_id, kind, fields in batch
+                ]
+                if not self._send(rows):
+                    self.undelivered += len(rows)
+            except Exception as e:
+                # one bad event must not stop delivery for the rest of the job
+                logger.error(f"Could not deliver {len(batch)} session artifacts: {e}")
+                self.undelivered += len(batch)
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + SEND_INTERVAL
+        while len(batch) < BATCH_SIZE:
+            # when closing, take what is queued without waiting for more
+            timeout = 0 if self._closing.is_set() else deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return [event for event in batch if event is not None]
+
+    def _send(self, rows: List[Dict[str, Any]]) -> bool:
+        if self._conn is None:
+            if time.monotonic() - self._conn_failed_at < RETRY_CONNECT_AFTER:
+                return False
+            try:
+                self._conn = ipc.connect(self.artifact_dir)
+            except OSError:
+                self._conn_failed_at = time.monotonic()
+                return False
+        try:
+            self._conn.send(rows)
+            if not self._conn.poll(ACK_TIMEOUT):
+                raise TimeoutError(f"no acknowledgement within {ACK_TIMEOUT}s")
+            self._conn.recv()
+            return True
+        except (OSError, EOFError) as e:
+            logger.warning(f"Could not send session artifacts: {e}")
+            self._conn.close()
+            self._conn = None
+            self._conn_failed_at = time.monotonic()
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        avg_us = self.total_ns / self.emitted / 1e3 if self.emitted else 0.0
+        return {
+            "events": self.emitted,
+            "dropped": self.dropped,
+            "undelivered": self.undelivered,
+            "avg_us": round(avg_us, 2),
+            "max_us": round(self.max_ns / 1e3, 2),
+            "within_budget": avg_us <= OVERHEAD_BUDGET_US,
+        }
+
+
+class SessionArtifacts:
+    """One session's handle on the sink"""
+
+    __slots__ = ("sink", "session_id")
+
+    def __init__(self, sink: ArtifactSink, session_id: str):
+        self.sink = sink
+        self.session_id = session_id
+
+    def emit(self, kind: str, **fields):
+        self.sink.emit(self.session_id, kind, fields)
+
+
+class ArtifactWriter:
+    """The single process on the host that turns event batches into files"""
+
+    def __init__(self, artifact_dir: str, authkey: Optional[bytes] = None):
+        self.artifact_dir = artifact_dir
+        self.authkey = authkey
+        self._rows: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        # held while rows taken from the buffer are on their way to a file
+        self._write_lock = threading.Lock()
+        self._write_parquet = _load_parquet_writer()
+        self._seq = 0
+        self.files = 0
+        self.rows_written = 0
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    rows = conn.recv()
+                except (EOFError, OSError):
+                    return
+                with self._lock:
+                    self._rows.extend(rows)
+                    full = len(self._rows) >= ROWS_PER_FILE
+                try:
+                    # the sink counts the batch as delivered only after this
+                    conn.send(len(rows))
+                except OSError:
+                    return
+                if full:
+                    self.flush()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                rows, self._rows = self._rows, []
+            if rows:
+                self._write(rows)
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        for row in rows:
+            # one schema for every kind of event, so analytics can read all days at once
+            row["data"] = json.dumps(row["data"], default=str)
+        now = datetime.now(timezone.utc)
+        day_dir = os.path.join(self.artifact_dir, f"date={now:%Y-%m-%d}")
+        os.makedirs(day_dir, exist_ok=True)
+        self._seq += 1
+        stem = os.path.join(day_dir, f"part-{now:%H%M%S}-{os.getpid()}-{self._seq}")
+        try:
+            if self._write_parquet is not None:
+                path = f"{stem}.parquet"
+                self._write_parquet(f"{path}.tmp", rows)
+            else:
+                path = f"{stem}.jsonl.gz"
+                with gzip.open(f"{path}.tmp", "wt", encoding="utf-8") as f:
+                    for row in rows:
+                        f.write(json.dumps(row) + "\n")
+            os.replace(f"{path}.tmp", path)
+        except Exception as e:
+            logger.error(f"Could not write {len(rows)} session artifacts: {e}")
+            return
+        self.files += 1
+        self.rows_written += len(rows)
+        logger.info(f"Wrote {len(rows)} session artifacts to {path}")
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(WRITE_INTERVAL)
+            self.flush()
+
+    def serve_forever(self):
+        if not ipc.claim(self.artifact_dir):
+            logger.info("Another session artifact writer owns this host's artifacts")
+            return
+        os.makedirs(self.artifact_dir, exist_ok=True)
+        authkey = self.authkey or ipc.create_authkey(self.artifact_dir)
+        threading.Thread(target=self._flush_periodically, daemon=True).start()
+        logger.info(f"Session artifact writer serving {self.artifact_dir}")
+        with ipc.listen(self.artifact_dir, authkey) as listener:
+            while True:
+                conn = ipc.accept(listener)
+                if conn is None:
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+def _run_writer(artifact_dir: str, authkey: bytes):
+    writer = ArtifactWriter(artifact_dir, authkey)
+
+    def _flush_and_exit(signum, frame):
+        writer.flush()
+        os._exit(0)
+
+    # the worker terminates its daemon children on exit; keep what was
+    # acknowledged, after any write already in progress on another thread
+    signal.signal(signal.SIGTERM, _flush_and_exit)
+    writer.serve_forever()
+
+
+def start_artifact_writer(artifact_dir: Optional[str] = ARTIFACT_DIR) -> Optional[multiprocessing.Process]:
+    """Start the host's writer process unless recording is off or one is already running"""
+    if not artifact_dir:
+        return None
+    if ipc.running(artifact_dir):
+        logger.debug("Session artifact writer already running on this host")
+        return None
+    authkey = ipc.create_authkey(artifact_dir)
+    process = multiprocessing.Process(
+        target=_run_writer, args=(artifact_dir, authkey), name="session-artifact-writer", daemon=True
+    )
+    process.start()
+    return process
+
+
+def supervise_artifact_writer(artifact_dir: Optional[str] = ARTIFACT_DIR):
+    """Keep the host's writer running from this worker, whichever worker's child it is"""
+    if artifact_dir:
+        ipc.supervise(lambda: start_artifact_writer(artifact_dir), "session-artifact-writer")
+
+
+def bench(artifact_dir: str, events: int, rate: float) -> Dict[str, Any]:
+    """Per-event emit() cost with a live writer at `rate` events/s, against OVERHEAD_BUDGET_US"""
+    process = start_artifact_writer(artifact_dir)
+    for _ in range(50):
+        if ipc.running(artifact_dir):
+            break
+        time.sleep(0.1)
+    sink = ArtifactSink(artifact_dir)
+    artifacts = sink.session("bench")
+    samples = np.empty(events)
+    started = time.perf_counter()
+    for i in range(events):
+        start = time.perf_counter_ns()
+        artifacts.emit("transcript", role="user", text="how big is the backyard", turn=i)
+        samples[i] = time.perf_counter_ns() - start
+        ahead = started + (i + 1) / rate - time.perf_counter()
+        if ahead > 0:
+            time.sleep(ahead)
+    sink.close(timeout=30)
+    if process is not None:
+        process.terminate()
+        process.join()
+    stats = sink.stats()
+    return {
+        "events": events,
+        "p50_us": round(float(np.percentile(samples, 50)) / 1e3, 2),
+        "p99_us": round(float(np.percentile(samples, 99)) / 1e3, 2),
+        "avg_us": stats["avg_us"],
+        "dropped": stats["dropped"],
+        "undelivered": sink.undelivered,
+        "budget_us": OVERHEAD_BUDGET_US,
+        "within_budget": stats["within_budget"],
+    }
+
+
+# One per job process
+artifact_sink = ArtifactSink()
+null_artifacts = SessionArtifacts(ArtifactSink(artifact_dir=None), "none")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    writer_parser = sub.add_parser("writer", help="run the host's artifact writer")
+    writer_parser.add_argument("--dir", default=ARTIFACT_DIR, required=ARTIFACT_DIR is None)
+
+    bench_parser = sub.add_parser("bench", help="measure the per-event cost of emit()")
+    bench_parser.add_argument("--dir", default=ARTIFACT_DIR, required=ARTIFACT_DIR is None)
+    bench_parser.add_argument("--events", type=int, default=20000)
+    # a busy session emits tens of events a second; this is a whole host's worth
+    bench_parser.add_argument("--rate", type=float, default=2000)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "writer":
+        ArtifactWriter(args.dir).serve_forever()
+    else:
+        print(json.dumps(bench(args.dir, args.events, args.rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
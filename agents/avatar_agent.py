@@ -0,0 +1,247 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+from PIL import Image
+
+from livekit import rtc
+from livekit.agents import (
+    Agent,
+    AgentSession,
+    JobContext,
+    JobProcess,
+    JobRequest,
+    RoomOutputOptions,
+    WorkerOptions,
+    WorkerType,
+    cli,
+)
+from livekit.plugins import anam, bey, cartesia, deepgram, hedra, openai, silero
+from livekit.plugins.turn_detector.english import EnglishModel
+
+from media.phrase_cache import phrase_cache
+from telemetry.logs import bind_session, overhead_stats, setup_logging
+from telemetry.stage_stats import StageLatencyStats
+
+logger = logging.getLogger("avatar-agent")
+logger.setLevel(logging.INFO)
+
+load_dotenv()
+
+DEFAULT_PROVIDER = os.getenv("AVATAR_PROVIDER", "bey")
+HEDRA_IMAGE_PATH = os.path.join(os.path.dirname(__file__), "avatar_hedra_image.jpg")
+
+# Each job process runs one session, so timings go to the host-wide stage stats
+avatar_stats = StageLatencyStats()
+FIRST_FRAME_STAGE = "avatar_first_frame"
+PREWARM_STAGE = "avatar_prewarm"
+
+
+class AvatarSetup:
+    def __init__(self, session, avatar, avatar_identity, agent, greeting, output_options, voice_key: Optional[str] = None):
+        self.session = session
+        self.avatar = avatar
+        self.avatar_identity = avatar_identity
+        self.agent = agent
+        # a fixed line spoken from the phrase cache when there is a voice_key,
+        # otherwise instructions for a generated reply (realtime models have no TTS)
+        self.greeting = greeting
+        self.output_options = output_options
+        self.voice_key = voice_key
+
+
+BEY_VOICE = "729651dc-c6c3-4ee5-97fa-350da1f88600"
+
+
+def _start_bey(ctx: JobContext, proc: JobProcess, metadata: Dict[str, Any]):
+    session = AgentSession(
+        vad=proc.userdata["vad"],
+        llm=openai.LLM(model="gpt-4.1"),
+        stt=deepgram.STT(model="nova-3", language="en-US"),
+        tts=cartesia.TTS(voice=BEY_VOICE),
+        turn_detection=proc.userdata["turn_detector"],
+        max_tool_steps=10,
+    )
+    avatar = bey.AvatarSession(
+        avatar_id=metadata.get("avatarId") or os.getenv("BEY_AVATAR_ID", "b9be11b8-89fb-4227-8f86-4a881393cbdb"),
+        avatar_participant_name="Michael",
+        avatar_participant_identity="bey-avatar-agent",
+    )
+    return AvatarSetup(
+        session,
+        avatar,
+        "bey-avatar-agent",
+        Agent(instructions="Talk to me!"),
+        "Hey I'm Michael, how can I help you today?",
+        # audio is forwarded to the avatar, so we disable room audio output
+        RoomOutputOptions(audio_enabled=False),
+        voice_key=f"cartesia:{BEY_VOICE}",
+    )
+
+
+def _start_hedra(ctx: JobContext, proc: JobProcess, metadata: Dict[str, Any]):
+    session = AgentSession(
+        llm=openai.realtime.RealtimeModel(voice="ash"),
+    )
+    avatar = hedra.AvatarSession(
+        avatar_image=proc.userdata["hedra_image"],
+        avatar_participant_name="Garth Algar",
+        avatar_participant_identity="hedra-avatar-agent",
+    )
+    return AvatarSetup(
+        session,
+        avatar,
+        "hedra-avatar-agent",
+        Agent(instructions="Your name is Garth Algar, a character from the movie Wayne's World. You are a funny and charismatic character. You are also a bit of a nerd."),
+        "say in english, 'Sometimes I wish I could boldly go where no man has gone before... but I'll probably stay in Aurora.'",
+        RoomOutputOptions(),
+    )
+
+
+def _start_anam(ctx: JobContext, proc: JobProcess, metadata: Dict[str, Any]):
+    anam_api_key = os.getenv("ANAM_API_KEY")
+    if not anam_api_key:
+        raise ValueError("ANAM_API_KEY is not set")
+
+    anam_avatar_id = metadata.get("avatarId") or os.getenv("ANAM_AVATAR_ID")
+    if not anam_avatar_id:
+        raise ValueError("ANAM_AVATAR_ID is not set")
+
+    session = AgentSession(
+        llm=openai.realtime.RealtimeModel(voice="coral"),
+    )
+    avatar = anam.AvatarSession(
+        persona_config=anam.PersonaConfig(
+            name="avatar",
+            avatarId=anam_avatar_id,
+        ),
+        api_key=anam_api_key,
+        avatar_participant_name="Mia",
+        avatar_participant_identity="anam-avatar-agent",
+    )
+    return AvatarSetup(
+        session,
+        avatar,
+        "anam-avatar-agent",
+        Agent(instructions="Your name is Mia. Your are a friendly and helpful assistant. Keep your responses short and concise in English."),
+        "say hello to the user in English",
+        RoomOutputOptions(),
+    )
+
+
+AVATAR_PROVIDERS: Dict[str, Callable] = {
+    "bey": _start_bey,
+    "hedra": _start_hedra,
+    "anam": _start_anam,
+}
+
+
+def _watch_first_avatar_frame(ctx: JobContext, provider: str, avatar_identity: str, started_at: float):
+    """Record the time from job start until the first video frame arrives from the avatar"""
+
+    async def _first_frame(track: rtc.Track):
+        stream = rtc.VideoStream(track)
+        try:
+            async for _ in stream:
+                elapsed = time.perf_counter() - started_at
+                avatar_stats.add(f"{FIRST_FRAME_STAGE}:{provider}", elapsed)
+                logger.info(
+                    f"First avatar frame after {elapsed * 1000:.0f} ms",
+                    extra={"avatar_first_frame_ms": round(elapsed * 1000, 1), "provider": provider},
+                )
+                break
+        finally:
+            await stream.aclose()
+
+    def _on_subscribed(track: rtc.Track, publication: rtc.RemoteTrackPublication, participant: rtc.RemoteParticipant):
+        if participant.identity != avatar_identity or track.kind != rtc.TrackKind.KIND_VIDEO:
+            return
+        ctx.room.off("track_subscribed", _on_subscribed)
+        asyncio.create_task(_first_frame(track))
+
+    ctx.room.on("track_subscribed", _on_subscribed)
+
+
+async def entrypoint(ctx: JobContext):
+    started_at = time.perf_counter()
+    await ctx.connect()
+    bind_session(ctx.room.name)
+
+    metadata: Dict[str, Any] = {}
+    if ctx.job.metadata:
+        try:
+            metadata = json.loads(ctx.job.metadata)
+        except ValueError:
+            logger.warning("Job metadata is not JSON, using default avatar provider")
+
+    provider = (metadata.get("avatarProvider") or DEFAULT_PROVIDER).lower()
+    start_provider = AVATAR_PROVIDERS.get(provider)
+    if start_provider is None:
+        raise ValueError(f"Unknown avatar provider: {provider}")
+
+    setup = start_provider(ctx, ctx.proc, metadata)
+    _watch_first_avatar_frame(ctx, provider, setup.avatar_identity, started_at)
+    if setup.voice_key:
+        # synthesized while the avatar starts, if no earlier session stored it
+        phrase_cache.warm(setup.voice_key, setup.session.tts, [setup.greeting])
+
+    await setup.avatar.start(setup.session, room=ctx.room)
+
+    # start the agent, it will join the room and wait for the avatar to join
+    await setup.session.start(
+        agent=setup.agent,
+        room=ctx.room,
+        room_output_options=setup.output_options,
+    )
+    if setup.voice_key:
+        phrase_cache.say(setup.session, setup.voice_key, setup.greeting)
+    else:
+        setup.session.generate_reply(instructions=setup.greeting)
+
+    async def log_metrics():
+        avatar_stats.flush()
+        host_p95 = {
+            stage: round(seconds, 3)
+            for stage, seconds in avatar_stats.percentiles(95).items()
+            if stage.startswith("avatar_")
+        }
+        logger.info(f"Avatar timings p95 on this host ({provider}): {host_p95}")
+        logger.info(f"Phrase cache: {phrase_cache.stats()}")
+        logger.info(f"Log overhead: {overhead_stats()}")
+
+    ctx.add_shutdown_callback(log_metrics)
+
+
+def prewarm(proc: JobProcess):
+    setup_logging()
+    started_at = time.perf_counter()
+    proc.userdata["vad"] = silero.VAD.load()
+    proc.userdata["turn_detector"] = EnglishModel()
+
+    avatar_image = Image.open(HEDRA_IMAGE_PATH)
+    avatar_image.load()
+    proc.userdata["hedra_image"] = avatar_image
+
+    avatar_stats.add(PREWARM_STAGE, time.perf_counter() - started_at)
+
+
+async def request_fnc(req: JobRequest):
+    await req.accept(
+        attributes={"agentType": "avatar"},
+    )
+
+
+if __name__ == "__main__":
+    cli.run_app(
+        WorkerOptions(
+            entrypoint_fnc=entrypoint,
+            worker_type=WorkerType.ROOM,
+            prewarm_fnc=prewarm,
+            request_fnc=request_fnc,
+            agent_name="livekit-agent" # used to request the agent
+        )
+    )
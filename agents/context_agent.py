@@ -1,39 +1,59 @@
 import logging
 import asyncio
 import os
+import sys
 from typing import Any, Dict, List, Optional
 from PIL import Image   
 import requests
 from io import BytesIO
-import asyncpg
 import cv2
 import numpy as np
 from dotenv import load_dotenv
-from livekit.rtc import VideoFrame
-from livekit.rtc import VideoBufferType
 from livekit.agents import (
     Agent,
-    RunContext,
     JobProcess,
     JobRequest,
     JobContext,
-    AgentSession,
     RoomInputOptions,
     RoomOutputOptions,
     cli,
     WorkerOptions,
     function_tool,
+    llm,
 )
-from livekit import rtc
-from livekit.plugins import silero, deepgram, openai
-from livekit.plugins.turn_detector.english import EnglishModel
-from pinecone import Pinecone, ServerlessSpec
-from langchain_pinecone import PineconeEmbeddings, PineconeVectorStore
+from pinecone import Pinecone
+from langchain_pinecone import PineconeVectorStore
 from langchain_openai import OpenAIEmbeddings
+from database.db import db
+from database.listing_notify import supervise_listing_relay
+from media.phrase_cache import phrase_cache
+from media.publisher import ScreenSharePublisher
+from media.image_index import image_index
+from media.walkthrough import walkthrough_cache
+from rag.context_packer import context_packer, normalize_query, pack_sentences
+from rag.answer_cache import answer_cache
+from rag.embedding_store import embedding_store
+from rag.query_planner import merge_results, split_query
+from memory.conversation import ConversationMemory
+from idle_manager import IdleManager, idle_stats
+from tool_runner import filler_audio, tool_stats, with_filler
+from telemetry.logs import bind_session, overhead_stats, setup_logging
+from pipeline_profiles import build_session, load_vads, profile_selector
+from resilience.guard import (
+    DependencyUnavailable,
+    embeddings_guard,
+    guard_stats,
+    pinecone_guard,
+)
+from artifacts.pipeline import artifact_sink, null_artifacts, supervise_artifact_writer
+from replay.recorder import MEDIA, RETRIEVAL, TOOL, SessionRecorder, bind_recorder, null_recorder
+from shared_cache.cache import EMBEDDINGS, FRAMES, shared_cache, supervise_cache_writer
 
 logger = logging.getLogger("context-agent")
 load_dotenv()
 agent_display_name = "context_agent"
+EMBEDDING_MODEL = "text-embedding-3-small"
+PINECONE_INDEX_NAME = "web-scraper-index-three"
 
 # Updated aggressive real estate agent prompt
 REAL_ESTATE_AGGRESSIVE_SELLER_PROMPT = "Your name is Suresh. You are a real estate agent. You are aggressive and pushy. You are a bit of a nerd. You are curious and friendly, and have a sense of humor. your job is to aggressively sell the property to the client.Also you have ability to share screens and play videos of the property. Also you should be asking if you want a video tour of the same."
@@ -47,8 +67,45 @@ class JobMetadata:
         self.screen_share_source = None
 
 
+# The name is spoken as its own short line so the rest can come from the phrase cache
+GREETING_NAME = "Hey {name}!"
+GREETING = "I'm Suresh, your real estate agent, and I'm here to get you into the PERFECT property TODAY! Don't let this market slip away from you - I've got some incredible listings that won't last long. Tell me what you're looking for and let's make this happen!"
+
+IMAGE_TOOL = "share_screen_and_show_home_images"
+VIDEO_TOOL = "share_screen_and_play_home_video"
+IMAGE_SEARCH_TOOL = "share_screen_and_show_matching_images"
+
+
+def _media_instructions(media_info: Optional[Dict[str, Any]]) -> str:
+    if media_info is None:
+        return ""
+    image_count = media_info.get('image_count', 0)
+    video_count = media_info.get('video_count', 0)
+    if not image_count and not video_count:
+        return " This property has no photos or videos, so do not offer a visual or video tour."
+    return f" This property has {image_count} photos and {video_count} videos you can share on screen."
+
+
+async def _listing_images(content_id: str) -> List[Dict[str, Any]]:
+    """
+    The listing's photos as they are shown, without the ones the index marks as repeats
+
+    The walkthrough cache keys clips by this list, so the pre-render, the
+    photo tour and room matching must all start from it.
+    """
+    return image_index.dedupe(content_id, await db.get_images_for_content(content_id))
+
+
+def _read_frame_at_rate(cap, source_fps: float, interval: float):
+    """Read the next frame to show, skipping the ones a lower output fps drops"""
+    for _ in range(max(1, round(source_fps * interval)) - 1):
+        if not cap.grab():
+            return False, None
+    return cap.read()
+
+
 class ContextAgent(Agent):
-    def __init__(self, vector_store=None, job_metadata=None) -> None:
+    def __init__(self, vector_store=None, job_metadata=None, media_info=None) -> None:
         user_name = "there"
         content_name = "there"
         price = "there"
@@ -60,133 +117,164 @@ class ContextAgent(Agent):
             description = job_metadata.get('description', 'there')
         
         super().__init__(
-            instructions=f"{REAL_ESTATE_AGGRESSIVE_SELLER_PROMPT}, The users name is {user_name}, the name of the property is {content_name}, the price of the property is {price}, the description of the property is {description}"
+            instructions=f"{REAL_ESTATE_AGGRESSIVE_SELLER_PROMPT}, The users name is {user_name}, the name of the property is {content_name}, the price of the property is {price}, the description of the property is {description}.{_media_instructions(media_info)}"
         )
         self.vector_store = vector_store
         self.job_metadata = job_metadata
+        self.greeting_name = GREETING_NAME.format(name=user_name)
+        self.voice_key = None
         self.embeddings = None
-        self.db_pool = None
+        self.memory = ConversationMemory()
+        self.listing_version = None
+        self.pinecone_index = None
+        self.recorder = null_recorder
+        self.artifacts = null_artifacts
+        # None means the lookup failed, in which case every tool stays available
+        self.media_info = media_info
+        if media_info:
+            self._set_listing_version(media_info)
+            self.memory.pin("photos", media_info.get('image_count', 0))
+            self.memory.pin("videos", media_info.get('video_count', 0))
+            photo_contents = image_index.summary(media_info['id'])
+            if photo_contents:
+                self.memory.pin("photos show", photo_contents)
+        self.video_playing = False
+        self.image_playing = False
+        self.video_task = None
+        self.image_task = None
+        self.screen_share = None
         self._initialize_embeddings()
 
+    def _listing_key(self) -> str:
+        if self.job_metadata and isinstance(self.job_metadata, dict):
+            return self.job_metadata.get('contentId') or self.job_metadata.get('url') or ""
+        return ""
+
+    async def _get_listing_version(self) -> Optional[str]:
+        """Listing updatedAt, looked up once per session to key the answer cache and check the local store"""
+        if self.listing_version is not None:
+            return self.listing_version or None
+        self.listing_version = ""
+        content_id = self.job_metadata.get('contentId') if isinstance(self.job_metadata, dict) else None
+        if not content_id:
+            return None
+        try:
+            content_info = await self._get_scraped_content_with_media_info(content_id)
+        except DependencyUnavailable as e:
+            logger.warning(f"Listing version unavailable: {e}")
+            return None
+        if not content_info:
+            return None
+        self._set_listing_version(content_info)
+        return self.listing_version
+
+    def _set_listing_version(self, content_info: Dict[str, Any]):
+        """Key the session's caches to this listing row and seed the answers it holds directly"""
+        self.listing_version = content_info['updatedAt'].isoformat()
+        if content_info.get('price'):
+            answer_cache.put_canonical(
+                content_info['id'], self.listing_version, "price", f"The asking price is {content_info['price']}."
+            )
+
     def _initialize_embeddings(self):
         self.embeddings = OpenAIEmbeddings(
             openai_api_key=os.environ.get("OPENAI_API_KEY"),
-            model="text-embedding-3-small",
+            model=EMBEDDING_MODEL,
         )
-        logger.info("Initialized OpenAI embeddings with text-embedding-3-small")
-
-    async def _connect_db(self):
-        """Connect to the database using environment variables"""
-        if not self.db_pool:
-            # Debug: Log all environment variables related to our secrets
-            logger.info(f"Environment variables available: DATABASE_URL={'set' if os.environ.get('DATABASE_URL') else 'NOT SET'}")
-            logger.info(f"Environment variables available: OPENAI_API_KEY={'set' if os.environ.get('OPENAI_API_KEY') else 'NOT SET'}")
-            logger.info(f"Environment variables available: PINECONE_API_KEY={'set' if os.environ.get('PINECONE_API_KEY') else 'NOT SET'}")
-            
-            database_url = os.environ.get("DATABASE_URL")
-            if not database_url:
-                logger.error("DATABASE_URL environment variable is not available")
-                # Let's try to get it from other possible sources
-                database_url = os.environ.get("DATABASE_URL")
-                if not database_url:
-                    logger.error("DATABASE_URL not found via os.getenv either")
-                    raise ValueError("DATABASE_URL environment variable is required")
-            
-            logger.info("DATABASE_URL found, attempting to connect to database")
-            self.db_pool = await asyncpg.create_pool(
-                database_url,
-                min_size=1,
-                max_size=10,
-                command_timeout=60
+        logger.info(f"Initialized OpenAI embeddings with {EMBEDDING_MODEL}")
+
+    async def _get_query_embeddings(self, queries: List[str]) -> List[List[float]]:
+        """Embed queries in one batched call, sharing embeddings of repeat questions across the host"""
+        loop = asyncio.get_event_loop()
+        keys = [f"{EMBEDDING_MODEL}:{normalize_query(query)}" for query in queries]
+        embeddings: List[Optional[List[float]]] = []
+        for key in keys:
+            cached = shared_cache.get(EMBEDDINGS, key)
+            embeddings.append(cached.tolist() if cached is not None else None)
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if not missing:
+            return embeddings
+        fresh = await embeddings_guard.call(
+            lambda: loop.run_in_executor(None, self._embed_queries, [queries[i] for i in missing])
+        )
+        for i, embedding in zip(missing, fresh):
+            embeddings[i] = embedding
+            loop.run_in_executor(
+                None, shared_cache.put, EMBEDDINGS, keys[i], np.asarray(embedding, dtype=np.float32)
             )
-            logger.info("Database connection pool created successfully")
-    
-    async def _get_images_for_content(self, content_id: str) -> List[Dict[str, Any]]:
-        """Get all images for a specific scraped content"""
-        await self._connect_db()
-        
-        async with self.db_pool.acquire() as connection:
-            query = """
-                SELECT id, url, "createdAt", "updatedAt"
-                FROM "Image" 
-                WHERE "scrapedContentId" = $1
-                ORDER BY "createdAt" ASC
-            """
-            
-            rows = await connection.fetch(query, content_id)
-            return [dict(row) for row in rows]
-    
+        return embeddings
+
+    def _embed_queries(self, queries: List[str]) -> List[List[float]]:
+        with self.recorder.span(RETRIEVAL, "embed_queries", queries=queries) as span:
+            if len(queries) == 1:
+                embeddings = [self.embeddings.embed_query(queries[0])]
+            else:
+                embeddings = self.embeddings.embed_documents(queries)
+            span.result = len(embeddings)
+        return embeddings
+
+    def _get_pinecone_index(self):
+        if self.pinecone_index is None:
+            pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
+            self.pinecone_index = pc.Index(PINECONE_INDEX_NAME)
+        return self.pinecone_index
+
     async def _get_scraped_content_with_media_info(self, content_id: str) -> Optional[Dict[str, Any]]:
         """Get scraped content with media information"""
-        await self._connect_db()
-        
-        async with self.db_pool.acquire() as connection:
-            query = """
-                SELECT 
-                    sc.*,
-                    COUNT(DISTINCT i.id) as image_count,
-                    COUNT(DISTINCT v.id) as video_count,
-                    CASE WHEN COUNT(DISTINCT i.id) > 0 THEN true ELSE false END as has_images,
-                    CASE WHEN COUNT(DISTINCT v.id) > 0 THEN true ELSE false END as has_videos
-                FROM "ScrapedContent" sc
-                LEFT JOIN "Image" i ON sc.id = i."scrapedContentId"
-                LEFT JOIN "Video" v ON sc.id = v."scrapedContentId"
-                WHERE sc.id = $1
-                GROUP BY sc.id, sc.url, sc.name, sc."mainImage", sc.description, 
-                         sc.price, sc."createdAt", sc."updatedAt", sc."createdById"
-            """
-            
-            result = await connection.fetchrow(query, content_id)
-            
-            if result:
-                return {
-                    'id': result['id'],
-                    'url': result['url'],
-                    'name': result['name'],
-                    'mainImage': result['mainImage'],
-                    'description': result['description'],
-                    'price': result['price'],
-                    'createdAt': result['createdAt'],
-                    'updatedAt': result['updatedAt'],
-                    'createdById': result['createdById'],
-                    'image_count': result['image_count'],
-                    'video_count': result['video_count'],
-                    'has_images': result['has_images'],
-                    'has_videos': result['has_videos']
-                }
-            
-            return None
+        try:
+            return await db.get_scraped_content_with_media_info(content_id)
+        except DependencyUnavailable as e:
+            # the snapshot taken when the session started is the best we have
+            if self.media_info and self.media_info.get('id') == content_id:
+                logger.warning(f"Using session-start listing snapshot: {e}")
+                return self.media_info
+            raise
+
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        # send only the instructions, memory summary and recent turns
+        chat_ctx = self.memory.trim_chat_ctx(chat_ctx)
+        async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+            yield chunk
+
+    def _listing_tools(self) -> list:
+        """Drop media tools the listing has nothing to show for"""
+        if self.media_info is None:
+            return list(self.tools)
+        hidden = set()
+        if not self.media_info.get('has_images'):
+            hidden.update((IMAGE_TOOL, IMAGE_SEARCH_TOOL))
+        if not self.media_info.get('has_videos'):
+            hidden.add(VIDEO_TOOL)
+        return [
+            tool for tool in self.tools
+            if not (llm.is_function_tool(tool) and llm.get_function_info(tool).name in hidden)
+        ]
 
     async def on_enter(self):
-        await self.session.generate_reply(
-            instructions="Hey! I'm Suresh, your real estate agent, and I'm here to get you into the PERFECT property TODAY! Don't let this market slip away from you - I've got some incredible listings that won't last long. Tell me what you're looking for and let's make this happen!"
-        )
+        await self.update_tools(self._listing_tools())
+        self.session.say(self.greeting_name)
+        await phrase_cache.say(self.session, self.voice_key, GREETING)
+
+    @function_tool
+    @with_filler
+    async def search_knowledge_base(self, query: str):
+        """Look up details of this property the client asked about, e.g. price, lot size, schools, HOA or amenities
+
+        Args:
+            query: The client's question about the property
+        """
+        try:
+            return await self._perform_rag_search(query)
+        except Exception as e:
+            logger.error(f"RAG search failed: {e}")
+            return f"Listen, I hit a little snag searching for '{query}', but don't worry - I NEVER give up on my clients! Let me try a different approach. Can you rephrase what you're looking for? I'm going to find you something amazing!"
 
-    # @function_tool
-    # async def search_knowledge_base(self, query: str, context: RunContext):
-
-    #     async def _speak_status_update(delay: float = 0.5):
-    #         await asyncio.sleep(delay)
-    #         await context.session.generate_reply(
-    #             instructions=f"""
-    #             You are Suresh, searching the knowledge base for "{query}" but it is taking a little while. You are a real estate agent and you are aggressive and pushy. You are a bit of a nerd. You are curious and friendly, and have a sense of humor.
-    #             Update the user on your progress, but be very brief and maintain your aggressive, pushy personality. Say something like "Hold on, I'm digging through my database to find you the BEST deals - this is going to be worth the wait!"
-    #             """
-    #         )
-
-    #     status_update_task = asyncio.create_task(_speak_status_update(0.5))
-    #     try:
-    #         result = await self._perform_rag_search(query)
-    #         status_update_task.cancel()
-    #         return result
-    #     except Exception as e:
-    #         status_update_task.cancel()
-    #         logger.error(f"RAG search failed: {e}")
-    #         return f"Listen, I hit a little snag searching for '{query}', but don't worry - I NEVER give up on my clients! Let me try a different approach. Can you rephrase what you're looking for? I'm going to find you something amazing!"
     def _load_image_from_url(self, url: str) -> np.ndarray:
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
+            with self.recorder.span(MEDIA, "image_fetch", url=url) as span:
+                response = requests.get(url, timeout=10)
+                response.raise_for_status()
+                span.result = len(response.content)
             img_pil = Image.open(BytesIO(response.content))
             img_rgb = np.array(img_pil)
             if len(img_rgb.shape) == 3 and img_rgb.shape[2] == 3:
@@ -199,15 +287,40 @@ class ContextAgent(Agent):
         except Exception as e:
             logger.error(f"Failed to load image from URL {url}: {e}")
             return np.zeros((720, 1280, 3), dtype=np.uint8)
+
+    def _load_frame(self, url: str) -> Optional[np.ndarray]:
+        """Decoded 1280x720 RGB frame for an image URL, shared by all job processes on the host"""
+        key = f"{url}@1280x720"
+        with self.recorder.span(MEDIA, "frame", url=url) as span:
+            frame = shared_cache.get(FRAMES, key)
+            if frame is not None:
+                span.result = "cached"
+                return frame
+
+            img = self._load_image_from_url(url)
+            if img is None or img.size == 0:
+                return None
+            span.result = list(img.shape)
+            img_resized = cv2.resize(img, (1280, 720))
+            # Convert BGR to RGB for VideoFrame
+            frame = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
+        shared_cache.put(FRAMES, key, frame)
+        return frame
         
     @function_tool
+    @with_filler
     async def share_screen_and_show_home_images(self):
         """Share screen and display property images with 2 seconds duration each"""
+        with self.recorder.span(TOOL, "share_screen_and_show_home_images") as span:
+            span.result = await self._share_screen_and_show_home_images()
+        return span.result
+
+    async def _share_screen_and_show_home_images(self):
         if self.room is None:
             return "Room not available"
             
         try:
-            logger.info(f"job_metadata: {self.job_metadata}")
+            logger.debug(f"job_metadata keys: {list(self.job_metadata or {})}")
             
             content_id = None
             if self.job_metadata:
@@ -216,30 +329,88 @@ class ContextAgent(Agent):
             
             if not content_id:
                 return "No content ID found in metadata to fetch images"
-            images = await self._get_images_for_content(content_id)
+            images = await _listing_images(content_id)
             logger.info(f"Found {len(images) if images else 0} images for content_id: {content_id}")
             if not images:
                 # Try to get content info to see if the content exists
                 content_info = await self._get_scraped_content_with_media_info(content_id)
                 if content_info:
-                    logger.info(f"Content exists but has no images. Content: {content_info}")
+                    logger.info(f"Content exists but has no images: {content_id}")
                     return f"Found the property '{content_info['name']}' but it has no images to display"
                 else:
                     logger.warning(f"No content found with ID: {content_id}")
                     return f"No property found with ID: {content_id}"
-            self.screen_share_source = rtc.VideoSource(1280, 720)
-            track = rtc.LocalVideoTrack.create_video_track("home_images", self.screen_share_source)
-            await self.room.local_participant.publish_track(
-                track,
-                rtc.TrackPublishOptions(source=rtc.TrackSource.SOURCE_SCREENSHARE)
-            )
+            image_count = len(images)
+            walkthrough = walkthrough_cache.get(content_id, images)
+            if walkthrough:
+                await self._start_screen_share("home_images")
+                self.video_playing = True
+                self.video_task = asyncio.create_task(self._play_home_video(walkthrough))
+                return f"Started a walkthrough video of the {image_count} property images on screen"
+
+            # First showing of this listing: render the walkthrough for next time
+            walkthrough_cache.ensure(content_id, images)
+            await self._start_screen_share("home_images")
             self.image_playing = True
             self.image_task = asyncio.create_task(self._show_home_images(images))
-            image_count = len(images)
             return f"Started sharing {image_count} property images on screen (2 seconds each)"
         except Exception as e:
             logger.error(f"Error sharing home images: {e}")
             return f"Error sharing home images: {str(e)}"
+    @function_tool
+    @with_filler
+    async def share_screen_and_show_matching_images(self, what: str):
+        """Share screen and show only the property photos of a room or feature, e.g. "kitchen", "backyard" or "kitchen island"
+
+        Args:
+            what: The room or feature the client asked to see
+        """
+        with self.recorder.span(TOOL, IMAGE_SEARCH_TOOL, what=what) as span:
+            span.result = await self._share_screen_and_show_matching_images(what)
+        return span.result
+
+    async def _share_screen_and_show_matching_images(self, what: str):
+        if self.room is None:
+            return "Room not available"
+
+        try:
+            content_id = self.job_metadata.get('contentId') if self.job_metadata else None
+            if not content_id:
+                return "No content ID found in metadata to fetch images"
+            images = await _listing_images(content_id)
+            matches = image_index.match(content_id, images, what)
+            if matches is None:
+                return f"The photos have not been sorted by room yet, so offer the full photo tour to show '{what}'"
+            if not matches:
+                return f"None of the property photos show '{what}'"
+
+            await self._start_screen_share("home_images")
+            self.image_playing = True
+            self.image_task = asyncio.create_task(self._show_home_images(matches))
+            return f"Started showing {len(matches)} photos of '{what}' on screen (2 seconds each)"
+        except Exception as e:
+            logger.error(f"Error sharing matching images: {e}")
+            return f"Error sharing matching images: {str(e)}"
+
+    async def _start_screen_share(self, track_name: str):
+        """Replace any running screen share with a fresh adaptive one"""
+        await self.stop_media()
+        self.screen_share = ScreenSharePublisher(self.room, track_name)
+        await self.screen_share.start()
+
+    async def stop_media(self):
+        """Stop the slideshow or video and unpublish the screen share"""
+        self.image_playing = False
+        self.video_playing = False
+        for task in (self.image_task, self.video_task):
+            # a producer paused for viewers would otherwise wait forever
+            if task is not None and not task.done():
+                task.cancel()
+        self.image_task = self.video_task = None
+        if self.screen_share is not None:
+            await self.screen_share.aclose()
+            self.screen_share = None
+
     async def _show_home_images(self, images: List[Dict[str, Any]]):
         try:
             logger.info(f"Starting to display {len(images)} images")
@@ -252,38 +423,27 @@ class ContextAgent(Agent):
                 if not image_url:
                     continue
                     
-                logger.info(f"Loading image {i+1}/{len(images)}: {image_url}")
+                logger.debug(f"Loading image {i+1}/{len(images)}: {image_url}")
                 
-                img = await asyncio.get_event_loop().run_in_executor(
-                    None, self._load_image_from_url, image_url
+                img_rgb = await asyncio.get_event_loop().run_in_executor(
+                    None, self._load_frame, image_url
                 )
                 
-                if img is None or img.size == 0:
+                if img_rgb is None:
                     logger.warning(f"Failed to load image: {image_url}")
                     continue
                 
-                img_resized = cv2.resize(img, (1280, 720))
-                
-                # Convert BGR to RGB for VideoFrame
-                img_rgb = cv2.cvtColor(img_resized, cv2.COLOR_BGR2RGB)
-                
-                # Create VideoFrame (same as your video implementation)
-                frame_bytes = img_rgb.tobytes()
-                video_frame = VideoFrame(
-                    width=1280,
-                    height=720,
-                    type=VideoBufferType.RGB24,
-                    data=frame_bytes
-                )
-                
-                # Display the image for 2 seconds
+                # Display the image for 2 seconds of watched time; a static
+                # slide only needs a slow refresh to keep the encoder fed
+                publisher = self.screen_share
                 start_time = asyncio.get_event_loop().time()
                 while (asyncio.get_event_loop().time() - start_time) < 2.0 and self.image_playing:
-                    if self.screen_share_source:
-                        self.screen_share_source.capture_frame(video_frame)
-                    await asyncio.sleep(0.033)  # ~30fps refresh rate
+                    start_time += await publisher.wait_until_watched()
+                    publisher.capture(img_rgb)
+                    await asyncio.sleep(publisher.frame_interval())
+                self.artifacts.emit("slide", index=i, image_id=image_data.get("id"), count=len(images))
                 
-                logger.info(f"Displayed image {i+1} for 2 seconds")
+                logger.debug(f"Displayed image {i+1} for 2 seconds")
             
             logger.info("Finished displaying all images")
             self.image_playing = False
@@ -293,40 +453,178 @@ class ContextAgent(Agent):
             logger.error(f"Error in _show_home_images: {e}")
             self.image_playing = False
             return False
+
+    @function_tool
+    @with_filler
+    async def share_screen_and_play_home_video(self):
+        """Share screen and play the property's video tour"""
+        with self.recorder.span(TOOL, VIDEO_TOOL) as span:
+            span.result = await self._share_screen_and_play_home_video()
+        return span.result
+
+    async def _share_screen_and_play_home_video(self):
+        if self.room is None:
+            return "Room not available"
+
+        try:
+            content_id = self.job_metadata.get('contentId') if self.job_metadata else None
+            if not content_id:
+                return "No content ID found in metadata to fetch videos"
+            videos = await db.get_videos_for_content(content_id)
+            if not videos:
+                return "This property has no video to play"
+
+            await self._start_screen_share("home_video")
+            self.video_playing = True
+            self.video_task = asyncio.create_task(self._play_home_video(videos[0]['url']))
+            return "Started playing the property video on screen"
+        except Exception as e:
+            logger.error(f"Error sharing home video: {e}")
+            return f"Error sharing home video: {str(e)}"
+
+    async def _play_home_video(self, video_url: str):
+        loop = asyncio.get_event_loop()
+        cap = await loop.run_in_executor(None, cv2.VideoCapture, video_url)
+        try:
+            if not cap.isOpened():
+                logger.error(f"Could not open video: {video_url}")
+                return False
+            publisher = self.screen_share
+            fps = cap.get(cv2.CAP_PROP_FPS) or 30
+            while self.video_playing:
+                await publisher.wait_until_watched()
+                ret, frame = await loop.run_in_executor(
+                    None, _read_frame_at_rate, cap, fps, publisher.frame_interval(fps)
+                )
+                if not ret:
+                    break
+                level = publisher.level
+                frame_rgb = cv2.cvtColor(cv2.resize(frame, (level.width, level.height)), cv2.COLOR_BGR2RGB)
+                publisher.capture(frame_rgb)
+                await asyncio.sleep(publisher.frame_interval(fps))
+            return True
+        except Exception as e:
+            logger.error(f"Error playing home video: {e}")
+            return False
+        finally:
+            self.video_playing = False
+            cap.release()
     async def _perform_rag_search(self, query: str, k: int = 3):
+        with self.recorder.span(TOOL, "rag_search", query=query, k=k) as span:
+            span.result = await self._rag_search(query, k)
+        return span.result
 
+    async def _rag_search(self, query: str, k: int):
         try:
             if not self.vector_store:
                 logger.error("Vector store is not available")
                 return "My database is acting up, but that's NOT going to stop me from helping you! I've got backup resources and I'm going to find you the perfect property one way or another!"
 
+            listing_key = self._listing_key()
+            cached = context_packer.get_cached(listing_key, query)
+            if cached is not None:
+                logger.info(f"Using packed context cache for query: '{query}'")
+                return self._format_rag_context(query, cached)
+
+            content_id = self.job_metadata.get('contentId') if isinstance(self.job_metadata, dict) else None
+            listing_version = await self._get_listing_version() if content_id else None
+            sub_queries = split_query(query)
+            # a cached answer covers one question, not every part of a compound one
+            use_answer_cache = listing_version and len(sub_queries) == 1
+            if use_answer_cache:
+                answer = answer_cache.get_by_intent(content_id, listing_version, query)
+                if answer is not None:
+                    logger.info(f"Answer cache hit (intent) for query: '{query}'")
+                    return self._format_rag_context(query, answer)
+
+            query_embedding = None
             logger.info(f"Performing similarity search for query: '{query}' with k={k}")
 
             try:
                 logger.info("Attempting direct Pinecone query with embeddings...")
-                query_embedding = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: self.embeddings.embed_query(query)
-                )
+                query_embeddings = await self._get_query_embeddings(sub_queries)
                 logger.info(
-                    f"Generated query embedding with {len(query_embedding)} dimensions"
+                    f"Generated {len(query_embeddings)} query embeddings with {len(query_embeddings[0])} dimensions"
                 )
+                if use_answer_cache:
+                    query_embedding = query_embeddings[0]
+                    answer = answer_cache.get_by_embedding(content_id, listing_version, query_embedding)
+                    if answer is not None:
+                        logger.info(f"Answer cache hit (embedding) for query: '{query}'")
+                        return self._format_rag_context(query, answer)
+
+                results = await asyncio.gather(*[
+                    self._retrieve(sub_query, embedding, k)
+                    for sub_query, embedding in zip(sub_queries, query_embeddings)
+                ])
+                docs = merge_results(results)
 
-                from pinecone import Pinecone
-
-                pc = Pinecone(api_key=os.environ.get("PINECONE_API_KEY"))
-                index = pc.Index("web-scraper-index-three")
-                query_filter = None
-                if self.job_metadata and isinstance(self.job_metadata, dict):
-                    url = self.job_metadata.get('url')
-                    if url:
-                        query_filter = {"url": {"$eq": url}}
-                        logger.info(f"Filtering Pinecone query by URL: {url}")
-                    else:
-                        logger.info("No URL found in job metadata, searching all content")
-                else:
-                    logger.info("No job metadata available, searching all content")
+            except Exception as direct_error:
+                # Retrying through the vector store would embed and query the
+                # same degraded services again, so answer from the listing row
+                logger.error(f"Direct Pinecone query failed: {direct_error}")
+                fallback = self._local_listing_context(query)
+                if fallback is not None:
+                    return self._format_rag_context(query, fallback)
+                docs = []
+
+            logger.info(f"Pinecone returned {len(docs) if docs else 0} documents")
 
-                query_response = await asyncio.get_event_loop().run_in_executor(
+            if docs:
+                for i, doc in enumerate(docs):
+                    logger.debug(
+                        f"Document {i+1}: {doc.page_content[:200]}...",
+                        extra={"chunk_index": doc.metadata.get("chunkIndex")},
+                    )
+            else:
+                logger.warning(f"No documents found for query: '{query}'")
+
+            if not docs:
+                return f"Okay, here's the thing - I don't have specific info about '{query}' in my current database, but DON'T WORRY! This just means we need to explore more options. I've got connections all over this market and I'm going to make some calls. What else can you tell me about what you're looking for? Square footage? Budget? Neighborhood preferences? Let's get SPECIFIC and find you something incredible!"
+
+            packed = await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: context_packer.pack(
+                    listing_key, query, [doc.page_content for doc in docs],
+                    sub_queries=sub_queries if len(sub_queries) > 1 else (),
+                ),
+            )
+            if use_answer_cache and packed:
+                await asyncio.get_event_loop().run_in_executor(
+                    None,
+                    lambda: answer_cache.put(
+                        content_id, listing_version, query, packed, embedding=query_embedding
+                    ),
+                )
+            return self._format_rag_context(query, packed)
+
+        except Exception as e:
+            logger.error(f"Error in RAG search: {e}")
+            return f"Technical hiccup with '{query}', but I'm like a dog with a bone - I DON'T give up! Let me try a different approach. In the meantime, tell me more about your dream property and I'll use my extensive network to find it for you!"
+
+
+    async def _retrieve(self, query: str, query_embedding: List[float], k: int) -> list:
+        docs = await self._search_local_store(query, query_embedding, k)
+        if docs is None:
+            docs = await self._query_pinecone(query, query_embedding, k)
+        return docs
+
+    async def _query_pinecone(self, query: str, query_embedding: List[float], k: int) -> list:
+        index = self._get_pinecone_index()
+        query_filter = None
+        if self.job_metadata and isinstance(self.job_metadata, dict):
+            url = self.job_metadata.get('url')
+            if url:
+                query_filter = {"url": {"$eq": url}}
+                logger.info(f"Filtering Pinecone query by URL: {url}")
+            else:
+                logger.info("No URL found in job metadata, searching all content")
+        else:
+            logger.info("No job metadata available, searching all content")
+
+        with self.recorder.span(RETRIEVAL, "pinecone_query", query=query, top_k=k) as span:
+            query_response = await pinecone_guard.call(
+                lambda: asyncio.get_event_loop().run_in_executor(
                     None,
                     lambda: index.query(
                         vector=query_embedding,
@@ -336,60 +634,96 @@ class ContextAgent(Agent):
                         filter=query_filter,
                     ),
                 )
+            )
+            span.result = [
+                {"score": match.score, "metadata": match.metadata}
+                for match in query_response.matches
+            ]
 
-                logger.info(
-                    f"Direct Pinecone query returned {len(query_response.matches)} matches"
-                )
+        logger.info(
+            f"Direct Pinecone query returned {len(query_response.matches)} matches"
+        )
 
-                docs = []
-                for match in query_response.matches:
-                    if match.metadata and "text" in match.metadata:
-                        from langchain_core.documents import Document
-
-                        doc = Document(
-                            page_content=match.metadata["text"],
-                            metadata={
-                                k: v for k, v in match.metadata.items() if k != "text"
-                            },
-                        )
-                        docs.append(doc)
-                        logger.info(
-                            f"Created document with content: {doc.page_content[:100]}..."
-                        )
+        docs = []
+        for match in query_response.matches:
+            if match.metadata and "text" in match.metadata:
+                from langchain_core.documents import Document
 
-            except Exception as direct_error:
-                logger.error(f"Direct Pinecone query failed: {direct_error}")
-                docs = await asyncio.get_event_loop().run_in_executor(
-                    None, lambda: self.vector_store.similarity_search(query, k=k)
+                doc = Document(
+                    page_content=match.metadata["text"],
+                    metadata={
+                        k: v for k, v in match.metadata.items() if k != "text"
+                    },
                 )
+                docs.append(doc)
+        return docs
 
-            logger.info(f"Pinecone returned {len(docs) if docs else 0} documents")
-
-            if docs:
-                for i, doc in enumerate(docs):
-                    logger.info(f"Document {i+1}:")
-                    logger.info(f"  Content: {doc.page_content[:200]}...")
-                    logger.info(f"  Metadata: {doc.metadata}")
-            else:
-                logger.warning(f"No documents found for query: '{query}'")
+    async def _search_local_store(self, query: str, query_embedding: List[float], k: int) -> Optional[list]:
+        """Chunks from the compact on-host embedding store; None if the listing is not in it"""
+        content_id = self.job_metadata.get('contentId') if isinstance(self.job_metadata, dict) else None
+        if not content_id or not embedding_store.has(content_id):
+            return None
+        # a store built before the listing was last edited is skipped; unknown versions are trusted
+        listing_version = await self._get_listing_version()
+        with self.recorder.span(RETRIEVAL, "local_vector_search", query=query, top_k=k) as span:
+            matches = await asyncio.get_event_loop().run_in_executor(
+                None, embedding_store.search, content_id, query_embedding, k, listing_version
+            )
+            span.result = len(matches) if matches is not None else None
+        if matches is None:
+            return None
+        logger.info(f"Local embedding store returned {len(matches)} matches")
+        from langchain_core.documents import Document
 
-            if not docs:
-                return f"Okay, here's the thing - I don't have specific info about '{query}' in my current database, but DON'T WORRY! This just means we need to explore more options. I've got connections all over this market and I'm going to make some calls. What else can you tell me about what you're looking for? Square footage? Budget? Neighborhood preferences? Let's get SPECIFIC and find you something incredible!"
+        return [
+            Document(page_content=match["text"], metadata=match.get("metadata", {}))
+            for match in matches
+        ]
 
-            context_text = "\n\n".join(
-                [f"Source {i+1}: {doc.page_content}" for i, doc in enumerate(docs)]
-            )
-            response = f"""BOOM! Found exactly what you're looking for regarding '{query}'! Here's the insider information:
+    def _local_listing_context(self, query: str) -> Optional[str]:
+        """Facts from the listing row loaded at session start, for when retrieval is down"""
+        if not self.media_info:
+            return None
+        chunks = [self.media_info.get('description') or ""]
+        if self.media_info.get('price'):
+            chunks.append(f"Price: {self.media_info['price']}.")
+        sentences = pack_sentences(query, chunks, context_packer.token_budget)
+        packed = "\n".join(f"- {s}" for s in sentences)
+        return packed or None
 
-{context_text}
+    def _format_rag_context(self, query: str, packed: str) -> str:
+        if not packed:
+            return f"No listing details matched '{query}'. Ask the client what else they want to know."
+        return f"Listing facts relevant to '{query}':\n{packed}"
 
-Listen, this information is GOLD, and I'm telling you - properties like this don't stay on the market long! We need to move FAST if you're interested. Are you ready to take the next step? I can set up a showing TODAY and even play you a video of the property right now! What do you say - should we make this happen?"""
 
-            return response
+def _log_index_diagnostics(index, namespace: str):
+    try:
+        stats = index.describe_index_stats()
+        logger.info(f"Index stats: {stats}")
+        try:
+            logger.info("Attempting to query index directly...")
+            query_response = index.query(
+                vector=[0.0] * 1536,
+                top_k=3,
+                include_metadata=True,
+                namespace=namespace,
+            )
+            logger.info(
+                f"Direct Pinecone query returned {len(query_response.matches)} matches"
+            )
+            for i, match in enumerate(query_response.matches):
+                logger.info(f"Match {i}: score={match.score}, id={match.id}")
+                logger.info(
+                    f"  Metadata keys: {list(match.metadata.keys()) if match.metadata else 'No metadata'}"
+                )
+                if match.metadata and "text" in match.metadata:
+                    logger.info(f"  Text: {match.metadata['text'][:100]}...")
+        except Exception as direct_query_error:
+            logger.error(f"Direct Pinecone query failed: {direct_query_error}")
 
-        except Exception as e:
-            logger.error(f"Error in RAG search: {e}")
-            return f"Technical hiccup with '{query}', but I'm like a dog with a bone - I DON'T give up! Let me try a different approach. In the meantime, tell me more about your dream property and I'll use my extensive network to find it for you!"
+    except Exception as e:
+        logger.warning(f"Could not get index stats: {e}")
 
 
 async def setup_vector_store():
@@ -400,7 +734,7 @@ async def setup_vector_store():
             return None
             
         pc = Pinecone(api_key=pinecone_api_key)
-        index_name = "web-scraper-index-three"
+        index_name = PINECONE_INDEX_NAME
         namespace = "default"
         embeddings = OpenAIEmbeddings(
             openai_api_key=os.environ.get("OPENAI_API_KEY"),
@@ -408,32 +742,9 @@ async def setup_vector_store():
         )
         index = pc.Index(index_name)
         logger.info(f"Connected to Pinecone index: {index_name}")
-        try:
-            stats = index.describe_index_stats()
-            logger.info(f"Index stats: {stats}")
-            try:
-                logger.info("Attempting to query index directly...")
-                query_response = index.query(
-                    vector=[0.0] * 1536,
-                    top_k=3,
-                    include_metadata=True,
-                    namespace=namespace,
-                )
-                logger.info(
-                    f"Direct Pinecone query returned {len(query_response.matches)} matches"
-                )
-                for i, match in enumerate(query_response.matches):
-                    logger.info(f"Match {i}: score={match.score}, id={match.id}")
-                    logger.info(
-                        f"  Metadata keys: {list(match.metadata.keys()) if match.metadata else 'No metadata'}"
-                    )
-                    if match.metadata and "text" in match.metadata:
-                        logger.info(f"  Text: {match.metadata['text'][:100]}...")
-            except Exception as direct_query_error:
-                logger.error(f"Direct Pinecone query failed: {direct_query_error}")
-
-        except Exception as e:
-            logger.warning(f"Could not get index stats: {e}")
+        # every job process runs prewarm, so only probe the index when asked to
+        if os.environ.get("PINECONE_DIAGNOSTICS"):
+            _log_index_diagnostics(index, namespace)
         vector_store = PineconeVectorStore(
             index=index,
             embedding=embeddings,
@@ -451,18 +762,28 @@ async def setup_vector_store():
 
 
 def prewarm(proc: JobProcess):
+    setup_logging()
     logger.info("Prewarming agent...")
-    proc.userdata["vad"] = silero.VAD.load()
+    load_vads(proc.userdata)
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     proc.userdata["vector_store"] = loop.run_until_complete(setup_vector_store())
     loop.close()
 
 
+async def _prerender_walkthrough(content_id: str):
+    """Have the walkthrough ready before the visitor asks for the photos"""
+    try:
+        images = await _listing_images(content_id)
+        if images and not walkthrough_cache.get(content_id, images):
+            await walkthrough_cache.ensure(content_id, images)
+    except Exception as e:
+        logger.warning(f"Could not pre-render walkthrough for {content_id}: {e}")
+
+
 async def entrypoint(ctx: JobContext):
     await ctx.connect()
-    #print all environment variables
-    logger.info(f"------------------------------------------------------------------------------------------------------------------------Environment variables------------------------------------------------------------------------------------------------------------------------: {os.environ}")
+    bind_session(ctx.room.name)
     vector_store = ctx.proc.userdata.get("vector_store")
     job_metadata = None
     context_info = None
@@ -473,33 +794,120 @@ async def entrypoint(ctx: JobContext):
             context_info = job_metadata.get("context")
             user_info = job_metadata.get("userInfo")
             session_data = job_metadata.get("sessionData")
-            logger.info(f"Raw job metadata: {ctx.job.metadata}")
-            logger.info(f"Parsed metadata: {job_metadata}")
-            logger.info(f"Agent received context: {context_info}")
-            logger.info(f"Agent received user info: {user_info}")
-            logger.info(f"Agent received session data: {session_data}")
+            logger.info(
+                "Agent received job metadata",
+                extra={
+                    "content_id": job_metadata.get("contentId"),
+                    "metadata_keys": list(job_metadata),
+                    "has_context": context_info is not None,
+                    "has_user_info": user_info is not None,
+                    "has_session_data": session_data is not None,
+                },
+            )
         else:
             logger.warning(
                 f"No job metadata found. ctx.job: {getattr(ctx, 'job', 'Not found')}"
             )
     except Exception as e:
         logger.error(f"Could not parse job metadata: {e}")
-    session = AgentSession(
-        vad=ctx.proc.userdata["vad"],
-        llm=openai.LLM(model="gpt-4o-mini"),
-        stt=deepgram.STT(model="nova-2"),
-        tts=openai.TTS(voice="alloy"),
-                # turn_detection=EnglishModel(),  # Disabled due to model download issues in cloud
+    profile = profile_selector.select()
+    logger.info(f"Using pipeline profile: {profile.name}")
+    session = build_session(profile, ctx.proc.userdata)
+    voice_key = f"{profile.tts_model}:{profile.tts_voice}"
+    # synthesized while we wait for the visitor, if no earlier session stored it
+    phrase_cache.warm(voice_key, session.tts, [GREETING])
+    artifacts = artifact_sink.session(ctx.room.name)
+    # the metadata itself carries the visitor's details; keep only what identifies the listing
+    artifacts.emit(
+        "session_start", agent="context-agent", profile=profile.name,
+        content_id=job_metadata.get("contentId") if isinstance(job_metadata, dict) else None,
+        metadata_keys=list(job_metadata or {}),
     )
+
+    @session.on("metrics_collected")
+    def _on_metrics_collected(ev):
+        profile_selector.observe(ev.metrics)
+        artifacts.emit("metrics", metrics=ev.metrics)
     await ctx.wait_for_participant()
-    agent = ContextAgent(vector_store=vector_store, job_metadata=job_metadata)
+    recorder = SessionRecorder(ctx.room.name)
+    # the database records its own lookups, starting with the one below
+    bind_recorder(recorder)
+    media_info = None
+    content_id = job_metadata.get("contentId") if isinstance(job_metadata, dict) else None
+    if not content_id:
+        media_info = {}
+    else:
+        try:
+            media_info = await db.get_scraped_content_with_media_info(content_id) or {}
+        except Exception as e:
+            logger.error(f"Could not load media info for {content_id}: {e}")
+    agent = ContextAgent(vector_store=vector_store, job_metadata=job_metadata, media_info=media_info)
     agent.room = ctx.room
+    agent.recorder = recorder
+    agent.artifacts = artifacts
+    agent.voice_key = voice_key
+    filler_audio.warm(agent.voice_key, session.tts)
+
+    @session.on("conversation_item_added")
+    def _on_conversation_item_added(ev):
+        if isinstance(ev.item, llm.ChatMessage):
+            agent.memory.add_turn(ev.item.role, ev.item.text_content)
+            artifacts.emit("transcript", role=ev.item.role, text=ev.item.text_content)
+
+    ctx.add_shutdown_callback(agent.memory.aclose)
+
+    async def log_cache_stats():
+        logger.info(f"Answer cache: {answer_cache.stats()}")
+        logger.info(f"Log overhead: {overhead_stats()}")
+        profile_selector.flush()
+        logger.info(f"Pipeline profiles: {profile_selector.stats()}")
+        logger.info(f"Dependency guards: {guard_stats()}")
+        logger.info(f"Database: {db.stats()}")
+        logger.info(f"Tool latency: {tool_stats()}")
+        logger.info(f"Phrase cache: {phrase_cache.stats()}")
+        artifacts.emit("session_end")
+        await artifact_sink.aclose()
+        logger.info(f"Session artifacts: {artifact_sink.stats()}")
+        logger.info(f"Idle reclamation: {idle_stats()}")
+
+    ctx.add_shutdown_callback(log_cache_stats)
+
+    async def save_replay_trace():
+        await asyncio.get_event_loop().run_in_executor(None, agent.recorder.save)
+
+    ctx.add_shutdown_callback(save_replay_trace)
+
+    ctx.add_shutdown_callback(agent.stop_media)
+
+    async def release_listing_resources() -> Dict[str, Any]:
+        released = {
+            "db_connections": db.pool.get_size() if db.pool else 0,
+            "cached_listing_rows": db.listing_cache.stats()["entries"],
+            "pinecone_clients": int(agent.pinecone_index is not None),
+        }
+        db.listing_cache.clear()
+        await db.disconnect()
+        agent.pinecone_index = None
+        context_packer.invalidate(agent._listing_key())
+        walkthrough_cache.shutdown()
+        return released
+
+    idle = IdleManager(ctx, session, agent, release=[release_listing_resources])
+
+    async def stop_idle_manager():
+        idle.stop()
+
+    ctx.add_shutdown_callback(stop_idle_manager)
+
+    if media_info and media_info.get('image_count') and content_id:
+        asyncio.create_task(_prerender_walkthrough(content_id))
     await session.start(
         agent=agent,
         room=ctx.room,
         room_input_options=RoomInputOptions(),
         room_output_options=RoomOutputOptions(transcription_enabled=True),
     )
+    idle.start()
 
 async def request_fnc(req: JobRequest):
     await req.accept(
@@ -507,11 +915,19 @@ async def request_fnc(req: JobRequest):
     )
 
 if __name__ == "__main__":
+    # only a worker that runs jobs needs the host processes, not e.g. download-files at build time
+    if sys.argv[1:2] in (["start"], ["dev"]):
+        # one writer per host publishes and evicts entries for every job process
+        supervise_cache_writer()
+        supervise_artifact_writer()
+        # and one relay holds the host's only LISTEN connection for listing changes
+        supervise_listing_relay()
     cli.run_app(
         WorkerOptions(
             entrypoint_fnc=entrypoint,
             prewarm_fnc=prewarm,
             request_fnc=request_fnc,
             agent_name="context-agent",
+            num_idle_processes=int(os.environ.get("AGENT_IDLE_PROCESSES", "2")),
         )
     )
\ No newline at end of file
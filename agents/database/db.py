@@ -1,15 +1,80 @@
 import asyncio
+import bisect
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
 import asyncpg
 from dotenv import load_dotenv
 
+from database import listing_notify
+from database.listing_cache import ListingCache
+from replay.recorder import DB, current_recorder
+from resilience.guard import postgres_guard
+
 load_dotenv()
 
+logger = logging.getLogger("database")
+
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "250"))
+SLOW_ACQUIRE_MS = float(os.environ.get("DB_SLOW_ACQUIRE_MS", "100"))
+HEALTH_INTERVAL = float(os.environ.get("DB_HEALTH_INTERVAL", "30"))
+# Upper bounds in milliseconds; the last bucket takes everything slower
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile"""
+        if not self.total:
+            return 0.0
+        rank = q / 100 * self.total
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(float(BUCKETS_MS[i]), self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": self.total,
+            "mean_ms": round(self.sum_ms / self.total, 2) if self.total else 0.0,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "max_ms": round(self.max_ms, 2),
+            "buckets": dict(zip([*map(str, BUCKETS_MS), "inf"], self.counts)),
+        }
+
+
 class DatabaseManager:
     def __init__(self):
         self.connection_string = None
         self.pool = None
+        self._connect_lock = asyncio.Lock()
+        self._health_task = None
+        self._listen_task = None
+        self.listing_cache = ListingCache()
+        self.query_latency: Dict[str, LatencyHistogram] = {}
+        self.acquire_wait = LatencyHistogram()
+        self.slow_queries = 0
+        self.health = {"ok": None, "checked_at": None, "latency_ms": None, "failures": 0}
         
     def _ensure_connection_string(self):
         if not self.connection_string:
@@ -18,7 +83,12 @@ class DatabaseManager:
                 raise ValueError("DATABASE_URL environment variable is required")
     
     async def connect(self):
-        if not self.pool:
+        if self.pool:
+            return
+        # concurrent first callers wait for one pool instead of each creating their own
+        async with self._connect_lock:
+            if self.pool:
+                return
             self._ensure_connection_string()
             self.pool = await asyncpg.create_pool(
                 self.connection_string,
@@ -26,17 +96,113 @@ class DatabaseManager:
                 max_size=10,
                 command_timeout=60
             )
+            logger.info("Database connection pool created")
+            if HEALTH_INTERVAL > 0:
+                self._health_task = asyncio.create_task(self._health_probe())
+            self._listen_task = asyncio.create_task(self._listen_for_listing_changes())
     
     async def disconnect(self):
+        if self._health_task:
+            self._health_task.cancel()
+            self._health_task = None
+        if self._listen_task:
+            self._listen_task.cancel()
+            self._listen_task = None
         if self.pool:
             await self.pool.close()
             self.pool = None
-    
-    async def check_if_scraped_content_has_images(self, content_id: str) -> bool:
+
+    @asynccontextmanager
+    async def _connection(self, name: str):
+        """Acquire a pooled connection, timing the wait for it and how long the query holds it"""
         if not self.pool:
             await self.connect()
-        
+        requested = time.perf_counter()
         async with self.pool.acquire() as connection:
+            acquired = time.perf_counter()
+            wait_ms = (acquired - requested) * 1000
+            self.acquire_wait.observe(wait_ms)
+            if wait_ms > SLOW_ACQUIRE_MS:
+                logger.warning(
+                    f"Waited {wait_ms:.0f} ms for a database connection for {name}",
+                    extra={"query": name, "acquire_wait_ms": round(wait_ms, 1), **self._pool_usage()},
+                )
+            try:
+                yield connection
+            finally:
+                query_ms = (time.perf_counter() - acquired) * 1000
+                self.query_latency.setdefault(name, LatencyHistogram()).observe(query_ms)
+                if query_ms > SLOW_QUERY_MS:
+                    self.slow_queries += 1
+                    logger.warning(
+                        f"Slow query {name}: {query_ms:.0f} ms",
+                        extra={"query": name, "query_ms": round(query_ms, 1), "acquire_wait_ms": round(wait_ms, 1)},
+                    )
+
+    def _pool_usage(self) -> Dict[str, Any]:
+        if not self.pool:
+            return {}
+        return {"pool_size": self.pool.get_size(), "pool_idle": self.pool.get_idle_size()}
+
+    async def _health_probe(self):
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL)
+            started = time.perf_counter()
+            try:
+                async with self._connection("health_probe") as connection:
+                    await connection.fetchval("SELECT 1", timeout=5)
+                ok = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                ok = False
+                self.health["failures"] += 1
+                logger.warning(f"Database health probe failed: {e}", extra=self._pool_usage())
+            if ok and self.health["ok"] is False:
+                logger.info("Database health probe recovered")
+            self.health.update(
+                ok=ok,
+                checked_at=time.time(),
+                latency_ms=round((time.perf_counter() - started) * 1000, 1),
+            )
+
+    async def _listen_for_listing_changes(self):
+        """
+        Follow the host's listing notification relay so cached listing rows are dropped on write
+
+        The relay holds the host's one LISTEN connection (see
+        database.listing_notify), so job processes don't each take a
+        Postgres connection just to hear about writes.
+        """
+        await listing_notify.follow(self._on_relay_message)
+
+    def _on_relay_message(self, kind: str, value: Any):
+        if kind == "changed":
+            if value:
+                self.listing_cache.invalidate(value)
+        elif kind == "listening" and value != self.listing_cache.listening:
+            # anything cached across the change may have missed a notification
+            self.listing_cache.clear()
+            self.listing_cache.listening = value
+            logger.info(f"Listing notifications {'relayed' if value else 'unavailable'}")
+
+    async def _cached(self, kind: str, content_id: str, fetch):
+        if not self.pool:
+            await self.connect()
+        return await self.listing_cache.get_or_load(kind, content_id, lambda: postgres_guard.call(fetch))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pool": self._pool_usage(),
+            "health": dict(self.health),
+            "acquire_wait": self.acquire_wait.stats(),
+            "slow_queries": self.slow_queries,
+            "queries": {name: h.stats() for name, h in self.query_latency.items()},
+            "listing_cache": self.listing_cache.stats(),
+        }
+    
+    async def check_if_scraped_content_has_images(self, content_id: str) -> bool:
+        async with self._connection("has_images") as connection:
             query = """
                 SELECT EXISTS(
                     SELECT 1 
@@ -49,9 +215,7 @@ class DatabaseManager:
             return result['has_images'] if result else False
     
     async def check_if_scraped_content_has_videos(self, content_id: str) -> bool:
-        if not self.pool:
-            await self.connect()
-        async with self.pool.acquire() as connection:
+        async with self._connection("has_videos") as connection:
             query = """
                 SELECT EXISTS(
                     SELECT 1 
@@ -64,10 +228,14 @@ class DatabaseManager:
             return result['has_videos'] if result else False
     
     async def get_scraped_content_with_media_info(self, content_id: str) -> Optional[Dict[str, Any]]:
-        if not self.pool:
-            await self.connect()
-        
-        async with self.pool.acquire() as connection:
+        with current_recorder().span(DB, "listing_snapshot", content_id=content_id) as span:
+            span.result = await self._cached(
+                "listing_snapshot", content_id, lambda: self._fetch_scraped_content_with_media_info(content_id)
+            )
+        return span.result
+
+    async def _fetch_scraped_content_with_media_info(self, content_id: str) -> Optional[Dict[str, Any]]:
+        async with self._connection("listing_snapshot") as connection:
             query = """
                 SELECT 
                     sc.*,
@@ -114,10 +282,12 @@ class DatabaseManager:
         Returns:
             List of image dictionaries
         """
-        if not self.pool:
-            await self.connect()
-        
-        async with self.pool.acquire() as connection:
+        with current_recorder().span(DB, "images_for_content", content_id=content_id) as span:
+            span.result = await self._cached("images", content_id, lambda: self._fetch_images_for_content(content_id))
+        return span.result
+
+    async def _fetch_images_for_content(self, content_id: str) -> List[Dict[str, Any]]:
+        async with self._connection("images_for_content") as connection:
             query = """
                 SELECT id, url, "createdAt", "updatedAt"
                 FROM "Image" 
@@ -138,10 +308,12 @@ class DatabaseManager:
         Returns:
             List of video dictionaries
         """
-        if not self.pool:
-            await self.connect()
-        
-        async with self.pool.acquire() as connection:
+        with current_recorder().span(DB, "videos_for_content", content_id=content_id) as span:
+            span.result = await self._cached("videos", content_id, lambda: self._fetch_videos_for_content(content_id))
+        return span.result
+
+    async def _fetch_videos_for_content(self, content_id: str) -> List[Dict[str, Any]]:
+        async with self._connection("videos_for_content") as connection:
             query = """
                 SELECT id, url, "createdAt", "updatedAt"
                 FROM "Video" 
@@ -152,6 +324,40 @@ class DatabaseManager:
             rows = await connection.fetch(query, content_id)
             return [dict(row) for row in rows]
 
+    async def get_all_images(self) -> List[Dict[str, Any]]:
+        """
+        Get every image row, grouped by scraped content
+
+        Returns:
+            List of image dictionaries including scrapedContentId
+        """
+        async with self._connection("all_images") as connection:
+            query = """
+                SELECT id, url, "scrapedContentId", "createdAt", "updatedAt"
+                FROM "Image"
+                ORDER BY "scrapedContentId", "createdAt" ASC
+            """
+
+            rows = await connection.fetch(query)
+            return [dict(row) for row in rows]
+
+    async def get_all_listings(self) -> List[Dict[str, Any]]:
+        """
+        Get the id, url and last update of every scraped content
+
+        Returns:
+            List of listing dictionaries
+        """
+        async with self._connection("all_listings") as connection:
+            query = """
+                SELECT id, url, "updatedAt"
+                FROM "ScrapedContent"
+                ORDER BY "createdAt" ASC
+            """
+
+            rows = await connection.fetch(query)
+            return [dict(row) for row in rows]
+
 # Global database instance
 db = DatabaseManager()
 
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger("listing-cache")
+
+CACHE_SIZE = int(os.environ.get("LISTING_CACHE_SIZE", "512"))
+CACHE_TTL = float(os.environ.get("LISTING_CACHE_TTL", "300"))
+# Without a live LISTEN connection nothing tells us about writes, so only
+# keep entries long enough to absorb a burst of identical reads
+UNLISTENED_TTL = float(os.environ.get("LISTING_CACHE_UNLISTENED_TTL", "5"))
+
+
+def _copy(value: Any) -> Any:
+    """Callers get their own rows so they can't modify the cached ones"""
+    if isinstance(value, dict):
+        return dict(value)
+    if isinstance(value, list):
+        return [dict(item) if isinstance(item, dict) else item for item in value]
+    return value
+
+
+class ListingCache:
+    """
+    Read-through cache for per-listing rows, keyed by (kind, content_id)
+
+    Concurrent misses for the same key share one load. Entries expire after
+    a TTL and the least recently used are dropped past the size bound; a
+    listing's entries are dropped as soon as Postgres notifies that it
+    changed. A load that overlaps an invalidation is returned but not
+    stored, so a stale read never outlives the notification.
+    """
+
+    def __init__(self, size: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.listening = False
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._generations: Dict[str, int] = {}
+        # bumped by clear(), which drops everything including loads in flight
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get_or_load(self, kind: str, content_id: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        key = (kind, content_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if time.monotonic() < entry[0]:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return _copy(entry[1])
+            del self._entries[key]
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(self._load(key, content_id, loader))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # a caller giving up must not cancel the load the others are waiting on
+        return _copy(await asyncio.shield(task))
+
+    async def _load(self, key: Tuple[str, str], content_id: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        generation = (self._epoch, self._generations.get(content_id, 0))
+        try:
+            value = await loader()
+        finally:
+            self._inflight.pop(key, None)
+        if (self._epoch, self._generations.get(content_id, 0)) == generation:
+            ttl = self.ttl if self.listening else min(self.ttl, UNLISTENED_TTL)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, content_id: str):
+        self._generations[content_id] = self._generations.get(content_id, 0) + 1
+        self.invalidations += 1
+        for key in [key for key in self._entries if key[1] == content_id]:
+            del self._entries[key]
+        logger.debug(f"Invalidated cached rows for listing {content_id}")
+
+    def clear(self):
+        self._epoch += 1
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "listening": self.listening,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
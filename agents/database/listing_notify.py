@@ -0,0 +1,193 @@
+"""
+One LISTEN connection per host for listing change notifications
+
+    python -m database.listing_notify    # run the host's relay by hand
+
+Postgres connections are scarce, and a LISTEN connection per job process
+grows with the number of concurrent sessions. The relay process holds the
+host's only LISTEN connection on LISTING_CHANNEL and forwards each
+notification to every job process subscribed over its socket; job
+processes never connect to Postgres for notifications themselves.
+
+Subscribers receive ("listening", bool) whenever the relay's connection
+comes up or goes down, and ("changed", content_id) per notification.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+from multiprocessing.connection import Connection
+from typing import Any, Callable, List, Optional, Tuple
+
+import asyncpg
+from dotenv import load_dotenv
+
+from shared_cache import ipc
+
+logger = logging.getLogger("listing-notify")
+
+# Channel the listing triggers (see the listing_change_notify migration) notify on
+LISTING_CHANNEL = "listing_changed"
+_DEFAULT_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+RELAY_DIR = os.environ.get("LISTING_NOTIFY_DIR", os.path.join(_DEFAULT_ROOT, "convomate-listing-notify"))
+RETRY_MAX = 60.0
+# A relay that went away is replaced by a supervising worker within its interval
+FOLLOW_RETRY_MAX = ipc.SUPERVISE_INTERVAL
+
+
+class ListingNotifyRelay:
+    """The single process on the host that LISTENs and fans notifications out"""
+
+    def __init__(self, connection_string: str, relay_dir: str = RELAY_DIR, authkey: Optional[bytes] = None):
+        self.connection_string = connection_string
+        self.relay_dir = relay_dir
+        self.authkey = authkey
+        self.listening = False
+        self._subscribers: List[Connection] = []
+        self._lock = threading.Lock()
+        self.forwarded = 0
+
+    def _accept_forever(self, listener):
+        while True:
+            conn = ipc.accept(listener)
+            if conn is None:
+                continue
+            with self._lock:
+                try:
+                    conn.send(("listening", self.listening))
+                except OSError:
+                    conn.close()
+                    continue
+                self._subscribers.append(conn)
+
+    def _broadcast(self, message: Tuple[str, Any]):
+        with self._lock:
+            alive = []
+            for conn in self._subscribers:
+                try:
+                    conn.send(message)
+                    alive.append(conn)
+                except OSError:
+                    # the job process ended
+                    conn.close()
+            self._subscribers = alive
+
+    def _on_listing_changed(self, connection, pid, channel, payload):
+        if payload:
+            self.forwarded += 1
+            self._broadcast(("changed", payload))
+
+    def _set_listening(self, listening: bool):
+        self.listening = listening
+        self._broadcast(("listening", listening))
+
+    async def listen_forever(self):
+        retry_after = 1.0
+        while True:
+            connection = None
+            lost = asyncio.Event()
+            try:
+                connection = await asyncpg.connect(self.connection_string)
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(LISTING_CHANNEL, self._on_listing_changed)
+                self._set_listening(True)
+                retry_after = 1.0
+                logger.info(f"Listening for {LISTING_CHANNEL} notifications for the host")
+                await lost.wait()
+                logger.warning("Lost the listing notification connection")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not listen for listing changes: {e}")
+            finally:
+                if self.listening:
+                    self._set_listening(False)
+                if connection is not None and not connection.is_closed():
+                    await connection.close()
+            await asyncio.sleep(retry_after)
+            retry_after = min(retry_after * 2, RETRY_MAX)
+
+    def serve_forever(self):
+        if not ipc.claim(self.relay_dir):
+            logger.info("Another listing notification relay owns this host's LISTEN connection")
+            return
+        authkey = self.authkey or ipc.create_authkey(self.relay_dir)
+        listener = ipc.listen(self.relay_dir, authkey)
+        threading.Thread(target=self._accept_forever, args=(listener,), daemon=True).start()
+        logger.info(f"Listing notification relay serving {self.relay_dir}")
+        asyncio.run(self.listen_forever())
+
+
+async def follow(on_message: Callable[[str, Any], None], relay_dir: str = RELAY_DIR):
+    """
+    Hand the relay's messages to on_message on this event loop, reconnecting as needed
+
+    While there is no relay, on_message gets ("listening", False) and the
+    caller should treat its cache as unnotified. After the relay drops the
+    connection it is looked for again right away and then at least every
+    FOLLOW_RETRY_MAX seconds, so a replacement is picked up promptly.
+    """
+    loop = asyncio.get_running_loop()
+    retry_after = 1.0
+    while True:
+        try:
+            conn = ipc.connect(relay_dir)
+        except OSError as e:
+            logger.debug(f"No listing notification relay: {e}")
+            on_message("listening", False)
+            await asyncio.sleep(retry_after)
+            retry_after = min(retry_after * 2, FOLLOW_RETRY_MAX)
+            continue
+        retry_after = 1.0
+        lost = asyncio.Event()
+
+        def _on_readable():
+            try:
+                while conn.poll():
+                    on_message(*conn.recv())
+            except (EOFError, OSError):
+                loop.remove_reader(conn.fileno())
+                lost.set()
+
+        loop.add_reader(conn.fileno(), _on_readable)
+        try:
+            await lost.wait()
+            logger.warning("Lost the listing notification relay")
+        finally:
+            if not lost.is_set():
+                loop.remove_reader(conn.fileno())
+            conn.close()
+            on_message("listening", False)
+
+
+def _run_relay(connection_string: str, relay_dir: str, authkey: bytes):
+    ListingNotifyRelay(connection_string, relay_dir, authkey).serve_forever()
+
+
+def start_listing_relay(relay_dir: str = RELAY_DIR) -> Optional[multiprocessing.Process]:
+    """Start the host's relay unless there is no database configured or one is already running"""
+    connection_string = os.getenv("DATABASE_URL")
+    if not connection_string:
+        return None
+    if ipc.running(relay_dir):
+        logger.debug("Listing notification relay already running on this host")
+        return None
+    authkey = ipc.create_authkey(relay_dir)
+    process = multiprocessing.Process(
+        target=_run_relay, args=(connection_string, relay_dir, authkey), name="listing-notify-relay", daemon=True
+    )
+    process.start()
+    return process
+
+
+def supervise_listing_relay(relay_dir: str = RELAY_DIR):
+    """Keep the host's relay running from this worker, whichever worker's child it is"""
+    ipc.supervise(lambda: start_listing_relay(relay_dir), "listing-notify-relay")
+
+
+if __name__ == "__main__":
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    ListingNotifyRelay(os.environ["DATABASE_URL"]).serve_forever()
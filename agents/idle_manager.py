@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from livekit import rtc
+
+from artifacts.pipeline import null_artifacts
+
+logger = logging.getLogger("idle-manager")
+
+# Nobody spoke for this long: stop producing screen-share frames
+MEDIA_IDLE_AFTER = float(os.environ.get("IDLE_MEDIA_AFTER", "60"))
+# ...and for this long: end the session
+CLOSE_IDLE_AFTER = float(os.environ.get("IDLE_CLOSE_AFTER", "300"))
+# The user left and did not come back within this long: end the session
+CLOSE_ALONE_AFTER = float(os.environ.get("IDLE_CLOSE_ALONE_AFTER", "20"))
+CHECK_INTERVAL = 5.0
+
+# Per job process; every reclamation is also emitted as a session artifact,
+# which is what outlives the process (see IdleManager)
+reclaimed: Dict[str, Any] = {
+    "sessions_closed": 0,
+    "media_stopped": 0,
+}
+
+
+def idle_stats() -> Dict[str, Any]:
+    return dict(reclaimed)
+
+
+class IdleManager:
+    """
+    Ends abandoned sessions instead of waiting for LiveKit to end the job
+
+    Activity is user or agent speech, new conversation items and a user
+    (re)joining. With no activity for MEDIA_IDLE_AFTER (CLOSE_ALONE_AFTER
+    if nobody is subscribed to the screen share) the agent's media
+    production is stopped; with none for CLOSE_IDLE_AFTER, or no user in
+    the room for CLOSE_ALONE_AFTER, the session is closed, the release
+    callbacks free the session's pools and caches, and the job shuts down.
+
+    Release callbacks are async and return a dict of what they freed,
+    which is added to the process's `reclaimed` counters and emitted with
+    the reason as an "idle_close" artifact of the session; stopped media
+    is emitted as "idle_media_stopped". Totals across processes come from
+    the artifact files.
+    """
+
+    def __init__(self, ctx, session, agent, release: Optional[List[Callable[[], Awaitable[Dict[str, Any]]]]] = None):
+        self.ctx = ctx
+        self.session = session
+        self.agent = agent
+        self.release = release or []
+        self.last_activity = time.monotonic()
+        self.alone_since: Optional[float] = None
+        self.closed = False
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.session.on("user_state_changed", self._on_state_changed)
+        self.session.on("agent_state_changed", self._on_state_changed)
+        self.session.on("conversation_item_added", lambda _: self.touch())
+        self.ctx.room.on("participant_connected", self._on_presence_changed)
+        self.ctx.room.on("participant_disconnected", self._on_presence_changed)
+        self._on_presence_changed(None)
+        self._task = asyncio.create_task(self._watch())
+
+    def touch(self):
+        self.last_activity = time.monotonic()
+
+    def _on_state_changed(self, ev):
+        if ev.new_state in ("speaking", "thinking"):
+            self.touch()
+
+    def _on_presence_changed(self, participant: Optional[rtc.RemoteParticipant]):
+        has_user = any(
+            p.kind != rtc.ParticipantKind.PARTICIPANT_KIND_AGENT
+            for p in self.ctx.room.remote_participants.values()
+        )
+        if has_user:
+            if self.alone_since is not None:
+                self.touch()
+            self.alone_since = None
+        elif self.alone_since is None:
+            self.alone_since = time.monotonic()
+
+    def _media_running(self) -> bool:
+        return bool(getattr(self.agent, "image_playing", False) or getattr(self.agent, "video_playing", False))
+
+    async def _watch(self):
+        while not self.closed:
+            await asyncio.sleep(CHECK_INTERVAL)
+            now = time.monotonic()
+            idle = now - self.last_activity
+            if self.alone_since is not None and now - self.alone_since >= CLOSE_ALONE_AFTER:
+                await self.close("user left")
+            elif idle >= CLOSE_IDLE_AFTER:
+                await self.close(f"idle for {idle:.0f}s")
+            elif self._media_running() and (
+                idle >= MEDIA_IDLE_AFTER or (idle >= CLOSE_ALONE_AFTER and not self._watched())
+            ):
+                logger.info(f"Stopping screen share after {idle:.0f}s without activity")
+                await self.agent.stop_media()
+                reclaimed["media_stopped"] += 1
+                self._artifacts().emit("idle_media_stopped", idle_s=round(idle, 1))
+
+    def _artifacts(self):
+        return getattr(self.agent, "artifacts", null_artifacts)
+
+    def _watched(self) -> bool:
+        screen_share = getattr(self.agent, "screen_share", None)
+        return screen_share is None or screen_share.watched
+
+    async def close(self, reason: str):
+        if self.closed:
+            return
+        self.closed = True
+        freed: Dict[str, Any] = {}
+        media_stopped = self._media_running()
+        if media_stopped:
+            reclaimed["media_stopped"] += 1
+        await self.agent.stop_media()
+        try:
+            await self.session.aclose()
+        except Exception as e:
+            logger.warning(f"Could not close idle session cleanly: {e}")
+        for release in self.release:
+            try:
+                for key, value in (await release()).items():
+                    freed[key] = freed.get(key, 0) + value
+            except Exception as e:
+                logger.warning(f"Could not release {getattr(release, '__name__', release)}: {e}")
+        for key, value in freed.items():
+            reclaimed[key] = reclaimed.get(key, 0) + value
+        reclaimed["sessions_closed"] += 1
+        # before the shutdown, whose callbacks flush the session's artifacts
+        self._artifacts().emit("idle_close", reason=reason, media_stopped=media_stopped, freed=freed)
+        logger.info(f"Closed idle session ({reason}), released {freed}", extra={"reclaimed": freed})
+        self.ctx.shutdown(reason=f"idle: {reason}")
+
+    def stop(self):
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
@@ -0,0 +1,416 @@
+"""
+Offline image feature index for listing photos
+
+    python -m media.image_index build                  # every listing
+    python -m media.image_index build --content-id ID  # one listing
+    python -m media.image_index show ID
+
+For each Image row the build job stores room labels and notable features
+(zero-shot CLIP, run on CPU with onnxruntime), the dominant colours and a
+perceptual hash. Results are one JSON file per scrapedContentId in
+IMAGE_INDEX_DIR; images whose row has not changed since they were fully
+described are not processed again.
+The agent reads the index to jump to matching photos and to skip duplicates.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+import requests
+
+logger = logging.getLogger("image-index")
+
+INDEX_DIR = os.environ.get(
+    "IMAGE_INDEX_DIR", os.path.join(tempfile.gettempdir(), "convomate-image-index")
+)
+CLIP_REPO = os.environ.get("IMAGE_INDEX_CLIP_REPO", "Xenova/clip-vit-base-patch32")
+INDEX_WORKERS = int(os.environ.get("IMAGE_INDEX_WORKERS", str(max(1, (os.cpu_count() or 2) - 1))))
+# Hamming distance between 64-bit pHashes at or below which two photos are the same shot
+DUPLICATE_DISTANCE = 6
+ROOM_MIN_SCORE = 0.3
+FEATURE_MIN_SCORE = 0.6
+INDEX_VERSION = 1
+
+ROOM_PROMPTS = {
+    "kitchen": "a photo of a kitchen",
+    "bathroom": "a photo of a bathroom",
+    "bedroom": "a photo of a bedroom",
+    "living room": "a photo of a living room",
+    "dining room": "a photo of a dining room",
+    "home office": "a photo of a home office",
+    "laundry room": "a photo of a laundry room",
+    "garage": "a photo of a garage",
+    "backyard": "a photo of a backyard",
+    "front exterior": "a photo of the front of a house",
+    "balcony": "a photo of a balcony",
+    "floor plan": "a floor plan of a house",
+}
+# Each feature is scored against its own negative prompt
+FEATURE_PROMPTS = {
+    "kitchen island": ("a kitchen with an island", "a kitchen without an island"),
+    "fireplace": ("a room with a fireplace", "a room without a fireplace"),
+    "swimming pool": ("a house with a swimming pool", "a house without a swimming pool"),
+    "walk-in closet": ("a walk-in closet", "a bedroom with no closet"),
+    "bathtub": ("a bathroom with a bathtub", "a bathroom with only a shower"),
+    "hardwood floors": ("a room with hardwood floors", "a room with carpet or tile floors"),
+}
+# Words a visitor might use for each label
+LABEL_SYNONYMS = {
+    "kitchen": ["kitchen", "cooking"],
+    "bathroom": ["bathroom", "bath", "toilet", "shower", "washroom"],
+    "bedroom": ["bedroom", "bedrooms", "bed", "sleeping"],
+    "living room": ["living room", "living", "lounge", "family room", "sitting room"],
+    "dining room": ["dining", "dinner"],
+    "home office": ["office", "study", "workspace"],
+    "laundry room": ["laundry", "utility room", "washer"],
+    "garage": ["garage", "parking", "car"],
+    "backyard": ["backyard", "back yard", "yard", "garden", "patio", "outdoor", "outside"],
+    "front exterior": ["front", "exterior", "outside", "curb", "facade", "street"],
+    "balcony": ["balcony", "terrace", "deck"],
+    "floor plan": ["floor plan", "floorplan", "layout"],
+    "kitchen island": ["island"],
+    "fireplace": ["fireplace", "fire place", "hearth"],
+    "swimming pool": ["pool", "swimming"],
+    "walk-in closet": ["closet", "wardrobe"],
+    "bathtub": ["bathtub", "tub", "bath"],
+    "hardwood floors": ["hardwood", "wood floor", "wooden floor", "floors", "flooring"],
+}
+
+_CLIP_MEAN = np.array([0.48145466, 0.4578275, 0.40821073], dtype=np.float32)
+_CLIP_STD = np.array([0.26862954, 0.26130258, 0.27577711], dtype=np.float32)
+
+
+def perceptual_hash(img_bgr: np.ndarray) -> str:
+    """64-bit DCT pHash as 16 hex characters"""
+    gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (32, 32), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:8, :8].flatten()
+    bits = low > np.median(low[1:])
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+
+def hash_distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count("1")
+
+
+def dominant_colors(img_bgr: np.ndarray, k: int = 3) -> List[List[Any]]:
+    """[hex, share] for the k main colours, largest share first"""
+    pixels = cv2.resize(img_bgr, (64, 64), interpolation=cv2.INTER_AREA).reshape(-1, 3).astype(np.float32)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 20, 1.0)
+    _, labels, centers = cv2.kmeans(pixels, k, None, criteria, 3, cv2.KMEANS_PP_CENTERS)
+    shares = np.bincount(labels.flatten(), minlength=k) / len(labels)
+    colors = []
+    for i in np.argsort(-shares):
+        b, g, r = (int(c) for c in centers[i])
+        colors.append([f"#{r:02x}{g:02x}{b:02x}", round(float(shares[i]), 3)])
+    return colors
+
+
+class ClipLabeler:
+    """Zero-shot room and feature labels from the ONNX export of CLIP"""
+
+    def __init__(self, repo: str = CLIP_REPO):
+        import onnxruntime
+        from huggingface_hub import hf_hub_download
+        from tokenizers import Tokenizer
+
+        options = onnxruntime.SessionOptions()
+        # the pool already runs one worker per core
+        options.intra_op_num_threads = 1
+        self.vision = onnxruntime.InferenceSession(
+            hf_hub_download(repo, "onnx/vision_model_quantized.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        text = onnxruntime.InferenceSession(
+            hf_hub_download(repo, "onnx/text_model_quantized.onnx"), options, providers=["CPUExecutionProvider"]
+        )
+        tokenizer = Tokenizer.from_file(hf_hub_download(repo, "tokenizer.json"))
+
+        def embed_text(prompt: str) -> np.ndarray:
+            ids = np.array([tokenizer.encode(prompt).ids], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": np.ones_like(ids)}
+            names = {i.name for i in text.get_inputs()}
+            return self._output(text, {k: v for k, v in feeds.items() if k in names}, "text_embeds")[0]
+
+        self.room_names = list(ROOM_PROMPTS)
+        self.room_embeds = _normalize(np.stack([embed_text(p) for p in ROOM_PROMPTS.values()]))
+        self.feature_embeds = {
+            name: _normalize(np.stack([embed_text(pos), embed_text(neg)]))
+            for name, (pos, neg) in FEATURE_PROMPTS.items()
+        }
+
+    @staticmethod
+    def _output(session, feeds, name: str) -> np.ndarray:
+        outputs = [o.name for o in session.get_outputs()]
+        index = outputs.index(name) if name in outputs else 0
+        return session.run(None, feeds)[index]
+
+    def label(self, img_bgr: np.ndarray):
+        rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
+        h, w = rgb.shape[:2]
+        scale = 224 / min(h, w)
+        rgb = cv2.resize(rgb, (max(224, round(w * scale)), max(224, round(h * scale))), interpolation=cv2.INTER_CUBIC)
+        y = (rgb.shape[0] - 224) // 2
+        x = (rgb.shape[1] - 224) // 2
+        pixels = (rgb[y:y + 224, x:x + 224].astype(np.float32) / 255 - _CLIP_MEAN) / _CLIP_STD
+        pixels = pixels.transpose(2, 0, 1)[None]
+        image = _normalize(self._output(self.vision, {"pixel_values": pixels}, "image_embeds"))[0]
+
+        room_probs = _softmax(100 * self.room_embeds @ image)
+        rooms = {
+            self.room_names[i]: round(float(room_probs[i]), 3)
+            for i in np.argsort(-room_probs)[:2]
+            if room_probs[i] >= ROOM_MIN_SCORE
+        }
+        features = {}
+        for name, embeds in self.feature_embeds.items():
+            p = float(_softmax(100 * embeds @ image)[0])
+            if p >= FEATURE_MIN_SCORE:
+                features[name] = round(p, 3)
+        return rooms, features
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.linalg.norm(x, axis=-1, keepdims=True)
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    e = np.exp(x - x.max())
+    return e / e.sum()
+
+
+# Set per worker process by _init_worker
+_labeler: Optional[ClipLabeler] = None
+
+
+def _init_worker():
+    global _labeler
+    try:
+        _labeler = ClipLabeler()
+    except Exception as e:
+        logger.warning(f"CLIP labeler unavailable, indexing colours and hashes only: {e}")
+
+
+def _labeler_ready() -> bool:
+    return _labeler is not None
+
+
+def describe_image(url: str) -> Optional[Dict[str, Any]]:
+    """Descriptors for one image URL; runs in a worker process"""
+    try:
+        response = requests.get(url, timeout=15)
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Could not fetch {url}: {e}")
+        return None
+    img = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        logger.warning(f"Could not decode {url}")
+        return None
+    rooms, features = _labeler.label(img) if _labeler is not None else ({}, {})
+    return {
+        "rooms": rooms,
+        "features": features,
+        "colors": dominant_colors(img),
+        "phash": perceptual_hash(img),
+        "size": [img.shape[1], img.shape[0]],
+        "labeled": _labeler is not None,
+    }
+
+
+def _index_path(index_dir: str, content_id: str) -> str:
+    safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in content_id)
+    return os.path.join(index_dir, f"{safe_id}.json")
+
+
+def _reusable(old: Optional[Dict[str, Any]], entry: Dict[str, Any], clip_enabled: bool) -> bool:
+    """
+    Whether the previous build's descriptors for an unchanged row can be kept
+
+    Rows whose image could not be fetched have no descriptors, and rows
+    described while CLIP was unavailable have no labels; both are described
+    again. Entries from before "labeled" was stored count as labeled if
+    they have any label.
+    """
+    if not old or old["updatedAt"] != entry["updatedAt"] or old["url"] != entry["url"]:
+        return False
+    if not old.get("phash"):
+        return False
+    labeled = old.get("labeled", bool(old.get("rooms") or old.get("features")))
+    return labeled or not clip_enabled
+
+
+def _mark_duplicates(entries: List[Dict[str, Any]]):
+    """Point each repeat shot at the first photo it duplicates, in listing order"""
+    kept: List[Dict[str, Any]] = []
+    for entry in entries:
+        entry["duplicate_of"] = None
+        if not entry.get("phash"):
+            continue
+        for original in kept:
+            if hash_distance(entry["phash"], original["phash"]) <= DUPLICATE_DISTANCE:
+                entry["duplicate_of"] = original["id"]
+                break
+        else:
+            kept.append(entry)
+
+
+class ImageIndex:
+    """Read side of the image index, used by the agent"""
+
+    def __init__(self, index_dir: str = INDEX_DIR):
+        self.index_dir = index_dir
+        self._loaded: Dict[str, Any] = {}
+
+    def load(self, content_id: str) -> Optional[Dict[str, Any]]:
+        path = _index_path(self.index_dir, content_id)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        cached = self._loaded.get(content_id)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable image index {path}: {e}")
+            return None
+        self._loaded[content_id] = (mtime, index)
+        return index
+
+    def _entries(self, content_id: str) -> Dict[str, Dict[str, Any]]:
+        index = self.load(content_id)
+        return {entry["id"]: entry for entry in index["images"]} if index else {}
+
+    def dedupe(self, content_id: str, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop photos the index marks as repeats of an earlier one"""
+        entries = self._entries(content_id)
+        kept = [img for img in images if not (entries.get(img.get("id")) or {}).get("duplicate_of")]
+        if len(kept) < len(images):
+            logger.info(f"Skipping {len(images) - len(kept)} duplicate photos for {content_id}")
+        return kept
+
+    def match(self, content_id: str, images: List[Dict[str, Any]], query: str) -> Optional[List[Dict[str, Any]]]:
+        """Photos showing what the query asks for, best first; None if the listing is not indexed"""
+        entries = self._entries(content_id)
+        if not entries:
+            return None
+        text = f" {re.sub(r'[^a-z0-9]+', ' ', query.lower())} "
+        wanted = {
+            label for label, words in LABEL_SYNONYMS.items()
+            if label in text or any(f" {word} " in text or f" {word}s " in text for word in words)
+        }
+        scored = []
+        for position, img in enumerate(self.dedupe(content_id, images)):
+            entry = entries.get(img.get("id"))
+            if not entry:
+                continue
+            labels = {**entry.get("rooms", {}), **entry.get("features", {})}
+            score = sum(labels.get(label, 0.0) for label in wanted)
+            if score > 0:
+                scored.append((-score, position, img))
+        return [img for _, _, img in sorted(scored, key=lambda s: s[:2])]
+
+    def summary(self, content_id: str) -> Optional[str]:
+        """Short description of what the listing's photos show, e.g. for the agent's memory"""
+        index = self.load(content_id)
+        if not index:
+            return None
+        counts: Dict[str, int] = defaultdict(int)
+        for entry in index["images"]:
+            if entry.get("duplicate_of"):
+                continue
+            for label in list(entry.get("rooms", {})) + list(entry.get("features", {})):
+                counts[label] += 1
+        if not counts:
+            return None
+        return ", ".join(
+            f"{label} ({count} photo{'s' if count > 1 else ''})"
+            for label, count in sorted(counts.items(), key=lambda c: -c[1])
+        )
+
+
+async def build(content_ids: Optional[List[str]], index_dir: str = INDEX_DIR, workers: int = INDEX_WORKERS):
+    from database.db import db
+
+    os.makedirs(index_dir, exist_ok=True)
+    rows = await db.get_all_images()
+    await db.disconnect()
+    by_content: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for row in rows:
+        if content_ids is None or row["scrapedContentId"] in content_ids:
+            by_content[row["scrapedContentId"]].append(row)
+
+    reader = ImageIndex(index_dir)
+    loop = asyncio.get_event_loop()
+    started = time.monotonic()
+    described = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        # every worker loads the labeler the same way, so one answers for all
+        clip_enabled = await loop.run_in_executor(pool, _labeler_ready)
+        for content_id, images in by_content.items():
+            previous = reader._entries(content_id)
+            entries, jobs = [], []
+            for img in images:
+                entry = {"id": img["id"], "url": img["url"], "updatedAt": str(img["updatedAt"])}
+                old = previous.get(img["id"])
+                if _reusable(old, entry, clip_enabled):
+                    entry.update({
+                        k: old[k] for k in ("rooms", "features", "colors", "phash", "size", "labeled") if k in old
+                    })
+                else:
+                    jobs.append((entry, loop.run_in_executor(pool, describe_image, img["url"])))
+                entries.append(entry)
+            for entry, job in jobs:
+                entry.update(await job or {})
+            described += len(jobs)
+            _mark_duplicates(entries)
+
+            path = _index_path(index_dir, content_id)
+            with open(f"{path}.tmp", "w") as f:
+                json.dump(
+                    {"version": INDEX_VERSION, "content_id": content_id, "built_at": time.time(), "images": entries},
+                    f,
+                )
+            os.replace(f"{path}.tmp", path)
+            logger.info(f"Indexed {len(entries)} images for {content_id} ({len(jobs)} new or changed)")
+    logger.info(
+        f"Image index built for {len(by_content)} listings, {described} images described "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+
+
+# One reader per job process
+image_index = ImageIndex()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="index new and changed listing images")
+    build_parser.add_argument("--content-id", action="append", dest="content_ids")
+    build_parser.add_argument("--workers", type=int, default=INDEX_WORKERS)
+    show_parser = sub.add_parser("show", help="print what a listing's photos show")
+    show_parser.add_argument("content_id")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "build":
+        asyncio.run(build(args.content_ids, workers=args.workers))
+    else:
+        print(image_index.summary(args.content_id) or "No index for this listing")
+
+
+if __name__ == "__main__":
+    main()
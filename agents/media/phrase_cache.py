@@ -0,0 +1,197 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+from typing import AsyncIterator, Dict, List, Optional
+
+import numpy as np
+from livekit import rtc
+
+logger = logging.getLogger("phrase-cache")
+
+CACHE_DIR = os.environ.get(
+    "PHRASE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "convomate-phrases")
+)
+MAX_BYTES = int(os.environ.get("PHRASE_CACHE_MAX_MB", "256")) * 1024 * 1024
+FRAME_MS = 20
+
+
+class Phrase:
+    """Synthesized speech for one line, as interleaved int16 PCM"""
+
+    def __init__(self, text: str, pcm: np.ndarray, sample_rate: int, num_channels: int):
+        self.text = text
+        self.pcm = pcm
+        self.sample_rate = sample_rate
+        self.num_channels = num_channels
+
+    @property
+    def duration(self) -> float:
+        return len(self.pcm) / self.num_channels / self.sample_rate
+
+    async def frames(self) -> AsyncIterator[rtc.AudioFrame]:
+        step = self.sample_rate * FRAME_MS // 1000 * self.num_channels
+        for start in range(0, len(self.pcm), step):
+            chunk = self.pcm[start:start + step]
+            yield rtc.AudioFrame(
+                data=chunk.tobytes(),
+                sample_rate=self.sample_rate,
+                num_channels=self.num_channels,
+                samples_per_channel=len(chunk) // self.num_channels,
+            )
+
+
+class PhraseCache:
+    """
+    Synthesized audio for fixed and templated lines, per voice
+
+    Each phrase is stored once on local disk as a .npy file and opened with
+    mmap, so every job process on the host plays the same pages instead of
+    paying the TTS again. Lines are keyed by their text, so per-user parts
+    (a name) belong in a separate, uncached line. A miss is synthesized
+    while it plays and stored once it has played to the end; a line that
+    is still being warmed plays once its synthesis finishes.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._warming: Dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.synthesized_s = 0.0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def path_for(self, voice_key: str, tts, text: str) -> str:
+        fingerprint = f"{voice_key}|{tts.sample_rate}|{tts.num_channels}|{text}"
+        digest = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"phrase-{digest}.npy")
+
+    def _open(self, path: str, tts, text: str) -> Optional[Phrase]:
+        try:
+            pcm = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        return Phrase(text, pcm, tts.sample_rate, tts.num_channels)
+
+    def get(self, voice_key: str, tts, text: str) -> Optional[Phrase]:
+        phrase = self._open(self.path_for(voice_key, tts, text), tts, text)
+        if phrase is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return phrase
+
+    async def load(self, voice_key: str, tts, text: str) -> Optional[Phrase]:
+        """Cached phrase, synthesizing it first on a miss; concurrent misses share one synthesis"""
+        phrase = self.get(voice_key, tts, text)
+        if phrase is not None:
+            return phrase
+        path = self.path_for(voice_key, tts, text)
+        future = self._inflight.get(path)
+        if future is None:
+            future = asyncio.ensure_future(self._render(path, tts, text))
+            self._inflight[path] = future
+            future.add_done_callback(lambda _: self._inflight.pop(path, None))
+        await asyncio.shield(future)
+        return self._open(path, tts, text)
+
+    async def _render(self, path: str, tts, text: str):
+        async for _ in self._synthesize(path, tts, text):
+            pass
+
+    async def _synthesize(self, path: str, tts, text: str) -> AsyncIterator[rtc.AudioFrame]:
+        chunks: List[np.ndarray] = []
+        async with tts.synthesize(text) as stream:
+            async for event in stream:
+                frame = event.frame
+                if frame.sample_rate != tts.sample_rate or frame.num_channels != tts.num_channels:
+                    # not what the key says, so play it but don't store it
+                    chunks = None
+                elif chunks is not None:
+                    chunks.append(np.frombuffer(frame.data, dtype=np.int16).copy())
+                yield frame
+        # only reached when the whole phrase was synthesized and consumed
+        if chunks:
+            pcm = np.concatenate(chunks)
+            self.synthesized_s += len(pcm) / tts.num_channels / tts.sample_rate
+            await asyncio.get_event_loop().run_in_executor(None, self._store, path, pcm)
+
+    def _store(self, path: str, pcm: np.ndarray):
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, pcm)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not store phrase {path}: {e}")
+            return
+        self._evict()
+
+    def _evict(self):
+        phrases = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("phrase-") and name.endswith(".npy"):
+                phrase_path = os.path.join(self.cache_dir, name)
+                stat = os.stat(phrase_path)
+                phrases.append((stat.st_atime, phrase_path, stat.st_size))
+        total = sum(size for _, _, size in phrases)
+        for _, phrase_path, size in sorted(phrases):
+            if total <= self.max_bytes:
+                break
+            os.unlink(phrase_path)
+            total -= size
+
+    def say(self, session, voice_key: str, text: str, **kwargs):
+        """session.say() from the cache, falling back to synthesizing (and storing) the line"""
+        tts = session.tts
+        phrase = self.get(voice_key, tts, text)
+        path = self.path_for(voice_key, tts, text)
+        if phrase is not None:
+            audio = phrase.frames()
+        elif path in self._inflight:
+            audio = self._after_inflight(self._inflight[path], path, tts, text)
+        else:
+            audio = self._synthesize(path, tts, text)
+        return session.say(text, audio=audio, **kwargs)
+
+    async def _after_inflight(self, future: asyncio.Future, path: str, tts, text: str) -> AsyncIterator[rtc.AudioFrame]:
+        try:
+            await asyncio.shield(future)
+        except Exception as e:
+            logger.warning(f"Warming '{text}' failed, synthesizing it again: {e}")
+        phrase = self._open(path, tts, text)
+        frames = phrase.frames() if phrase is not None else self._synthesize(path, tts, text)
+        async for frame in frames:
+            yield frame
+
+    def warm(self, voice_key: str, tts, texts: List[str]) -> None:
+        """Make sure the phrases are on disk, in the background"""
+        if voice_key in self._warming:
+            return
+
+        async def _warm():
+            for text in texts:
+                try:
+                    await self.load(voice_key, tts, text)
+                except Exception as e:
+                    logger.warning(f"Could not synthesize phrase '{text}': {e}")
+
+        task = asyncio.create_task(_warm())
+        self._warming[voice_key] = task
+        task.add_done_callback(lambda _: self._warming.pop(voice_key, None))
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "synthesized_s": round(self.synthesized_s, 1),
+        }
+
+
+# One per job process; the files are shared by the whole host
+phrase_cache = PhraseCache()
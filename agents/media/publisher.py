@@ -0,0 +1,196 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Optional
+
+import cv2
+import numpy as np
+from livekit import rtc
+from livekit.rtc import VideoBufferType, VideoFrame
+
+logger = logging.getLogger("media-publisher")
+
+STATS_INTERVAL = float(os.environ.get("SCREENSHARE_STATS_INTERVAL", "2.0"))
+# Consecutive congested/clear polls before stepping down/up a level
+DOWNGRADE_AFTER = 2
+UPGRADE_AFTER = 5
+
+
+class QualityLevel:
+    def __init__(self, width: int, height: int, max_fps: float, max_bitrate: int):
+        self.width = width
+        self.height = height
+        self.max_fps = max_fps
+        self.max_bitrate = max_bitrate
+
+
+# Highest first. Slides are static, so even the top level refreshes slowly.
+QUALITY_LEVELS = [
+    QualityLevel(1280, 720, 15, 1_500_000),
+    QualityLevel(960, 540, 10, 800_000),
+    QualityLevel(640, 360, 5, 300_000),
+]
+SLIDESHOW_FPS = 5
+
+
+class ScreenSharePublisher:
+    """
+    Publishes a screen-share track and adapts what is produced for it
+
+    The track is published with simulcast and an explicit encoding. Frame
+    size and rate step down while the sender reports bandwidth or CPU
+    limitation and step back up once it clears. Producers call
+    wait_until_watched() so no frames are made while nobody is subscribed.
+    """
+
+    def __init__(self, room: rtc.Room, track_name: str):
+        self.room = room
+        self.track_name = track_name
+        self.level_index = 0
+        self.source: Optional[rtc.VideoSource] = None
+        self.track: Optional[rtc.LocalVideoTrack] = None
+        self.publication: Optional[rtc.LocalTrackPublication] = None
+        self._subscribed = asyncio.Event()
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._congested_polls = 0
+        self._clear_polls = 0
+        self._last_src: Optional[np.ndarray] = None
+        self._last_frame: Optional[VideoFrame] = None
+        self.frames_sent = 0
+        self.paused_s = 0.0
+
+    @property
+    def level(self) -> QualityLevel:
+        return QUALITY_LEVELS[self.level_index]
+
+    @property
+    def watched(self) -> bool:
+        return self._subscribed.is_set()
+
+    def frame_interval(self, source_fps: float = SLIDESHOW_FPS) -> float:
+        return 1.0 / max(1.0, min(source_fps, self.level.max_fps))
+
+    async def start(self):
+        top = QUALITY_LEVELS[0]
+        self.source = rtc.VideoSource(top.width, top.height)
+        self.track = rtc.LocalVideoTrack.create_video_track(self.track_name, self.source)
+        options = rtc.TrackPublishOptions(
+            source=rtc.TrackSource.SOURCE_SCREENSHARE,
+            simulcast=True,
+            video_encoding=rtc.VideoEncoding(max_bitrate=top.max_bitrate, max_framerate=top.max_fps),
+        )
+        self.publication = await self.room.local_participant.publish_track(self.track, options)
+
+        self.room.on("local_track_subscribed", self._on_local_track_subscribed)
+        self.room.on("participant_disconnected", self._on_participant_disconnected)
+        if self._has_viewers():
+            self._subscribed.set()
+        self._monitor_task = asyncio.create_task(self._monitor())
+
+    def _has_viewers(self) -> bool:
+        return any(
+            p.kind != rtc.ParticipantKind.PARTICIPANT_KIND_AGENT
+            for p in self.room.remote_participants.values()
+        )
+
+    def _on_local_track_subscribed(self, track: rtc.Track):
+        if self.track is not None and track.sid == self.track.sid:
+            self._subscribed.set()
+
+    def _on_participant_disconnected(self, participant: rtc.RemoteParticipant):
+        if not self._has_viewers():
+            logger.info(f"No viewers left for {self.track_name}, pausing frame production")
+            self._subscribed.clear()
+
+    async def wait_until_watched(self) -> float:
+        """Block while nobody is subscribed; returns the time spent paused"""
+        if self._subscribed.is_set():
+            return 0.0
+        started = time.monotonic()
+        await self._subscribed.wait()
+        paused = time.monotonic() - started
+        self.paused_s += paused
+        return paused
+
+    def capture(self, frame_rgb: np.ndarray):
+        """Send an RGB frame scaled to the current level; the scaled frame is reused while the input is unchanged"""
+        if self.source is None:
+            return
+        if frame_rgb is not self._last_src or self._last_frame is None:
+            level = self.level
+            scaled = frame_rgb
+            if scaled.shape[0] != level.height or scaled.shape[1] != level.width:
+                scaled = cv2.resize(scaled, (level.width, level.height), interpolation=cv2.INTER_AREA)
+            self._last_frame = VideoFrame(
+                width=level.width,
+                height=level.height,
+                type=VideoBufferType.RGB24,
+                data=np.ascontiguousarray(scaled).tobytes(),
+            )
+            self._last_src = frame_rgb
+        self.source.capture_frame(self._last_frame)
+        self.frames_sent += 1
+
+    async def _monitor(self):
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            try:
+                congested = await self._is_congested()
+            except Exception as e:
+                logger.debug(f"Could not read screen-share stats: {e}")
+                continue
+            if congested:
+                self._congested_polls += 1
+                self._clear_polls = 0
+                if self._congested_polls >= DOWNGRADE_AFTER and self.level_index < len(QUALITY_LEVELS) - 1:
+                    self._set_level(self.level_index + 1)
+            else:
+                self._clear_polls += 1
+                self._congested_polls = 0
+                if self._clear_polls >= UPGRADE_AFTER and self.level_index > 0:
+                    self._set_level(self.level_index - 1)
+
+    async def _is_congested(self) -> bool:
+        stats = await self.track.get_stats()
+        for stat in stats:
+            if stat.WhichOneof("stats") != "outbound_rtp":
+                continue
+            reason = stat.outbound_rtp.outbound.quality_limitation_reason
+            # NONE is 0; CPU, BANDWIDTH and OTHER all mean the encoder is being held back
+            if reason:
+                return True
+        return False
+
+    def _set_level(self, index: int):
+        self._congested_polls = 0
+        self._clear_polls = 0
+        self.level_index = index
+        self._last_frame = None
+        level = self.level
+        logger.info(
+            f"Screen share {self.track_name} now {level.width}x{level.height} @ {level.max_fps} fps",
+            extra={"screenshare_level": index},
+        )
+
+    async def aclose(self):
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        self.room.off("local_track_subscribed", self._on_local_track_subscribed)
+        self.room.off("participant_disconnected", self._on_participant_disconnected)
+        if self.publication is not None:
+            try:
+                await self.room.local_participant.unpublish_track(self.publication.sid)
+            except Exception as e:
+                logger.debug(f"Could not unpublish {self.track_name}: {e}")
+        if self.source is not None:
+            try:
+                await self.source.aclose()
+            except Exception as e:
+                logger.debug(f"Could not close source for {self.track_name}: {e}")
+        logger.info(
+            f"Closed screen share {self.track_name}",
+            extra={"frames_sent": self.frames_sent, "paused_s": round(self.paused_s, 1)},
+        )
+        self.source = None
+        self.publication = None
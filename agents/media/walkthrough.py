@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import cv2
+import numpy as np
+import requests
+
+logger = logging.getLogger("walkthrough")
+
+CACHE_DIR = os.environ.get(
+    "VIDEO_ASSET_CACHE_DIR", os.path.join(tempfile.gettempdir(), "convomate-videos")
+)
+MAX_BYTES = int(os.environ.get("VIDEO_ASSET_CACHE_MAX_MB", "2048")) * 1024 * 1024
+RENDER_WORKERS = int(os.environ.get("WALKTHROUGH_RENDER_WORKERS", "1"))
+# A lock older than this belongs to a render that died
+RENDER_TIMEOUT = 600.0
+# Bump when the look of the clip changes so cached renders are redone
+RENDER_VERSION = 1
+
+WIDTH, HEIGHT = 1280, 720
+FPS = 15
+SECONDS_PER_IMAGE = 3.0
+CROSSFADE_SECONDS = 0.75
+MAX_ZOOM = 1.15
+
+
+def _fetch_image(url: str) -> Optional[np.ndarray]:
+    try:
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+    except Exception as e:
+        logger.warning(f"Skipping walkthrough image {url}: {e}")
+        return None
+    img = cv2.imdecode(np.frombuffer(response.content, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        logger.warning(f"Could not decode walkthrough image {url}")
+    return img
+
+
+def _cover(img: np.ndarray) -> np.ndarray:
+    """Scale and centre-crop to exactly the output aspect, at MAX_ZOOM times the output size"""
+    out_w, out_h = int(WIDTH * MAX_ZOOM), int(HEIGHT * MAX_ZOOM)
+    h, w = img.shape[:2]
+    scale = max(out_w / w, out_h / h)
+    resized = cv2.resize(img, (max(out_w, round(w * scale)), max(out_h, round(h * scale))), interpolation=cv2.INTER_AREA)
+    y = (resized.shape[0] - out_h) // 2
+    x = (resized.shape[1] - out_w) // 2
+    return resized[y:y + out_h, x:x + out_w]
+
+
+def _motion_matrices(index: int, frames: int, src_w: int, src_h: int) -> np.ndarray:
+    """
+    Affine matrices (frames x 2 x 3) mapping the source onto the output for
+    one image. Zoom direction and pan direction alternate between images.
+    """
+    t = np.linspace(0.0, 1.0, frames)
+    t = t * t * (3 - 2 * t)  # smoothstep easing
+    zoom_in = index % 2 == 0
+    zoom = 1.0 + (MAX_ZOOM - 1.0) * (t if zoom_in else 1 - t)
+
+    # Output pixels per source pixel; at zoom 1 the whole source fills the frame
+    scale = zoom * WIDTH / src_w
+    view_w = WIDTH / scale
+    view_h = HEIGHT / scale
+    pan = np.array([[-1, -1], [1, 1], [1, -1], [-1, 1]][index % 4], dtype=np.float64)
+    # Move the view centre across whatever slack the current zoom leaves
+    cx = src_w / 2 + pan[0] * (t - 0.5) * (src_w - view_w)
+    cy = src_h / 2 + pan[1] * (t - 0.5) * (src_h - view_h)
+
+    matrices = np.zeros((frames, 2, 3), dtype=np.float64)
+    matrices[:, 0, 0] = scale
+    matrices[:, 1, 1] = scale
+    matrices[:, 0, 2] = WIDTH / 2 - scale * cx
+    matrices[:, 1, 2] = HEIGHT / 2 - scale * cy
+    return matrices
+
+
+def _render_clip(img: np.ndarray, index: int, frames: int) -> np.ndarray:
+    src = _cover(img)
+    matrices = _motion_matrices(index, frames, src.shape[1], src.shape[0])
+    clip = np.empty((frames, HEIGHT, WIDTH, 3), dtype=np.uint8)
+    for i, matrix in enumerate(matrices):
+        cv2.warpAffine(src, matrix, (WIDTH, HEIGHT), dst=clip[i], flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT)
+    return clip
+
+
+def render_walkthrough(urls: List[str], out_path: str) -> Optional[str]:
+    """Render a Ken Burns walkthrough of the images to an mp4; runs in a worker process"""
+    started = time.monotonic()
+    frames = int(SECONDS_PER_IMAGE * FPS)
+    fade = int(CROSSFADE_SECONDS * FPS)
+    # Crossfade weights for the overlapping frames, broadcast over the frame pixels
+    alpha = np.linspace(0.0, 1.0, fade + 2, dtype=np.float32)[1:-1, None, None, None]
+
+    tmp_path = f"{out_path}.{os.getpid()}.tmp.mp4"
+    writer = cv2.VideoWriter(tmp_path, cv2.VideoWriter_fourcc(*"mp4v"), FPS, (WIDTH, HEIGHT))
+    written = 0
+    tail = None
+    try:
+        for url in urls:
+            img = _fetch_image(url)
+            if img is None:
+                continue
+            clip = _render_clip(img, written, frames)
+            if tail is not None:
+                blended = (tail * (1 - alpha) + clip[:fade] * alpha).astype(np.uint8)
+                clip = np.concatenate([blended, clip[fade:]])
+            for frame in clip[:-fade]:
+                writer.write(frame)
+            tail = clip[-fade:].astype(np.float32)
+            written += 1
+        if tail is not None:
+            for frame in tail.astype(np.uint8):
+                writer.write(frame)
+    finally:
+        writer.release()
+
+    if not written:
+        os.unlink(tmp_path)
+        return None
+    os.replace(tmp_path, out_path)
+    logger.info(f"Rendered walkthrough of {written} images in {time.monotonic() - started:.1f}s to {out_path}")
+    return out_path
+
+
+class WalkthroughCache:
+    """
+    Pre-rendered listing walkthroughs in the local video asset cache
+
+    A clip is keyed by the listing and its image rows, so it is rendered once
+    and re-rendered only when the images change. Renders run in a process
+    pool; a lock file stops other job processes on the host from rendering
+    the same listing at the same time.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._renders: Dict[str, asyncio.Future] = {}
+
+    def path_for(self, content_id: str, images: List[Dict[str, Any]]) -> str:
+        fingerprint = json.dumps(
+            [RENDER_VERSION, content_id, [(img.get("id"), str(img.get("updatedAt")), img.get("url")) for img in images]]
+        )
+        digest = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"walkthrough-{digest}.mp4")
+
+    def get(self, content_id: str, images: List[Dict[str, Any]]) -> Optional[str]:
+        path = self.path_for(content_id, images)
+        if not os.path.exists(path):
+            return None
+        os.utime(path)
+        return path
+
+    def ensure(self, content_id: str, images: List[Dict[str, Any]]) -> asyncio.Future:
+        """Start rendering unless the clip exists or is already being rendered; resolves to the path or None"""
+        path = self.path_for(content_id, images)
+        render = self._renders.get(path)
+        if render is None:
+            render = asyncio.ensure_future(self._render(path, [img["url"] for img in images if img.get("url")]))
+            self._renders[path] = render
+            render.add_done_callback(lambda _: self._renders.pop(path, None))
+        return render
+
+    async def _render(self, path: str, urls: List[str]) -> Optional[str]:
+        if os.path.exists(path):
+            return path
+        if not urls or not self._lock(path):
+            return None
+        try:
+            if self._pool is None:
+                # spawn: job processes run threads, which do not survive a fork
+                self._pool = ProcessPoolExecutor(
+                    max_workers=RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(self._pool, render_walkthrough, urls, path)
+            if result:
+                await loop.run_in_executor(None, self._evict)
+            return result
+        except Exception as e:
+            logger.error(f"Walkthrough render failed for {path}: {e}")
+            return None
+        finally:
+            self._unlock(path)
+
+    def _lock(self, path: str) -> bool:
+        os.makedirs(self.cache_dir, exist_ok=True)
+        lock_path = f"{path}.lock"
+        try:
+            if time.time() - os.path.getmtime(lock_path) > RENDER_TIMEOUT:
+                os.unlink(lock_path)
+        except FileNotFoundError:
+            pass
+        try:
+            os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            logger.info(f"Walkthrough {path} is being rendered by another process")
+            return False
+
+    def _unlock(self, path: str):
+        try:
+            os.unlink(f"{path}.lock")
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        clips = []
+        for name in os.listdir(self.cache_dir):
+            if name.startswith("walkthrough-") and name.endswith(".mp4"):
+                clip_path = os.path.join(self.cache_dir, name)
+                stat = os.stat(clip_path)
+                clips.append((stat.st_mtime, clip_path, stat.st_size))
+        total = sum(size for _, _, size in clips)
+        for _, clip_path, size in sorted(clips):
+            if total <= self.max_bytes:
+                break
+            os.unlink(clip_path)
+            total -= size
+            logger.info(f"Evicted walkthrough {clip_path}")
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# One per job process
+walkthrough_cache = WalkthroughCache()
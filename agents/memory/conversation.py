@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from livekit.agents import llm
+from livekit.plugins import openai
+
+from rag.context_packer import count_tokens
+
+logger = logging.getLogger("conversation-memory")
+
+WINDOW_TURNS = int(os.environ.get("MEMORY_WINDOW_TURNS", "8"))
+SUMMARIZE_EVERY = int(os.environ.get("MEMORY_SUMMARIZE_EVERY", "6"))
+SUMMARY_TOKEN_BUDGET = int(os.environ.get("MEMORY_SUMMARY_TOKENS", "250"))
+SUMMARY_MODEL = os.environ.get("MEMORY_SUMMARY_MODEL", "gpt-4o-mini")
+
+SUMMARY_PROMPT = (
+    "You maintain running notes for a real estate agent on a live call. "
+    "Merge the previous notes with the new conversation excerpt into concise notes "
+    "(under {budget} tokens). Keep the client's requirements, preferences, objections, "
+    "questions already answered and anything promised. Drop small talk."
+)
+
+
+class Turn:
+    __slots__ = ("role", "text", "ts")
+
+    def __init__(self, role: str, text: str, ts: float):
+        self.role = role
+        self.text = text
+        self.ts = ts
+
+    def render(self) -> str:
+        return f"{self.role}: {self.text}"
+
+
+class ConversationMemory:
+    """
+    Rolling conversation memory for a single agent session
+
+    Recent turns are kept verbatim; turns that fall out of the window are
+    folded into a running summary by a background task so the LLM prompt
+    stays bounded no matter how long the call runs. The prompt never holds
+    more than window_turns + summarize_every turns: if the background
+    summary falls that far behind (stalled or failing), the overflow is
+    folded in with the extractive summary instead.
+    """
+
+    def __init__(
+        self,
+        window_turns: int = WINDOW_TURNS,
+        summarize_every: int = SUMMARIZE_EVERY,
+        summary_token_budget: int = SUMMARY_TOKEN_BUDGET,
+        summary_llm: Optional[llm.LLM] = None,
+    ):
+        self.window_turns = window_turns
+        self.summarize_every = summarize_every
+        self.summary_token_budget = summary_token_budget
+        self.summary = ""
+        self.pinned: Dict[str, str] = {}
+        self._turns: Deque[Turn] = deque()
+        self._summary_llm = summary_llm
+        self._summary_task: Optional[asyncio.Task] = None
+        self.summarized_turns = 0
+        self.fallback_summaries = 0
+
+    def pin(self, key: str, value: Any):
+        if value is None or value == "":
+            self.pinned.pop(key, None)
+        else:
+            self.pinned[key] = str(value)
+
+    def add_turn(self, role: str, text: str):
+        text = " ".join((text or "").split())
+        if not text:
+            return
+        self._turns.append(Turn(role, text, time.time()))
+        if len(self._turns) >= self.window_turns + self.summarize_every:
+            self._schedule_summary()
+
+    @property
+    def unsummarized_turns(self) -> int:
+        return len(self._turns)
+
+    def render_context(self) -> str:
+        parts = []
+        if self.pinned:
+            facts = "\n".join(f"- {k}: {v}" for k, v in self.pinned.items())
+            parts.append(f"Pinned listing facts:\n{facts}")
+        if self.summary:
+            parts.append(f"Earlier in this call:\n{self.summary}")
+        return "\n\n".join(parts)
+
+    def trim_chat_ctx(self, chat_ctx: llm.ChatContext) -> llm.ChatContext:
+        """
+        Return a copy of chat_ctx holding the system instructions, the pinned
+        facts and summary, and only the turns not yet covered by the summary
+        """
+        items = list(chat_ctx.items)
+        head = 0
+        while (
+            head < len(items)
+            and items[head].type == "message"
+            and items[head].role in ("system", "developer")
+        ):
+            head += 1
+
+        if self.unsummarized_turns > self.window_turns + self.summarize_every:
+            self._fold_overflow()
+        keep = max(self.window_turns, self.unsummarized_turns)
+        cutoff = head
+        seen = 0
+        for i in range(len(items) - 1, head - 1, -1):
+            item = items[i]
+            if item.type == "message" and item.role in ("user", "assistant"):
+                seen += 1
+                if seen >= keep:
+                    cutoff = i
+                    break
+        # never open the window on a dangling tool output
+        while cutoff < len(items) and items[cutoff].type == "function_call_output":
+            cutoff += 1
+
+        trimmed = items[:head]
+        memory_text = self.render_context()
+        if memory_text:
+            trimmed.append(llm.ChatMessage(role="system", content=[memory_text]))
+        trimmed.extend(items[cutoff:])
+        return llm.ChatContext(trimmed)
+
+    def _schedule_summary(self):
+        if self._summary_task and not self._summary_task.done():
+            return
+        self._summary_task = asyncio.create_task(self._summarize())
+
+    async def _summarize(self):
+        count = len(self._turns) - self.window_turns
+        if count <= 0:
+            return
+        batch = [self._turns[i] for i in range(count)]
+        excerpt = "\n".join(turn.render() for turn in batch)
+        try:
+            summary = await self._summarize_with_llm(excerpt)
+        except Exception as e:
+            logger.warning(f"Summary LLM failed, falling back to extractive notes: {e}")
+            summary = self._extractive_summary(excerpt)
+
+        for _ in range(count):
+            self._turns.popleft()
+        self.summary = summary
+        self.summarized_turns += count
+        logger.info(
+            f"Compressed {count} turns into summary ({count_tokens(summary)} tokens)"
+        )
+
+    def _fold_overflow(self):
+        """Fold everything outside the window into the summary now, without the LLM"""
+        if self._summary_task and not self._summary_task.done():
+            # it would pop turns that are folded here
+            self._summary_task.cancel()
+        count = len(self._turns) - self.window_turns
+        batch = [self._turns.popleft() for _ in range(count)]
+        self.summary = self._extractive_summary("\n".join(turn.render() for turn in batch))
+        self.summarized_turns += count
+        self.fallback_summaries += 1
+        logger.warning(f"Background summary fell behind, folded {count} turns into extractive notes")
+
+    async def _summarize_with_llm(self, excerpt: str) -> str:
+        if self._summary_llm is None:
+            self._summary_llm = openai.LLM(model=SUMMARY_MODEL)
+
+        ctx = llm.ChatContext()
+        ctx.add_message(
+            role="system",
+            content=SUMMARY_PROMPT.format(budget=self.summary_token_budget),
+        )
+        ctx.add_message(
+            role="user",
+            content=f"Previous notes:\n{self.summary or '(none)'}\n\nNew excerpt:\n{excerpt}",
+        )
+
+        parts: List[str] = []
+        async with self._summary_llm.chat(chat_ctx=ctx) as stream:
+            async for chunk in stream:
+                if chunk.delta and chunk.delta.content:
+                    parts.append(chunk.delta.content)
+        summary = "".join(parts).strip()
+        if not summary:
+            raise ValueError("empty summary")
+        return self._clip(summary)
+
+    def _extractive_summary(self, excerpt: str) -> str:
+        merged = f"{self.summary}\n{excerpt}".strip() if self.summary else excerpt
+        # keep the most recent notes when over budget
+        lines = merged.splitlines()
+        kept: List[str] = []
+        used = 0
+        for line in reversed(lines):
+            cost = count_tokens(line) + 1
+            if used + cost > self.summary_token_budget:
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(reversed(kept))
+
+    def _clip(self, text: str) -> str:
+        if count_tokens(text) <= self.summary_token_budget:
+            return text
+        words = text.split()
+        while words and count_tokens(" ".join(words)) > self.summary_token_budget:
+            words = words[: int(len(words) * 0.9)]
+        return " ".join(words)
+
+    async def aclose(self):
+        if self._summary_task and not self._summary_task.done():
+            self._summary_task.cancel()
+            try:
+                await self._summary_task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "recent_turns": len(self._turns),
+            "summarized_turns": self.summarized_turns,
+            "fallback_summaries": self.fallback_summaries,
+            "summary_tokens": count_tokens(self.summary) if self.summary else 0,
+            "pinned_facts": len(self.pinned),
+        }
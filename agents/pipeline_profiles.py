@@ -0,0 +1,218 @@
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import psutil
+from livekit.agents import AgentSession, metrics
+from livekit.plugins import deepgram, openai, silero
+from livekit.plugins.turn_detector.english import EnglishModel
+
+from telemetry.stage_stats import StageLatencyStats
+
+logger = logging.getLogger("pipeline-profiles")
+
+DEFAULT_PROFILE = os.environ.get("PIPELINE_PROFILE", "balanced")
+FALLBACK_PROFILE = "low-latency"
+
+# Per-stage p95 budgets (seconds) and host CPU budget (percent) that trigger the fallback
+STAGE_BUDGETS = {
+    "llm_ttft": float(os.environ.get("PIPELINE_LLM_TTFT_BUDGET", "1.0")),
+    "tts_ttfb": float(os.environ.get("PIPELINE_TTS_TTFB_BUDGET", "0.6")),
+    "eou_delay": float(os.environ.get("PIPELINE_EOU_BUDGET", "1.0")),
+}
+CPU_BUDGET = float(os.environ.get("PIPELINE_CPU_BUDGET", "85"))
+# Host CPU is sampled with every metrics event, into the same host-wide stats
+CPU_STAGE = "cpu"
+# Recover only once every stage is comfortably back under budget
+RECOVERY_RATIO = 0.7
+
+
+class PipelineProfile:
+    def __init__(
+        self,
+        name: str,
+        llm_model: str,
+        stt_model: str,
+        tts_model: str,
+        tts_voice: str,
+        vad_options: Dict[str, float],
+        turn_detection: bool,
+        max_tool_steps: int,
+    ):
+        self.name = name
+        self.llm_model = llm_model
+        self.stt_model = stt_model
+        self.tts_model = tts_model
+        self.tts_voice = tts_voice
+        self.vad_options = vad_options
+        self.turn_detection = turn_detection
+        self.max_tool_steps = max_tool_steps
+
+
+PROFILES: Dict[str, PipelineProfile] = {
+    "low-latency": PipelineProfile(
+        name="low-latency",
+        llm_model="gpt-4o-mini",
+        stt_model="nova-3",
+        tts_model="tts-1",
+        tts_voice="alloy",
+        vad_options={"min_silence_duration": 0.35},
+        turn_detection=False,
+        max_tool_steps=2,
+    ),
+    "balanced": PipelineProfile(
+        name="balanced",
+        llm_model="gpt-4o-mini",
+        stt_model="nova-3",
+        tts_model="gpt-4o-mini-tts",
+        tts_voice="alloy",
+        vad_options={"min_silence_duration": 0.55},
+        turn_detection=True,
+        max_tool_steps=3,
+    ),
+    "quality": PipelineProfile(
+        name="quality",
+        llm_model="gpt-4.1",
+        stt_model="nova-3",
+        tts_model="gpt-4o-mini-tts",
+        tts_voice="alloy",
+        vad_options={"min_silence_duration": 0.55},
+        turn_detection=True,
+        max_tool_steps=5,
+    ),
+}
+
+
+class ProfileSelector:
+    """
+    Chooses the pipeline profile for each new session on the host
+
+    Per-stage latencies reported by sessions go to host-wide stats shared by
+    every job process, since each process only sees its own one session.
+    While the p95 of any stage (or the median host CPU) is over budget, new
+    sessions get the low-latency profile; the configured profile comes back
+    once every stage has recovered. The active profile and the switch count
+    are kept in the stats' host-wide state, so the recovery threshold
+    applies across job processes rather than to one process's first pick.
+    """
+
+    def __init__(self, configured: str = DEFAULT_PROFILE, stage_stats: Optional[StageLatencyStats] = None):
+        if configured not in PROFILES:
+            logger.warning(f"Unknown pipeline profile '{configured}', using balanced")
+            configured = "balanced"
+        self.configured = configured
+        self.active = configured
+        self.stage_stats = stage_stats or StageLatencyStats()
+        self.stage_latency: Dict[str, float] = {}
+        self.cpu: Optional[float] = None
+        self.switches = 0
+        self.last_switch: Optional[Dict[str, Any]] = None
+        # the first reading only starts psutil's interval
+        psutil.cpu_percent(interval=None)
+
+    def observe(self, ev_metrics: Any):
+        if isinstance(ev_metrics, metrics.LLMMetrics):
+            self._update("llm_ttft", ev_metrics.ttft)
+        elif isinstance(ev_metrics, metrics.TTSMetrics):
+            self._update("tts_ttfb", ev_metrics.ttfb)
+        elif isinstance(ev_metrics, metrics.EOUMetrics):
+            self._update("eou_delay", ev_metrics.end_of_utterance_delay)
+        else:
+            return
+        self._update(CPU_STAGE, psutil.cpu_percent(interval=None))
+
+    def _update(self, stage: str, value: Optional[float]):
+        if value is None or value < 0:
+            return
+        self.stage_stats.add(stage, value)
+
+    def flush(self):
+        """Publish this session's last samples before the job process exits"""
+        self.stage_stats.flush()
+
+    def _over_budget(self, ratio: float = 1.0) -> List[str]:
+        p95 = self.stage_stats.percentiles(95)
+        self.stage_latency = {stage: latency for stage, latency in p95.items() if stage in STAGE_BUDGETS}
+        self.cpu = self.stage_stats.percentiles(50).get(CPU_STAGE)
+        over = [
+            stage
+            for stage, latency in self.stage_latency.items()
+            if latency > STAGE_BUDGETS[stage] * ratio
+        ]
+        if self.cpu is not None and self.cpu > CPU_BUDGET * ratio:
+            over.append(CPU_STAGE)
+        return over
+
+    def select(self) -> PipelineProfile:
+        state = self.stage_stats.load_state()
+        # a state left by a differently configured worker does not apply
+        if state.get("active") in (self.configured, FALLBACK_PROFILE):
+            self.active = state["active"]
+        self.switches = state.get("switches", 0)
+        if self.active != FALLBACK_PROFILE:
+            over = self._over_budget()
+            if over:
+                self._switch(FALLBACK_PROFILE, over)
+        elif self.configured != FALLBACK_PROFILE and not self._over_budget(RECOVERY_RATIO):
+            self._switch(self.configured, [])
+        return PROFILES[self.active]
+
+    def _switch(self, profile: str, reasons: List[str]):
+        switch = {
+            "ts": time.time(),
+            "from": self.active,
+            "to": profile,
+            "reasons": reasons,
+            "stage_p95": {k: round(v, 3) for k, v in self.stage_latency.items()},
+            "cpu": self.cpu,
+        }
+        self.last_switch = switch
+        self.switches += 1
+        self.active = profile
+        self.stage_stats.save_state({"active": profile, "switches": self.switches, "last_switch": switch})
+        logger.warning(
+            f"Switching pipeline profile {switch['from']} -> {profile}",
+            extra={"profile_switch": switch},
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "configured": self.configured,
+            "active": self.active,
+            "stage_p95": {k: round(v, 3) for k, v in self.stage_latency.items()},
+            "cpu": self.cpu,
+            "switches": self.switches,
+        }
+
+
+def load_vads(userdata: Dict[str, Any], names=(DEFAULT_PROFILE, FALLBACK_PROFILE)):
+    """Prewarm one Silero VAD per distinct profile VAD setting"""
+    vads = userdata.setdefault("vads", {})
+    for name in names:
+        profile = PROFILES.get(name)
+        if profile is None:
+            continue
+        key = tuple(sorted(profile.vad_options.items()))
+        if key not in vads:
+            vads[key] = silero.VAD.load(**profile.vad_options)
+    return vads
+
+
+def build_session(profile: PipelineProfile, userdata: Dict[str, Any]) -> AgentSession:
+    vads = load_vads(userdata, names=(profile.name,))
+    options: Dict[str, Any] = {}
+    if profile.turn_detection:
+        options["turn_detection"] = EnglishModel()
+    return AgentSession(
+        vad=vads[tuple(sorted(profile.vad_options.items()))],
+        llm=openai.LLM(model=profile.llm_model),
+        stt=deepgram.STT(model=profile.stt_model),
+        tts=openai.TTS(model=profile.tts_model, voice=profile.tts_voice),
+        max_tool_steps=profile.max_tool_steps,
+        **options,
+    )
+
+
+# Shared by every session in the worker process
+profile_selector = ProfileSelector()
@@ -0,0 +1,246 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+from rag.context_packer import normalize_query
+
+logger = logging.getLogger("answer-cache")
+
+SIMILARITY_THRESHOLD = float(os.environ.get("ANSWER_CACHE_SIMILARITY", "0.92"))
+MAX_ENTRIES_PER_LISTING = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", "64"))
+CACHE_DIR = os.environ.get("ANSWER_CACHE_DIR")
+
+# Questions buyers ask in nearly every session, matched without an embedding call.
+# Each pattern names the fact about the property itself ("where is the house",
+# not "where is the laundry room"), and detect_intent() also requires that the
+# rest of the question adds nothing a canned answer would miss.
+INTENT_PATTERNS = {
+    "price": re.compile(
+        r"\b(asking price|list(ing)? price|price|how much (is it|is the (house|home|property|place)|does it cost|are they asking))\b"
+    ),
+    "bedrooms": re.compile(r"\b(bed ?rooms?|beds|bdrms?)\b"),
+    "bathrooms": re.compile(r"\b(bath ?rooms?|baths)\b"),
+    "square_footage": re.compile(
+        r"\b(square (feet|foot|footage)|sq ?ft|sqft|how big is (it|the (house|home|property|place))|size of the (house|home))\b"
+    ),
+    "lot_size": re.compile(r"\b(lot size|size of the lot|how big is the (lot|yard)|acres?|acreage)\b"),
+    "location": re.compile(
+        r"\b(where is (it|the (house|home|property|place))( located)?|location|located|address|neighbou?rhood)\b"
+    ),
+    "year_built": re.compile(
+        r"\b(year built|when was (it|the (house|home|property|place)) built|how old is (it|the (house|home|property|place)))\b"
+    ),
+    "parking": re.compile(r"\b(garage|parking|driveway)\b"),
+    "schools": re.compile(r"\b(schools?|school district)\b"),
+    "hoa": re.compile(r"\b(hoa( fees?| dues)?|association (fees?|dues))\b"),
+}
+# Words that may surround an intent without changing what is being asked
+_FILLER_WORDS = frozenset(
+    "a an and any are about can could did do does exactly for get got has have how i in is it its "
+    "know like listing many me much near nearby of on place please property house home roughly s "
+    "so tell that the there this to total want was what whats which with would you good close".split()
+)
+# Bump when the patterns change, so intents stored under the old rules are dropped
+INTENT_RULES_VERSION = 2
+
+
+def detect_intent(query: str) -> Optional[str]:
+    """
+    Return the single intent a query asks about, or None to go to retrieval
+
+    None for compound questions, questions about something else that share
+    a keyword ("how much are property taxes"), and questions that qualify
+    the intent ("is the garage heated").
+    """
+    text = normalize_query(query)
+    matches = [(name, pattern.search(text)) for name, pattern in INTENT_PATTERNS.items()]
+    matches = [(name, match) for name, match in matches if match]
+    if len(matches) != 1:
+        return None
+    name, match = matches[0]
+    rest = f"{text[:match.start()]} {text[match.end():]}".split()
+    if any(word not in _FILLER_WORDS for word in rest):
+        return None
+    return name
+
+
+class _ListingEntries:
+    __slots__ = ("version", "intents", "queries", "answers", "vectors")
+
+    def __init__(self, version: str):
+        self.version = version
+        self.intents: Dict[str, str] = {}
+        self.queries: List[str] = []
+        self.answers: List[str] = []
+        self.vectors: Optional[np.ndarray] = None
+
+
+class AnswerCache:
+    """
+    Per-listing cache of retrieved context and short canonical answers
+
+    Lookups match first on a keyword intent (no embedding needed) and then on
+    cosine similarity of the query embedding. Entries are dropped whenever the
+    listing's updatedAt changes. Shared by all sessions in the worker process.
+    """
+
+    def __init__(
+        self,
+        similarity_threshold: float = SIMILARITY_THRESHOLD,
+        max_entries: int = MAX_ENTRIES_PER_LISTING,
+        cache_dir: Optional[str] = CACHE_DIR,
+    ):
+        self.similarity_threshold = similarity_threshold
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self._listings: Dict[str, _ListingEntries] = {}
+        self._lock = threading.Lock()
+        self.intent_hits = 0
+        self.embedding_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _entries(self, listing_id: str, version: str) -> _ListingEntries:
+        entries = self._listings.get(listing_id)
+        if entries is None and self.cache_dir:
+            entries = self._load(listing_id)
+        if entries is not None and entries.version != version:
+            self.invalidations += 1
+            logger.info(f"Listing {listing_id} changed, dropping cached answers")
+            entries = None
+        if entries is None:
+            entries = _ListingEntries(version)
+        self._listings[listing_id] = entries
+        return entries
+
+    def get_by_intent(self, listing_id: str, version: str, query: str) -> Optional[str]:
+        intent = detect_intent(query)
+        if intent is None:
+            return None
+        with self._lock:
+            answer = self._entries(listing_id, version).intents.get(intent)
+        if answer is not None:
+            self.intent_hits += 1
+        return answer
+
+    def get_by_embedding(
+        self, listing_id: str, version: str, embedding: Sequence[float]
+    ) -> Optional[str]:
+        with self._lock:
+            entries = self._entries(listing_id, version)
+            if entries.vectors is None or not len(entries.answers):
+                self.misses += 1
+                return None
+            query = _unit(embedding)
+            scores = entries.vectors @ query
+            best = int(np.argmax(scores))
+            if scores[best] < self.similarity_threshold:
+                self.misses += 1
+                return None
+            self.embedding_hits += 1
+            return entries.answers[best]
+
+    def put(
+        self,
+        listing_id: str,
+        version: str,
+        query: str,
+        answer: str,
+        embedding: Optional[Sequence[float]] = None,
+    ):
+        with self._lock:
+            entries = self._entries(listing_id, version)
+            intent = detect_intent(query)
+            if intent is not None:
+                entries.intents[intent] = answer
+            if embedding is not None:
+                vector = _unit(embedding)[np.newaxis, :]
+                if entries.vectors is None:
+                    entries.vectors = vector
+                else:
+                    entries.vectors = np.vstack([entries.vectors, vector])
+                entries.queries.append(query)
+                entries.answers.append(answer)
+                if len(entries.answers) > self.max_entries:
+                    entries.vectors = entries.vectors[1:]
+                    entries.queries.pop(0)
+                    entries.answers.pop(0)
+        if self.cache_dir:
+            self._save(listing_id)
+
+    def put_canonical(self, listing_id: str, version: str, intent: str, answer: str):
+        """Seed an intent answer straight from listing fields, e.g. the price column"""
+        with self._lock:
+            self._entries(listing_id, version).intents[intent] = answer
+
+    def _path(self, listing_id: str) -> str:
+        safe = re.sub(r"[^A-Za-z0-9_-]", "_", listing_id)
+        return os.path.join(self.cache_dir, f"{safe}.json")
+
+    def _load(self, listing_id: str) -> Optional[_ListingEntries]:
+        try:
+            with open(self._path(listing_id)) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not read answer cache for {listing_id}: {e}")
+            return None
+        entries = _ListingEntries(data["version"])
+        if data.get("intent_rules") == INTENT_RULES_VERSION:
+            entries.intents = data.get("intents", {})
+        entries.queries = data.get("queries", [])
+        entries.answers = data.get("answers", [])
+        if data.get("vectors"):
+            entries.vectors = np.asarray(data["vectors"], dtype=np.float32)
+        return entries
+
+    def _save(self, listing_id: str):
+        with self._lock:
+            entries = self._listings.get(listing_id)
+            if entries is None:
+                return
+            data = {
+                "version": entries.version,
+                "intent_rules": INTENT_RULES_VERSION,
+                "intents": dict(entries.intents),
+                "queries": list(entries.queries),
+                "answers": list(entries.answers),
+                "vectors": entries.vectors.round(5).tolist() if entries.vectors is not None else [],
+            }
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._path(listing_id))
+        except Exception as e:
+            logger.warning(f"Could not persist answer cache for {listing_id}: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.intent_hits + self.embedding_hits
+        total = hits + self.misses
+        return {
+            "listings": len(self._listings),
+            "intent_hits": self.intent_hits,
+            "embedding_hits": self.embedding_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": hits / total if total else 0.0,
+        }
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    array = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm else array
+
+
+# Shared across sessions in the same worker process
+answer_cache = AnswerCache()
@@ -0,0 +1,234 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("context-packer")
+
+DEFAULT_TOKEN_BUDGET = int(os.environ.get("RAG_CONTEXT_TOKEN_BUDGET", "300"))
+DEFAULT_CACHE_SIZE = int(os.environ.get("RAG_CONTEXT_CACHE_SIZE", "256"))
+DEFAULT_CACHE_TTL = float(os.environ.get("RAG_CONTEXT_CACHE_TTL", "600"))
+# A sentence cut at a chunk boundary shares at least this many words with its other piece
+MIN_OVERLAP_WORDS = 5
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-z0-9$]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from has have how i in is it its me "
+    "of on or so that the there this to was what when where which who why will "
+    "with you your can tell about any".split()
+)
+
+
+def _load_tokenizer() -> Callable[[str], int]:
+    """Return a token counter, preferring tiktoken and falling back to a char heuristic"""
+    try:
+        import tiktoken
+
+        encoding = tiktoken.get_encoding("o200k_base")
+        return lambda text: len(encoding.encode_ordinary(text))
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable ({e}), using approximate token counts")
+        return lambda text: max(1, (len(text) + 3) // 4)
+
+
+count_tokens = _load_tokenizer()
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(_WORD.findall(query.lower()))
+
+
+def _terms(text: str) -> List[str]:
+    return [t for t in _WORD.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_SPLIT.split(text) if s and s.strip()]
+
+
+def _overlap(head: List[str], tail: List[str]) -> int:
+    """Words at the end of head that tail starts with"""
+    for size in range(min(len(head), len(tail)) - 1, MIN_OVERLAP_WORDS - 1, -1):
+        if head[-size:] == tail[:size]:
+            return size
+    return 0
+
+
+def _after_words(sentence: str, count: int) -> str:
+    starts = [m.start() for m in _WORD.finditer(sentence.lower())]
+    return sentence[starts[count]:]
+
+
+def dedupe_sentences(chunks: Sequence[str]) -> List[str]:
+    """
+    Flatten chunks into sentences, dropping the repeats produced by chunk overlap
+
+    Chunks are built upstream with a 50-token overlap, so the tail of one chunk
+    reappears at the head of the next, usually cut mid-sentence. A sentence
+    already contained in a kept one is dropped, a kept one contained in a
+    new sentence is replaced by it, and the two pieces of a sentence cut
+    at a chunk boundary are joined. First-seen order is kept.
+    """
+    kept: List[Tuple[str, str]] = []
+    for chunk in chunks:
+        for sentence in split_sentences(chunk):
+            key = normalize_query(sentence)
+            if not key:
+                continue
+            for i, (kept_key, kept_sentence) in enumerate(kept):
+                if f" {key} " in f" {kept_key} ":
+                    break
+                if f" {kept_key} " in f" {key} ":
+                    kept[i] = (key, sentence)
+                    break
+                words, kept_words = key.split(), kept_key.split()
+                overlap = _overlap(kept_words, words)
+                if overlap:
+                    kept[i] = (" ".join(kept_words + words[overlap:]), f"{kept_sentence} {_after_words(sentence, overlap)}")
+                    break
+            else:
+                kept.append((key, sentence))
+    return [sentence for _, sentence in kept]
+
+
+def _score_sentences(query: str, sentences: List[str]) -> List[float]:
+    query_terms = set(_terms(query))
+    if not query_terms:
+        return [0.0] * len(sentences)
+
+    sentence_terms = [set(_terms(s)) for s in sentences]
+    doc_freq: Dict[str, int] = {}
+    for terms in sentence_terms:
+        for term in terms & query_terms:
+            doc_freq[term] = doc_freq.get(term, 0) + 1
+
+    total = len(sentences)
+    scores = []
+    for terms in sentence_terms:
+        score = 0.0
+        for term in terms & query_terms:
+            # rarer matching terms are more discriminative
+            score += 1.0 + (total / doc_freq[term]) ** 0.5
+        scores.append(score)
+    return scores
+
+
+def pack_sentences(
+    query: str, chunks: Sequence[str], token_budget: int, sub_queries: Sequence[str] = ()
+) -> List[str]:
+    """
+    Select the sentences most relevant to the query that fit in the token budget
+
+    For a compound question split into sub_queries, the best sentence of
+    each part is taken first, so no part loses out to another that matches
+    more sentences.
+
+    Sentences that share no terms with the query still came back from the
+    vector search, so they fill whatever budget the matching ones leave, in
+    retrieval order. Returns the chosen sentences in their original order
+    so the packed text still reads naturally.
+    """
+    sentences = dedupe_sentences(chunks)
+    if not sentences:
+        return []
+
+    scores = _score_sentences(query, sentences)
+    # ties keep retrieval order, which already reflects vector similarity
+    ranked = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))
+    first: List[int] = []
+    for sub_query in sub_queries:
+        sub_scores = _score_sentences(sub_query, sentences)
+        best = max(range(len(sentences)), key=lambda i: (sub_scores[i], -i))
+        if sub_scores[best] > 0 and best not in first:
+            first.append(best)
+    ranked = first + [i for i in ranked if i not in first]
+
+    chosen = []
+    used = 0
+    for i in ranked:
+        cost = count_tokens(sentences[i]) + 1
+        if used + cost > token_budget:
+            continue
+        chosen.append(i)
+        used += cost
+
+    return [sentences[i] for i in sorted(chosen)]
+
+
+class ContextPacker:
+    """Builds compact, token-budgeted tool output from retrieved chunks"""
+
+    def __init__(
+        self,
+        token_budget: int = DEFAULT_TOKEN_BUDGET,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        cache_ttl: float = DEFAULT_CACHE_TTL,
+    ):
+        self.token_budget = token_budget
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[Tuple[str, str], Tuple[float, str]]" = OrderedDict()
+        # pack() runs on executor threads while lookups run on the event loop
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_cached(self, listing_key: str, query: str) -> Optional[str]:
+        key = (listing_key or "", normalize_query(query))
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, packed = entry
+            if time.monotonic() - stored_at > self.cache_ttl:
+                del self._cache[key]
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return packed
+
+    def pack(self, listing_key: str, query: str, chunks: Sequence[str], sub_queries: Sequence[str] = ()) -> str:
+        sentences = pack_sentences(query, chunks, self.token_budget, sub_queries)
+        packed = "\n".join(f"- {s}" for s in sentences)
+
+        key = (listing_key or "", normalize_query(query))
+        with self._lock:
+            self._cache[key] = (time.monotonic(), packed)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        logger.debug(
+            f"Packed {len(chunks)} chunks into {len(sentences)} sentences "
+            f"({count_tokens(packed)} tokens, budget {self.token_budget})"
+        )
+        return packed
+
+    def invalidate(self, listing_key: Optional[str] = None):
+        with self._lock:
+            if listing_key is None:
+                self._cache.clear()
+                return
+            for key in [k for k in self._cache if k[0] == listing_key]:
+                del self._cache[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = len(self._cache)
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+# Shared across sessions in the same worker process
+context_packer = ContextPacker()
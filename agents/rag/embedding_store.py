@@ -0,0 +1,343 @@
+"""
+Compact local store for listing chunk embeddings
+
+    python -m rag.embedding_store build --content-id ID   # copy a listing's chunks from Pinecone
+    python -m rag.embedding_store build --all
+    python -m rag.embedding_store bench --synthetic 20000 -k 3 -k 10
+
+Each listing is a directory of .npy files opened with mmap:
+
+    codes.npy   int8 [n, STORE_DIMS]  truncated, normalized, scalar-quantized vectors
+    scales.npy  float32 [n]           per-vector dequantization scale
+    full.npy    float32 [n, dims]     normalized full vectors, read only to re-rank candidates
+    chunks.json                       chunk text and metadata, and the listing's updatedAt
+
+A search scores every chunk against the int8 codes, then re-ranks the top
+k * RERANK_FACTOR candidates with exact float dot products. Resident
+memory per chunk is STORE_DIMS + 4 bytes instead of 4 * dims. A listing
+edited since its store was built is not searched, so callers fall back to
+Pinecone until it is rebuilt.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("embedding-store")
+
+STORE_DIR = os.environ.get(
+    "EMBEDDING_STORE_DIR", os.path.join(tempfile.gettempdir(), "convomate-embeddings")
+)
+# text-embedding-3 models are trained so a prefix of the vector is itself a usable embedding
+STORE_DIMS = int(os.environ.get("EMBEDDING_STORE_DIMS", "512"))
+RERANK_FACTOR = int(os.environ.get("EMBEDDING_STORE_RERANK_FACTOR", "4"))
+MAX_OPEN_LISTINGS = 256
+# The most matches Pinecone returns for one query that includes values
+PINECONE_QUERY_LIMIT = 1000
+STORE_VERSION = 1
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+def quantize(vectors: np.ndarray, dims: int = STORE_DIMS):
+    """Truncate to dims, renormalize and scale each vector into int8; returns (codes, scales)"""
+    truncated = _normalize(np.asarray(vectors, dtype=np.float32)[:, :dims])
+    scales = np.abs(truncated).max(axis=1) / 127.0
+    scales = np.maximum(scales, 1e-12).astype(np.float32)
+    codes = np.clip(np.rint(truncated / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+class _Listing:
+    __slots__ = ("codes", "scales", "full", "chunks", "version")
+
+    def __init__(self, path: str):
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy"), mmap_mode="r")
+        self.full = np.load(os.path.join(path, "full.npy"), mmap_mode="r")
+        with open(os.path.join(path, "chunks.json")) as f:
+            data = json.load(f)
+        self.chunks = data["chunks"]
+        self.version = data.get("listing_version")
+
+
+class EmbeddingStore:
+    """Per-listing quantized embeddings with exact re-ranking of the top candidates"""
+
+    def __init__(self, store_dir: str = STORE_DIR, dims: int = STORE_DIMS, rerank_factor: int = RERANK_FACTOR):
+        self.store_dir = store_dir
+        self.dims = dims
+        self.rerank_factor = rerank_factor
+        self._open: "OrderedDict[str, Any]" = OrderedDict()
+
+    def _path(self, listing_key: str) -> str:
+        safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in listing_key)
+        return os.path.join(self.store_dir, safe_id)
+
+    def write(
+        self, listing_key: str, vectors: np.ndarray, chunks: List[Dict[str, Any]], version: Optional[str] = None
+    ):
+        """Replace a listing's entries; chunks[i] describes vectors[i], version is the listing's updatedAt"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        codes, scales = quantize(vectors, self.dims)
+        path = self._path(listing_key)
+        os.makedirs(self.store_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=".staging-", dir=self.store_dir)
+        np.save(os.path.join(staging, "codes.npy"), codes)
+        np.save(os.path.join(staging, "scales.npy"), scales)
+        np.save(os.path.join(staging, "full.npy"), _normalize(vectors))
+        with open(os.path.join(staging, "chunks.json"), "w") as f:
+            json.dump(
+                {"version": STORE_VERSION, "dims": self.dims, "listing_version": version, "chunks": chunks}, f
+            )
+        # readers keep the mapped files of the old version until they reopen
+        old = f"{path}.old"
+        if os.path.exists(path):
+            os.replace(path, old)
+        os.replace(staging, path)
+        shutil.rmtree(old, ignore_errors=True)
+        self._open.pop(listing_key, None)
+
+    def _listing(self, listing_key: str) -> Optional[_Listing]:
+        path = self._path(listing_key)
+        cached = self._open.get(listing_key)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            self._open.pop(listing_key, None)
+            return None
+        if cached is not None and cached[0] == mtime:
+            self._open.move_to_end(listing_key)
+            return cached[1]
+        try:
+            listing = _Listing(path)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Unreadable embedding store for {listing_key}: {e}")
+            return None
+        self._open[listing_key] = (mtime, listing)
+        while len(self._open) > MAX_OPEN_LISTINGS:
+            self._open.popitem(last=False)
+        return listing
+
+    def has(self, listing_key: str) -> bool:
+        return os.path.isdir(self._path(listing_key))
+
+    def search(
+        self, listing_key: str, query: Sequence[float], k: int, version: Optional[str] = None
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Top-k chunks as {"score", **chunk}
+
+        None if the listing is not stored, or if version (the listing's
+        current updatedAt) is given and the store was built from another.
+        """
+        listing = self._listing(listing_key)
+        if listing is None:
+            return None
+        if version is not None and listing.version != version:
+            logger.info(f"Embedding store for {listing_key} is from {listing.version}, listing is at {version}")
+            return None
+        return self._search(listing, np.asarray(query, dtype=np.float32), k)
+
+    def _search(self, listing: _Listing, query: np.ndarray, k: int) -> List[Dict[str, Any]]:
+        rows, scores = self._rank(listing, query, k)
+        return [{"score": float(score), **listing.chunks[row]} for row, score in zip(rows, scores)]
+
+    def _rank(self, listing: _Listing, query: np.ndarray, k: int):
+        n = len(listing.chunks)
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        q = _normalize(query[: self.dims])
+        approx = (listing.codes @ q) * listing.scales
+        candidates = min(n, k * self.rerank_factor)
+        if candidates < n:
+            top = np.argpartition(-approx, candidates - 1)[:candidates]
+        else:
+            top = np.arange(n)
+        # only these rows of the full-precision file are paged in
+        top = np.sort(top)
+        exact = listing.full[top] @ _normalize(query)
+        order = np.argsort(-exact)[:k]
+        return top[order], exact[order]
+
+    def footprint(self, listing_key: str) -> Dict[str, int]:
+        listing = self._listing(listing_key)
+        if listing is None:
+            return {}
+        return {
+            "chunks": len(listing.chunks),
+            "resident_bytes": listing.codes.nbytes + listing.scales.nbytes,
+            "full_bytes": listing.full.nbytes,
+        }
+
+
+# One per job process; the mapped pages are shared through the OS page cache
+embedding_store = EmbeddingStore()
+
+
+def _exact_rank(listing: _Listing, query: np.ndarray, k: int) -> np.ndarray:
+    scores = np.asarray(listing.full) @ _normalize(query)
+    return np.argsort(-scores)[:k]
+
+
+def bench(store: EmbeddingStore, keys: List[str], ks: List[int], queries: int, noise: float, seed: int = 0):
+    """
+    Recall@k of the compact search against exact full-precision search
+
+    Queries are stored vectors plus Gaussian noise, standing in for questions
+    that land near a chunk.
+    """
+    rng = np.random.default_rng(seed)
+    found_total = {k: 0 for k in ks}
+    asked = 0
+    compact_s = exact_s = 0.0
+    resident = full = chunks = 0
+    for key in keys:
+        listing = store._listing(key)
+        if listing is None or not listing.chunks:
+            continue
+        vectors = np.asarray(listing.full)
+        chunks += len(vectors)
+        resident += listing.codes.nbytes + listing.scales.nbytes
+        full += listing.full.nbytes
+        picks = rng.integers(0, len(vectors), queries)
+        for query in _normalize(vectors[picks] + rng.normal(0, noise, (queries, vectors.shape[1])).astype(np.float32)):
+            started = time.perf_counter()
+            rows, _ = store._rank(listing, query, max(ks))
+            compact_s += time.perf_counter() - started
+            started = time.perf_counter()
+            truth = _exact_rank(listing, query, max(ks))
+            exact_s += time.perf_counter() - started
+            for k in ks:
+                found_total[k] += len(set(rows[:k].tolist()) & set(truth[:k].tolist()))
+            asked += 1
+    if not asked:
+        return {}
+    return {
+        "listings": len(keys),
+        "chunks": chunks,
+        "queries": asked,
+        "dims": store.dims,
+        "rerank_factor": store.rerank_factor,
+        "recall": {f"@{k}": round(found_total[k] / (k * asked), 4) for k in ks},
+        "resident_bytes_per_chunk": round(resident / chunks, 1),
+        "full_bytes_per_chunk": round(full / chunks, 1),
+        "compact_ms_per_query": round(compact_s / asked * 1000, 3),
+        "exact_ms_per_query": round(exact_s / asked * 1000, 3),
+    }
+
+
+def _synthetic_store(n: int, dims: int, clusters: int, seed: int) -> EmbeddingStore:
+    """Clustered random vectors; real embeddings truncate better than these"""
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dims)).astype(np.float32)
+    vectors = centers[rng.integers(0, clusters, n)] + rng.normal(0, 0.6, (n, dims)).astype(np.float32)
+    store = EmbeddingStore(tempfile.mkdtemp(prefix="embedding-bench-"))
+    store.write("synthetic", vectors, [{"text": ""} for _ in range(n)])
+    return store
+
+
+async def build(content_ids: Optional[List[str]], store: EmbeddingStore = embedding_store):
+    """Copy listings' chunk vectors from Pinecone into the local store"""
+    from pinecone import Pinecone
+
+    from database.db import db
+
+    index = Pinecone(api_key=os.environ.get("PINECONE_API_KEY")).Index(
+        os.environ.get("PINECONE_INDEX_NAME", "web-scraper-index-three")
+    )
+    dimension = index.describe_index_stats()["dimension"]
+    probe = [1.0 / np.sqrt(dimension)] * dimension
+    if content_ids:
+        listings = [await db.get_scraped_content_with_media_info(content_id) for content_id in content_ids]
+    else:
+        listings = await db.get_all_listings()
+    await db.disconnect()
+
+    for listing in filter(None, listings):
+        # every chunk of the listing matches the filter, so any probe vector lists them all
+        response = index.query(
+            vector=probe,
+            top_k=PINECONE_QUERY_LIMIT,
+            include_values=True,
+            include_metadata=True,
+            namespace="default",
+            filter={"url": {"$eq": listing["url"]}},
+        )
+        matches = [m for m in response.matches if m.metadata and "text" in m.metadata]
+        if not matches:
+            logger.info(f"No chunks in Pinecone for {listing['id']}")
+            continue
+        if len(response.matches) >= PINECONE_QUERY_LIMIT:
+            # a truncated store would quietly miss chunks; leave the listing to Pinecone
+            logger.error(
+                f"{listing['id']} has {PINECONE_QUERY_LIMIT} or more chunks in Pinecone, "
+                f"more than one query returns; not storing it locally"
+            )
+            continue
+        store.write(
+            listing["id"],
+            np.array([m.values for m in matches], dtype=np.float32),
+            [{"text": m.metadata["text"], "metadata": {k: v for k, v in m.metadata.items() if k != "text"}} for m in matches],
+            version=listing["updatedAt"].isoformat(),
+        )
+        logger.info(f"Stored {len(matches)} chunks for {listing['id']}: {store.footprint(listing['id'])}")
+
+
+def main():
+    import asyncio
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="copy listing chunks from Pinecone")
+    build_parser.add_argument("--content-id", action="append", dest="content_ids")
+    build_parser.add_argument("--all", action="store_true")
+    bench_parser = sub.add_parser("bench", help="recall@k of the compact search against full precision")
+    bench_parser.add_argument("--content-id", action="append", dest="content_ids")
+    bench_parser.add_argument("--synthetic", type=int, help="benchmark on this many clustered random vectors instead")
+    bench_parser.add_argument("-k", type=int, action="append", dest="ks")
+    bench_parser.add_argument("--queries", type=int, default=200, help="queries per listing")
+    bench_parser.add_argument("--noise", type=float, default=0.02)
+    bench_parser.add_argument("--dims", type=int, default=STORE_DIMS)
+    bench_parser.add_argument("--rerank-factor", type=int, default=RERANK_FACTOR)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "build":
+        if not args.content_ids and not args.all:
+            parser.error("build needs --content-id or --all")
+        asyncio.run(build(args.content_ids))
+        return
+
+    if args.synthetic:
+        base = _synthetic_store(args.synthetic, 1536, clusters=max(1, args.synthetic // 50), seed=0)
+        keys = ["synthetic"]
+    else:
+        base = embedding_store
+        keys = args.content_ids or sorted(
+            name for name in os.listdir(base.store_dir) if not name.startswith(".") and not name.endswith(".old")
+        )
+    # quantize at the requested dims from the stored full-precision vectors
+    store = base
+    if args.dims != base.dims:
+        store = EmbeddingStore(tempfile.mkdtemp(prefix="embedding-bench-"), dims=args.dims)
+        for key in keys:
+            listing = base._listing(key)
+            if listing is not None:
+                store.write(key, np.asarray(listing.full), listing.chunks)
+    store.rerank_factor = args.rerank_factor
+    print(json.dumps(bench(store, keys, args.ks or [3, 10], args.queries, args.noise), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import logging
+import os
+import re
+from typing import Any, List, Sequence
+
+from rag.context_packer import normalize_query
+
+logger = logging.getLogger("query-planner")
+
+MAX_SUB_QUERIES = int(os.environ.get("RAG_MAX_SUB_QUERIES", "4"))
+# Fragments shorter than this are not questions of their own ("and the hoa")
+# and stay attached to the part before them
+MIN_SUB_QUERY_WORDS = 3
+
+# Clause breaks: sentence ends, semicolons, commas, and conjunctions that
+# start a new question ("... and is it near schools")
+_HARD_BREAK = re.compile(r"[?;]+|(?<=[a-z0-9])[.!]\s+", re.IGNORECASE)
+_SOFT_BREAK = re.compile(
+    r",\s*(?:and|also|plus)?\s*|\s+(?:and|also|plus|as well as)\s+(?=(?:what|how|is|are|does|do|can|when|where|which|who|any)\b)",
+    re.IGNORECASE,
+)
+_CONNECTIVE = r"(?:and|also|plus|as well as|then|but)"
+_LEADING_CONNECTIVES = re.compile(rf"^(?:{_CONNECTIVE}\b[\s,]*)+", re.IGNORECASE)
+_TRAILING_CONNECTIVES = re.compile(rf"(?:[\s,]+{_CONNECTIVE})+$", re.IGNORECASE)
+# A part that refers back ("... the kitchen. Also, where is it") is searched
+# together with the part before it, which names what it refers to
+_PRONOUN = re.compile(r"\b(?:it|its|they|them|their|this|that|these|those)\b", re.IGNORECASE)
+# ...except that in a question about a listing "it" is the listing itself
+# ("... and is it near schools"), so a part with terms of its own stays apart
+_LISTING_PRONOUNS = frozenset({"it", "its"})
+_FUNCTION_WORDS = frozenset(
+    "a an the is are was were be been do does did has have had can could will would "
+    "what s how where when which who why any about me tell there of to in on at for".split()
+)
+
+
+def _words(text: str) -> int:
+    return len(normalize_query(text).split())
+
+
+def _strip_connectives(part: str) -> str:
+    part = _LEADING_CONNECTIVES.sub("", part.strip(" ,.!"))
+    return _TRAILING_CONNECTIVES.sub("", part).strip(" ,")
+
+
+def _refers_back(part: str) -> bool:
+    pronouns = {p.lower() for p in _PRONOUN.findall(part)}
+    if not pronouns:
+        return False
+    terms = [w for w in normalize_query(part).split() if w not in _FUNCTION_WORDS and w not in pronouns]
+    if not terms:
+        return True
+    return not pronouns <= _LISTING_PRONOUNS
+
+
+def split_query(query: str) -> List[str]:
+    """
+    Split a compound question into the separate questions it asks
+
+    "what's the price, how big is the lot and is it near schools" becomes
+    three sub-queries. Parts too short to be questions stay attached to the
+    part before them, as do parts that point back with a pronoun and name
+    nothing else ("where is it") or use one that can't mean the listing
+    ("are they carpeted"). A query that asks one thing comes back unchanged
+    as the only element.
+    """
+    parts: List[str] = []
+    for clause in _HARD_BREAK.split(query):
+        for part in _SOFT_BREAK.split(clause):
+            part = _strip_connectives(part)
+            if not part:
+                continue
+            if parts and (_words(part) < MIN_SUB_QUERY_WORDS or _refers_back(part)):
+                parts[-1] = f"{parts[-1]} and {part}"
+            else:
+                parts.append(part)
+
+    seen = set()
+    sub_queries = []
+    for part in parts:
+        key = normalize_query(part)
+        if key and key not in seen:
+            seen.add(key)
+            sub_queries.append(part)
+    if len(sub_queries) <= 1:
+        return [query]
+    if len(sub_queries) > MAX_SUB_QUERIES:
+        # fold the tail into the last search rather than dropping it
+        sub_queries = sub_queries[:MAX_SUB_QUERIES - 1] + [" ".join(sub_queries[MAX_SUB_QUERIES - 1:])]
+    logger.info(f"Split query into {len(sub_queries)} sub-queries: {sub_queries}")
+    return sub_queries
+
+
+def merge_results(results: Sequence[Sequence[Any]], key=lambda doc: doc.page_content) -> List[Any]:
+    """
+    Interleave the per-sub-query results, dropping repeats
+
+    Taking the best match of every sub-query before anyone's second match
+    puts each part's best chunk ahead of the rest; pack_sentences, given
+    the sub-queries, keeps each part's best sentence within the budget.
+    """
+    seen = set()
+    merged = []
+    for rank in range(max((len(docs) for docs in results), default=0)):
+        for docs in results:
+            if rank >= len(docs):
+                continue
+            doc_key = key(docs[rank])
+            if doc_key in seen:
+                continue
+            seen.add(doc_key)
+            merged.append(docs[rank])
+    return merged
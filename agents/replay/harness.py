@@ -0,0 +1,307 @@
+"""
+Replay recorded ContextAgent sessions against local stand-ins
+
+    python -m replay.harness run traces/*.trace.jsonl.gz --speed 0 --out before.json
+    git checkout my-branch
+    python -m replay.harness run traces/*.trace.jsonl.gz --speed 0 --out after.json
+    python -m replay.harness compare before.json after.json
+
+Embeddings, Pinecone, Postgres and image downloads are replaced by stand-ins
+that return the recorded results after the recorded latency (scaled by
+--dependency-scale). Everything else, including decoding, packing and
+caching, is the real agent code.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Any, Dict, List
+
+import cv2
+import numpy as np
+
+from replay.recorder import load_trace
+
+HOT_PATHS = ("rag_search", "listing_snapshot", "frame")
+
+
+class StandIns:
+    """Recorded dependency results and latencies, indexed for lookup by the fakes"""
+
+    def __init__(self, events: List[Dict[str, Any]], dependency_scale: float):
+        self.scale = dependency_scale
+        self.embeddings: Dict[str, float] = {}
+        self.pinecone: Dict[str, Any] = {}
+        self.snapshots: Dict[str, Any] = {}
+        self.images: Dict[str, Any] = {}
+        self.fetches: Dict[str, Any] = {}
+        self.frame_shapes: Dict[str, List[int]] = {}
+        self.queries_by_vector: Dict[tuple, str] = {}
+        self.content_id = None
+
+        for event in events:
+            name, attrs = event["name"], event.get("attrs", {})
+            if name == "embed_query":
+                self.embeddings[attrs["query"]] = event["dur"]
+            elif name == "embed_queries":
+                # one batched call; each query is charged the whole call
+                for query in attrs["queries"]:
+                    self.embeddings[query] = event["dur"]
+            elif name == "pinecone_query":
+                self.pinecone[attrs["query"]] = (event["dur"], event.get("result") or [])
+            elif name == "listing_snapshot":
+                self.snapshots[attrs["content_id"]] = (event["dur"], event.get("result"))
+                self.content_id = self.content_id or attrs["content_id"]
+            elif name == "images_for_content":
+                self.images[attrs["content_id"]] = (event["dur"], event.get("result") or [])
+                self.content_id = self.content_id or attrs["content_id"]
+            elif name == "image_fetch":
+                self.fetches[attrs["url"]] = (event["dur"], event.get("result") or 0)
+            elif name == "frame" and isinstance(event.get("result"), list):
+                self.frame_shapes[attrs["url"]] = event["result"]
+
+    def wait(self, seconds: float):
+        time.sleep(seconds * self.scale)
+
+    async def async_wait(self, seconds: float):
+        await asyncio.sleep(seconds * self.scale)
+
+
+def _vector_key(vector) -> tuple:
+    return tuple(round(float(v), 5) for v in vector[:4])
+
+
+class FakeEmbeddings:
+    def __init__(self, stand_ins: StandIns, dims: int = 1536):
+        self.stand_ins = stand_ins
+        self.dims = dims
+
+    def embed_query(self, query: str) -> List[float]:
+        self.stand_ins.wait(self.stand_ins.embeddings.get(query, 0.0))
+        return self._vector(query)
+
+    def embed_documents(self, queries: List[str]) -> List[List[float]]:
+        self.stand_ins.wait(max(self.stand_ins.embeddings.get(query, 0.0) for query in queries))
+        return [self._vector(query) for query in queries]
+
+    def _vector(self, query: str) -> List[float]:
+        seed = int.from_bytes(hashlib.sha1(query.encode()).digest()[:4], "little")
+        vector = np.random.default_rng(seed).standard_normal(self.dims).astype(np.float32).tolist()
+        # lets FakeIndex find the recorded matches for this query
+        self.stand_ins.queries_by_vector[_vector_key(vector)] = query
+        return vector
+
+
+class FakeIndex:
+    def __init__(self, stand_ins: StandIns):
+        self.stand_ins = stand_ins
+
+    def query(self, vector, top_k, include_metadata=True, namespace=None, filter=None):
+        query = self.stand_ins.queries_by_vector.get(_vector_key(vector))
+        dur, matches = self.stand_ins.pinecone.get(query, (0.0, []))
+        self.stand_ins.wait(dur)
+        return SimpleNamespace(
+            matches=[SimpleNamespace(score=m["score"], metadata=m["metadata"]) for m in matches[:top_k]]
+        )
+
+
+class FakeVectorStore:
+    def similarity_search(self, query: str, k: int = 3):
+        return []
+
+
+class _FakeConnection:
+    def __init__(self, stand_ins: StandIns):
+        self.stand_ins = stand_ins
+
+    async def fetchrow(self, query: str, content_id: str):
+        dur, row = self.stand_ins.snapshots.get(content_id, (0.0, None))
+        await self.stand_ins.async_wait(dur)
+        if row is None:
+            return None
+        row = dict(row)
+        for key in ("createdAt", "updatedAt"):
+            if isinstance(row.get(key), str):
+                row[key] = datetime.fromisoformat(row[key])
+        return row
+
+    async def fetch(self, query: str, content_id: str):
+        dur, rows = self.stand_ins.images.get(content_id, (0.0, []))
+        await self.stand_ins.async_wait(dur)
+        return [dict(row) for row in rows]
+
+
+class _Acquire:
+    def __init__(self, connection: _FakeConnection):
+        self.connection = connection
+
+    async def __aenter__(self):
+        return self.connection
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakePool:
+    def __init__(self, stand_ins: StandIns):
+        self.connection = _FakeConnection(stand_ins)
+
+    def acquire(self):
+        return _Acquire(self.connection)
+
+
+class FakeRequests:
+    """Serves a synthetic JPEG of the recorded size so the real decode path runs"""
+
+    def __init__(self, stand_ins: StandIns):
+        self.stand_ins = stand_ins
+        self._bodies: Dict[str, bytes] = {}
+
+    def get(self, url: str, timeout: float = None):
+        dur, _ = self.stand_ins.fetches.get(url, (0.0, 0))
+        self.stand_ins.wait(dur)
+        body = self._bodies.get(url)
+        if body is None:
+            height, width = (self.stand_ins.frame_shapes.get(url) or [720, 1280])[:2]
+            image = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+            body = cv2.imencode(".jpg", image)[1].tobytes()
+            self._bodies[url] = body
+        return SimpleNamespace(content=body, raise_for_status=lambda: None)
+
+
+def _percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000 if values else 0.0
+
+
+def _summarize(samples: Dict[str, List[float]]) -> Dict[str, Dict[str, float]]:
+    return {
+        stage: {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 50), 2),
+            "p95_ms": round(_percentile(values, 95), 2),
+            "mean_ms": round(float(np.mean(values)) * 1000, 2),
+        }
+        for stage, values in sorted(samples.items())
+    }
+
+
+async def replay_trace(path: str, speed: float, dependency_scale: float):
+    """Re-run the hot paths of one trace; returns (replayed, recorded) latency samples"""
+    import context_agent
+
+    header, events = load_trace(path)
+    stand_ins = StandIns(events, dependency_scale)
+
+    context_agent.requests = FakeRequests(stand_ins)
+    agent = context_agent.ContextAgent(
+        vector_store=FakeVectorStore(),
+        job_metadata={"contentId": stand_ins.content_id},
+    )
+    agent.embeddings = FakeEmbeddings(stand_ins)
+    agent.pinecone_index = FakeIndex(stand_ins)
+    context_agent.db.pool = FakePool(stand_ins)
+
+    replayed: Dict[str, List[float]] = defaultdict(list)
+    recorded: Dict[str, List[float]] = defaultdict(list)
+    loop = asyncio.get_event_loop()
+    started = loop.time()
+
+    for event in sorted(events, key=lambda e: e["t"]):
+        name, attrs = event["name"], event.get("attrs", {})
+        if name not in HOT_PATHS:
+            continue
+        if speed > 0:
+            delay = started + event["t"] / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        t0 = time.perf_counter()
+        if name == "rag_search":
+            await agent._perform_rag_search(attrs["query"], attrs.get("k", 3))
+        elif name == "listing_snapshot":
+            await agent._get_scraped_content_with_media_info(attrs["content_id"])
+        elif name == "frame":
+            await loop.run_in_executor(None, agent._load_frame, attrs["url"])
+        replayed[name].append(time.perf_counter() - t0)
+        recorded[name].append(event["dur"])
+
+    return replayed, recorded
+
+
+def run(args):
+    os.environ.setdefault("OPENAI_API_KEY", "replay")
+    os.environ.pop("REPLAY_RECORD_DIR", None)
+    # keep production's host cache out of the measurement
+    os.environ["SHARED_CACHE_DIR"] = tempfile.mkdtemp(prefix="replay-cache-")
+
+    replayed: Dict[str, List[float]] = defaultdict(list)
+    recorded: Dict[str, List[float]] = defaultdict(list)
+    for path in args.traces:
+        trace_replayed, trace_recorded = asyncio.run(
+            replay_trace(path, args.speed, args.dependency_scale)
+        )
+        for stage, values in trace_replayed.items():
+            replayed[stage].extend(values)
+        for stage, values in trace_recorded.items():
+            recorded[stage].extend(values)
+
+    report = {
+        "traces": args.traces,
+        "speed": args.speed,
+        "dependency_scale": args.dependency_scale,
+        "replayed": _summarize(replayed),
+        "recorded": _summarize(recorded),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(output)
+    print(output)
+
+
+def compare(args):
+    with open(args.base) as f:
+        base = json.load(f)["replayed"]
+    with open(args.candidate) as f:
+        candidate = json.load(f)["replayed"]
+
+    print(f"{'stage':<20}{'base p50':>10}{'new p50':>10}{'base p95':>10}{'new p95':>10}{'p95 delta':>11}")
+    for stage in sorted(set(base) | set(candidate)):
+        b = base.get(stage, {})
+        c = candidate.get(stage, {})
+        b95, c95 = b.get("p95_ms", 0.0), c.get("p95_ms", 0.0)
+        delta = f"{(c95 - b95) / b95 * 100:+.1f}%" if b95 else "n/a"
+        print(
+            f"{stage:<20}{b.get('p50_ms', 0.0):>10.1f}{c.get('p50_ms', 0.0):>10.1f}"
+            f"{b95:>10.1f}{c95:>10.1f}{delta:>11}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="replay traces and report per-stage latency")
+    run_parser.add_argument("traces", nargs="+")
+    run_parser.add_argument("--speed", type=float, default=0.0, help="1.0 keeps the recorded pace, 0 replays back to back")
+    run_parser.add_argument("--dependency-scale", type=float, default=1.0, help="multiplier on recorded dependency latency")
+    run_parser.add_argument("--out")
+    run_parser.set_defaults(func=run)
+
+    compare_parser = sub.add_parser("compare", help="compare two replay reports")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("candidate")
+    compare_parser.set_defaults(func=compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import contextvars
+import gzip
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("session-recorder")
+
+RECORD_DIR = os.environ.get("REPLAY_RECORD_DIR")
+MAX_EVENTS = int(os.environ.get("REPLAY_MAX_EVENTS", "5000"))
+TRACE_VERSION = 1
+
+# Span kinds understood by the replay harness
+TOOL = "tool"
+RETRIEVAL = "retrieval"
+DB = "db"
+MEDIA = "media"
+
+
+class Span:
+    __slots__ = ("kind", "name", "attrs", "result", "start")
+
+    def __init__(self, kind: str, name: str, attrs: Dict[str, Any]):
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.result: Any = None
+        self.start = 0.0
+
+
+class _RecordingSpan:
+    def __init__(self, recorder: "SessionRecorder", span: Span):
+        self._recorder = recorder
+        self._span = span
+
+    def __enter__(self) -> Span:
+        self._span.start = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        self._recorder._finish(self._span, error=exc_type.__name__ if exc_type else None)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ("result",)
+
+    def __init__(self):
+        self.result = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class SessionRecorder:
+    """
+    Captures a session's tool calls, retrievals, DB queries and media fetches
+    with their timings, for offline replay by replay.harness
+
+    Events are buffered in memory and written once, gzipped JSONL, when the
+    session ends. Recording is off unless REPLAY_RECORD_DIR is set, in which
+    case span() costs a couple of attribute writes.
+    """
+
+    def __init__(self, session_id: str, record_dir: Optional[str] = RECORD_DIR):
+        self.session_id = session_id
+        self.record_dir = record_dir
+        self.enabled = bool(record_dir)
+        self._origin = time.perf_counter()
+        self._started_at = time.time()
+        self._events: List[Dict[str, Any]] = []
+        self.dropped = 0
+
+    def span(self, kind: str, name: str, **attrs):
+        if not self.enabled:
+            return _NullSpan()
+        return _RecordingSpan(self, Span(kind, name, attrs))
+
+    def _finish(self, span: Span, error: Optional[str] = None):
+        if len(self._events) >= MAX_EVENTS:
+            self.dropped += 1
+            return
+        end = time.perf_counter()
+        event = {
+            "t": round(span.start - self._origin, 4),
+            "kind": span.kind,
+            "name": span.name,
+            "dur": round(end - span.start, 4),
+            "attrs": span.attrs,
+        }
+        if span.result is not None:
+            event["result"] = span.result
+        if error:
+            event["error"] = error
+        self._events.append(event)
+
+    def save(self) -> Optional[str]:
+        """Write the trace file; call from an executor, it does blocking I/O"""
+        if not self.enabled or not self._events:
+            return None
+        os.makedirs(self.record_dir, exist_ok=True)
+        safe_id = "".join(c if c.isalnum() or c in "-_" else "_" for c in self.session_id)
+        path = os.path.join(self.record_dir, f"{safe_id}-{int(self._started_at)}.trace.jsonl.gz")
+        header = {
+            "version": TRACE_VERSION,
+            "session_id": self.session_id,
+            "started_at": self._started_at,
+            "events": len(self._events),
+            "dropped": self.dropped,
+        }
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            for event in self._events:
+                f.write(json.dumps(event, default=str) + "\n")
+        logger.info(f"Saved replay trace with {len(self._events)} events to {path}")
+        return path
+
+
+def load_trace(path: str):
+    """Return (header, events) from a trace file"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        events = [json.loads(line) for line in f if line.strip()]
+    return header, events
+
+
+# Used until the entrypoint binds a per-session recorder
+null_recorder = SessionRecorder("none", record_dir=None)
+
+_CURRENT = contextvars.ContextVar("session_recorder", default=null_recorder)
+
+
+def bind_recorder(recorder: SessionRecorder):
+    """Record spans from shared layers (the database) for the current task and the tasks it spawns"""
+    _CURRENT.set(recorder)
+
+
+def current_recorder() -> SessionRecorder:
+    return _CURRENT.get()
@@ -0,0 +1,112 @@
+"""
+Drive a DependencyGuard against a fake backend with a slow tail and outages
+
+    python -m resilience.fake_backend --requests 500 --tail-rate 0.05 --tail 3
+    python -m resilience.fake_backend --outage-from 100 --outage-to 200
+
+Prints latency percentiles with and without hedging, plus the guard's
+breaker transitions and counters, so budget and threshold changes can be
+checked without a real Pinecone, OpenAI or Postgres.
+"""
+import argparse
+import asyncio
+import random
+import time
+from typing import List
+
+import numpy as np
+
+from resilience.guard import DependencyGuard, DependencyUnavailable
+
+
+class SlowBackend:
+    """Answers after a base latency, with an occasional slow tail and an optional outage window"""
+
+    def __init__(self, base: float, tail: float, tail_rate: float, outage=(None, None), seed: int = 0):
+        self.base = base
+        self.tail = tail
+        self.tail_rate = tail_rate
+        self.outage_from, self.outage_to = outage
+        self.requests = 0
+        # index of the caller's current request; outages are timed on it so
+        # they end even while an open breaker keeps calls away
+        self.tick = 0
+        self._random = random.Random(seed)
+
+    def _in_outage(self) -> bool:
+        return (
+            self.outage_from is not None
+            and self.outage_from <= self.tick < (self.outage_to or float("inf"))
+        )
+
+    async def call(self) -> str:
+        self.requests += 1
+        if self._in_outage():
+            await asyncio.sleep(self.tail)
+            raise ConnectionError("backend unavailable")
+        latency = self.base * self._random.uniform(0.7, 1.3)
+        if self._random.random() < self.tail_rate:
+            latency = self.tail
+        await asyncio.sleep(latency)
+        return "ok"
+
+
+async def _drive(guard: DependencyGuard, backend: SlowBackend, requests: int, interval: float):
+    latencies: List[float] = []
+    outcomes = {"ok": 0, "unavailable": 0, "error": 0}
+    for i in range(requests):
+        backend.tick = i
+        started = time.monotonic()
+        try:
+            await guard.call(backend.call)
+            outcomes["ok"] += 1
+        except DependencyUnavailable:
+            outcomes["unavailable"] += 1
+        except Exception:
+            outcomes["error"] += 1
+        latencies.append(time.monotonic() - started)
+        await asyncio.sleep(interval)
+    return latencies, outcomes
+
+
+def _report(label: str, latencies: List[float], outcomes, guard: DependencyGuard):
+    p50, p95, p99 = (np.percentile(latencies, q) * 1000 for q in (50, 95, 99))
+    print(f"{label:<10} p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms  {outcomes}")
+    print(f"{'':<10} {guard.stats()}")
+
+
+async def main_async(args):
+    for hedge in (False, True):
+        guard = DependencyGuard(
+            "fake",
+            budget=args.budget,
+            hedge=hedge,
+            failure_threshold=args.failure_threshold,
+            reset_after=args.reset_after,
+        )
+        backend = SlowBackend(
+            args.base, args.tail, args.tail_rate, outage=(args.outage_from, args.outage_to), seed=args.seed
+        )
+        latencies, outcomes = await _drive(guard, backend, args.requests, args.interval)
+        _report("hedged" if hedge else "unhedged", latencies, outcomes, guard)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--base", type=float, default=0.05, help="typical latency in seconds")
+    parser.add_argument("--tail", type=float, default=2.0, help="slow-tail latency in seconds")
+    parser.add_argument("--tail-rate", type=float, default=0.05)
+    parser.add_argument("--budget", type=float, default=0.8, help="guard budget in seconds")
+    parser.add_argument("--failure-threshold", type=int, default=3)
+    parser.add_argument("--reset-after", type=float, default=1.0)
+    parser.add_argument("--outage-from", type=int, help="request number where an outage starts")
+    parser.add_argument("--outage-to", type=int)
+    # long enough that an outage outlasts --reset-after and the breaker goes half-open
+    parser.add_argument("--interval", type=float, default=0.02, help="pause between requests in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger("resilience")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Recent latencies kept per dependency for the hedge delay
+LATENCY_WINDOW = 200
+# Samples needed before hedging starts; until then the p95 is a guess
+MIN_HEDGE_SAMPLES = 20
+
+
+class DependencyUnavailable(Exception):
+    """Raised instead of calling a dependency whose breaker is open, or that ran over budget"""
+
+
+class DependencyGuard:
+    """
+    Latency budget, circuit breaker and optional hedging for one external dependency
+
+    Each call is cut off at the budget. Timeouts and errors count as
+    failures; after failure_threshold in a row the breaker opens and calls
+    fail fast with DependencyUnavailable so the caller can use a cached or
+    local result. After reset_after seconds one trial call is let through
+    and its outcome closes or re-opens the breaker. With hedging on, a
+    second identical request is started if the first has not answered by
+    the recent p95, and whichever finishes first wins.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        budget: float,
+        hedge: bool = False,
+        failure_threshold: int = 3,
+        reset_after: float = 30.0,
+    ):
+        self.name = name
+        self.budget = budget
+        self.hedge = hedge
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._latencies: deque = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.short_circuits = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def p95(self) -> Optional[float]:
+        if len(self._latencies) < MIN_HEDGE_SAMPLES:
+            return None
+        return float(np.percentile(self._latencies, 95))
+
+    def _allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_after:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def _set_state(self, state: str):
+        if state == self.state:
+            return
+        logger.warning(
+            f"Circuit breaker {self.name}: {self.state} -> {state}",
+            extra={"breaker": self.name, "breaker_state": state},
+        )
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+
+    def _record_success(self, latency: float):
+        self._latencies.append(latency)
+        self._consecutive_failures = 0
+        self._trial_running = False
+        self._set_state(CLOSED)
+
+    def _record_failure(self):
+        self.failures += 1
+        self._consecutive_failures += 1
+        self._trial_running = False
+        if self.state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._set_state(OPEN)
+
+    async def call(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() under the guard; fn must be safe to call twice when hedging"""
+        if not self._allow():
+            self.short_circuits += 1
+            raise DependencyUnavailable(f"{self.name} circuit is open")
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            result = await asyncio.wait_for(self._attempt(fn), self.budget)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._record_failure()
+            raise DependencyUnavailable(f"{self.name} exceeded its {self.budget * 1000:.0f} ms budget")
+        except asyncio.CancelledError:
+            self._trial_running = False
+            raise
+        except Exception:
+            self._record_failure()
+            raise
+        self._record_success(time.monotonic() - started)
+        return result
+
+    async def _attempt(self, fn: Callable[[], Awaitable[Any]]) -> Any:
+        delay = self.p95() if self.hedge else None
+        first = asyncio.ensure_future(fn())
+        if delay is None or delay >= self.budget:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.hedges += 1
+        second = asyncio.ensure_future(fn())
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self.hedge_wins += 1
+                        return task.result()
+            # both failed; surface the original request's error
+            return first.result()
+        finally:
+            for task in (first, second):
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "short_circuits": self.short_circuits,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+def _budget(name: str, default_ms: str) -> float:
+    return float(os.environ.get(f"{name.upper()}_BUDGET_MS", default_ms)) / 1000
+
+
+_HEDGED = {name.strip() for name in os.environ.get("HEDGED_DEPENDENCIES", "pinecone,embeddings").split(",")}
+
+# One guard per dependency, shared by everything in the job process
+pinecone_guard = DependencyGuard("pinecone", _budget("pinecone", "800"), hedge="pinecone" in _HEDGED)
+embeddings_guard = DependencyGuard("embeddings", _budget("embeddings", "1500"), hedge="embeddings" in _HEDGED)
+postgres_guard = DependencyGuard("postgres", _budget("postgres", "2000"), hedge="postgres" in _HEDGED)
+
+GUARDS = {guard.name: guard for guard in (pinecone_guard, embeddings_guard, postgres_guard)}
+
+
+def guard_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: guard.stats() for name, guard in GUARDS.items()}
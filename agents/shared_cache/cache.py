@@ -0,0 +1,287 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from shared_cache import ipc
+
+logger = logging.getLogger("shared-cache")
+
+_DEFAULT_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+CACHE_DIR = os.environ.get("SHARED_CACHE_DIR", os.path.join(_DEFAULT_ROOT, "convomate-cache"))
+MAX_BYTES = int(os.environ.get("SHARED_CACHE_MAX_MB", "1024")) * 1024 * 1024
+STATS_INTERVAL = 10.0
+RETRY_CONNECT_AFTER = 10.0
+TOUCH_FLUSH_INTERVAL = 1.0
+
+# Namespaces used by the agents
+FRAMES = "frames"
+EMBEDDINGS = "embeddings"
+
+_STAGING = "staging"
+
+
+def _entry_path(cache_dir: str, namespace: str, key: str) -> str:
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return os.path.join(cache_dir, namespace, f"{digest}.npy")
+
+
+class SharedCache:
+    """
+    Read side of the host-wide cache, used by job processes
+
+    Entries are .npy files in a RAM-backed directory and are opened with
+    mmap, so every job process on the host shares the same physical pages.
+    Job processes never modify the published entries: new entries are staged
+    and handed to the writer process, which publishes and evicts them.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._conn = None
+        self._conn_failed_at = 0.0
+        self._lock = threading.Lock()
+        self._touched: set = set()
+        self._last_flush = time.monotonic()
+        self.hits = 0
+        self.misses = 0
+        self._reported_hits = 0
+        self._reported_misses = 0
+
+    def get(self, namespace: str, key: str) -> Optional[np.ndarray]:
+        path = _entry_path(self.cache_dir, namespace, key)
+        try:
+            array = np.load(path, mmap_mode="r")
+        except (FileNotFoundError, ValueError, OSError):
+            with self._lock:
+                self.misses += 1
+            self._maybe_flush()
+            return None
+        with self._lock:
+            self.hits += 1
+            self._touched.add(path)
+        self._maybe_flush()
+        return array
+
+    def put(self, namespace: str, key: str, array: np.ndarray):
+        """Stage an entry and ask the writer to publish it; dropped if no writer is running"""
+        with self._lock:
+            connected = self._connected()
+        if not connected:
+            return
+        staging_dir = os.path.join(self.cache_dir, _STAGING)
+        staging_path = os.path.join(staging_dir, f"{uuid.uuid4().hex}.npy")
+        try:
+            os.makedirs(staging_dir, exist_ok=True)
+            np.save(staging_path, np.ascontiguousarray(array))
+        except OSError as e:
+            logger.warning(f"Could not stage shared cache entry: {e}")
+            return
+        if not self._send({"op": "put", "namespace": namespace, "key": key, "staging": staging_path}):
+            try:
+                os.unlink(staging_path)
+            except OSError:
+                pass
+
+    def _maybe_flush(self):
+        now = time.monotonic()
+        if now - self._last_flush < TOUCH_FLUSH_INTERVAL:
+            return
+        with self._lock:
+            self._last_flush = now
+            touched = list(self._touched)
+            self._touched.clear()
+            hits = self.hits - self._reported_hits
+            misses = self.misses - self._reported_misses
+            self._reported_hits = self.hits
+            self._reported_misses = self.misses
+        if touched or hits or misses:
+            self._send({"op": "touch", "paths": touched, "hits": hits, "misses": misses})
+
+    def _connected(self) -> bool:
+        """Called with self._lock held"""
+        if self._conn is not None:
+            return True
+        if time.monotonic() - self._conn_failed_at < RETRY_CONNECT_AFTER:
+            return False
+        try:
+            self._conn = ipc.connect(self.cache_dir)
+            return True
+        except OSError:
+            self._conn_failed_at = time.monotonic()
+            return False
+
+    def _send(self, message: Dict[str, Any]) -> bool:
+        with self._lock:
+            if not self._connected():
+                return False
+            try:
+                self._conn.send(message)
+                return True
+            except OSError:
+                self._conn = None
+                self._conn_failed_at = time.monotonic()
+                return False
+
+    def stats(self) -> Dict[str, Any]:
+        """Host-wide stats as last written by the writer process"""
+        try:
+            with open(os.path.join(self.cache_dir, "stats.json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+class CacheWriter:
+    """The single process on the host that publishes and evicts shared cache entries"""
+
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_BYTES, authkey: Optional[bytes] = None):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.authkey = authkey
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _scan(self):
+        found = []
+        for root, _, files in os.walk(self.cache_dir):
+            if os.path.basename(root) == _STAGING:
+                for name in files:
+                    os.unlink(os.path.join(root, name))
+                continue
+            for name in files:
+                if name.endswith(".npy"):
+                    path = os.path.join(root, name)
+                    stat = os.stat(path)
+                    found.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(found):
+            self._entries[path] = size
+            self._total_bytes += size
+        self._evict()
+
+    def _publish(self, message: Dict[str, Any]):
+        staging = os.path.realpath(message["staging"])
+        if os.path.dirname(staging) != os.path.realpath(os.path.join(self.cache_dir, _STAGING)):
+            logger.warning(f"Rejecting shared cache entry outside staging: {staging}")
+            return
+        path = _entry_path(self.cache_dir, message["namespace"], message["key"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = os.path.getsize(staging)
+        os.replace(staging, path)
+        with self._lock:
+            self._total_bytes += size - self._entries.pop(path, 0)
+            self._entries[path] = size
+            self._evict()
+
+    def _touch(self, message: Dict[str, Any]):
+        with self._lock:
+            for path in message.get("paths", []):
+                if path in self._entries:
+                    self._entries.move_to_end(path)
+            self.hits += message.get("hits", 0)
+            self.misses += message.get("misses", 0)
+
+    def _evict(self):
+        while self._total_bytes > self.max_bytes and self._entries:
+            path, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
+            # readers that already mapped the file keep their pages until they close it
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    if message.get("op") == "put":
+                        self._publish(message)
+                    elif message.get("op") == "touch":
+                        self._touch(message)
+                except Exception as e:
+                    logger.warning(f"Shared cache writer failed on {message.get('op')}: {e}")
+
+    def _write_stats(self):
+        while True:
+            time.sleep(STATS_INTERVAL)
+            with self._lock:
+                total = self.hits + self.misses
+                stats = {
+                    "entries": len(self._entries),
+                    "bytes": self._total_bytes,
+                    "max_bytes": self.max_bytes,
+                    "hits": self.hits,
+                    "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0,
+                    "evictions": self.evictions,
+                }
+            tmp_path = os.path.join(self.cache_dir, "stats.json.tmp")
+            with open(tmp_path, "w") as f:
+                json.dump(stats, f)
+            os.replace(tmp_path, os.path.join(self.cache_dir, "stats.json"))
+
+    def serve_forever(self):
+        if not ipc.claim(self.cache_dir):
+            logger.info("Another shared cache writer owns this host's cache")
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        authkey = self.authkey or ipc.create_authkey(self.cache_dir)
+        self._scan()
+        threading.Thread(target=self._write_stats, daemon=True).start()
+        logger.info(f"Shared cache writer serving {self.cache_dir} ({self.max_bytes // (1024 * 1024)} MB)")
+        with ipc.listen(self.cache_dir, authkey) as listener:
+            while True:
+                conn = ipc.accept(listener)
+                if conn is None:
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+def _run_writer(cache_dir: str, max_bytes: int, authkey: bytes):
+    CacheWriter(cache_dir, max_bytes, authkey).serve_forever()
+
+
+def start_cache_writer(cache_dir: str = CACHE_DIR, max_bytes: int = MAX_BYTES) -> Optional[multiprocessing.Process]:
+    """Start the host's writer process unless one is already running"""
+    if ipc.running(cache_dir):
+        logger.debug("Shared cache writer already running on this host")
+        return None
+    authkey = ipc.create_authkey(cache_dir)
+    process = multiprocessing.Process(
+        target=_run_writer, args=(cache_dir, max_bytes, authkey), name="shared-cache-writer", daemon=True
+    )
+    process.start()
+    return process
+
+
+def supervise_cache_writer(cache_dir: str = CACHE_DIR, max_bytes: int = MAX_BYTES):
+    """Keep the host's writer running from this worker, whichever worker's child it is"""
+    ipc.supervise(lambda: start_cache_writer(cache_dir, max_bytes), "shared-cache-writer")
+
+
+# One reader per job process
+shared_cache = SharedCache()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    CacheWriter().serve_forever()
@@ -0,0 +1,145 @@
+import fcntl
+import logging
+import os
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger("writer-ipc")
+
+# Holds a host writer's socket and authkey; only the agents' own user may enter it
+_WRITER_DIR = "writer"
+AUTHKEY_BYTES = 32
+# How often every worker makes sure the host's writers are running
+SUPERVISE_INTERVAL = float(os.environ.get("HOST_PROCESS_CHECK_INTERVAL", "5"))
+
+# Lock file descriptors of the writers this process owns, kept open for its lifetime
+_claims: Dict[str, int] = {}
+
+
+def writer_dir(base_dir: str) -> str:
+    path = os.path.join(base_dir, _WRITER_DIR)
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    # makedirs applies the umask, and the directory may predate this code
+    os.chmod(path, 0o700)
+    return path
+
+
+def socket_path(base_dir: str) -> str:
+    return os.path.join(base_dir, _WRITER_DIR, "writer.sock")
+
+
+def _authkey_path(base_dir: str) -> str:
+    return os.path.join(base_dir, _WRITER_DIR, "authkey")
+
+
+def read_authkey(base_dir: str) -> Optional[bytes]:
+    try:
+        with open(_authkey_path(base_dir), "rb") as f:
+            return f.read() or None
+    except OSError:
+        return None
+
+
+def create_authkey(base_dir: str) -> bytes:
+    """
+    The authkey of the host's writer, generated by the first worker to start one
+
+    Workers that find a writer already running use its key, so every job
+    process on the host can reach the writer whichever worker started it.
+    """
+    directory = writer_dir(base_dir)
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(os.urandom(AUTHKEY_BYTES))
+        # link fails if another worker won the race, and readers never see a partial key
+        os.link(tmp_path, _authkey_path(base_dir))
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp_path)
+    return read_authkey(base_dir)
+
+
+def claim(base_dir: str) -> bool:
+    """
+    Make this process the host's writer for base_dir, for as long as it lives
+
+    The claim is an flock on a file in the writer directory, which the kernel
+    releases however the owner exits. Workers booting together may each
+    start a writer; only the one holding the claim may replace the socket,
+    and the others exit without touching it.
+    """
+    if base_dir in _claims:
+        return True
+    fd = os.open(os.path.join(writer_dir(base_dir), "owner.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        os.close(fd)
+        return False
+    _claims[base_dir] = fd
+    return True
+
+
+def running(base_dir: str) -> bool:
+    try:
+        connect(base_dir).close()
+        return True
+    except OSError:
+        return False
+
+
+def supervise(start: Callable[[], Any], name: str, interval: float = SUPERVISE_INTERVAL) -> threading.Thread:
+    """
+    Call start now and then every interval, from a thread of the worker
+
+    A writer is a child of whichever worker started it and goes when that
+    worker does; with every worker on the host supervising, another one
+    starts a replacement within the interval.
+    """
+    def _loop():
+        while True:
+            try:
+                start()
+            except Exception as e:
+                logger.warning(f"Could not start {name}: {e}")
+            time.sleep(interval)
+
+    thread = threading.Thread(target=_loop, name=f"{name}-supervisor", daemon=True)
+    thread.start()
+    return thread
+
+
+def connect(base_dir: str) -> Connection:
+    """Connect to the host's writer; raises OSError when there is none or it rejects us"""
+    authkey = read_authkey(base_dir)
+    if authkey is None:
+        raise FileNotFoundError(f"No writer authkey under {base_dir}")
+    try:
+        return Client(socket_path(base_dir), family="AF_UNIX", authkey=authkey)
+    except (AuthenticationError, EOFError) as e:
+        raise ConnectionRefusedError(f"Writer under {base_dir} rejected the connection: {e}") from e
+
+
+def listen(base_dir: str, authkey: bytes) -> Listener:
+    """Serve base_dir's socket; only the process holding the claim may call this"""
+    if base_dir not in _claims:
+        raise RuntimeError(f"Listening on {base_dir} without owning its writer")
+    path = socket_path(base_dir)
+    if os.path.exists(path):
+        os.unlink(path)
+    return Listener(path, family="AF_UNIX", authkey=authkey)
+
+
+def accept(listener: Listener) -> Optional[Connection]:
+    """The next authenticated connection, or None for one that failed the handshake"""
+    try:
+        return listener.accept()
+    except (AuthenticationError, EOFError, OSError) as e:
+        logger.warning(f"Rejected writer connection: {e}")
+        return None
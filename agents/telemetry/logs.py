@@ -0,0 +1,239 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import time
+from typing import Any, Dict, Optional
+
+SESSION_ID = contextvars.ContextVar("session_id", default=None)
+
+LOG_LEVEL = os.environ.get("AGENT_LOG_LEVEL", "INFO")
+DEBUG_SAMPLE_RATE = float(os.environ.get("AGENT_LOG_DEBUG_SAMPLE_RATE", "0.1"))
+RATE_LIMIT_PER_SECOND = float(os.environ.get("AGENT_LOG_RATE_LIMIT", "20"))
+RATE_LIMIT_BURST = float(os.environ.get("AGENT_LOG_RATE_BURST", "50"))
+QUEUE_SIZE = int(os.environ.get("AGENT_LOG_QUEUE_SIZE", "10000"))
+
+_SECRET_PATTERNS = [
+    (re.compile(r"(sk-[A-Za-z0-9_\-]{8})[A-Za-z0-9_\-]+"), r"\1***"),
+    (re.compile(r"(pcsk_[A-Za-z0-9]{4})[A-Za-z0-9_\-]+"), r"\1***"),
+    (re.compile(r"(\w+://[^:/\s]+:)[^@\s]+@"), r"\1***@"),
+    (
+        re.compile(
+            r"""(['"]?\w*(?:API_KEY|SECRET|TOKEN|PASSWORD)\w*['"]?\s*[:=]\s*['"]?)[^'",\s}]+""",
+            re.IGNORECASE,
+        ),
+        r"\1***",
+    ),
+]
+
+_STANDARD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_queue_handler: Optional["_TimedQueueHandler"] = None
+
+
+def bind_session(session_id: str):
+    """Tag every record logged from the current task (and tasks it spawns) with session_id"""
+    SESSION_ID.set(session_id)
+
+
+def redact(text: str) -> str:
+    for pattern, replacement in _SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def _redact_value(value: Any) -> Any:
+    """Redact strings inside extras, keeping their structure for the JSON output"""
+    if isinstance(value, str):
+        return redact(value)
+    if isinstance(value, dict):
+        return {key: _redact_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_redact_value(item) for item in value]
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    # anything else is logged through str() anyway
+    return redact(str(value))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        session_id = getattr(record, "session_id", None)
+        if session_id:
+            payload["session_id"] = session_id
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and key not in payload:
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = record.stack_info
+        return json.dumps(payload, default=str)
+
+
+class _SamplingFilter(logging.Filter):
+    """
+    Runs on the calling thread, so it only does cheap counting: DEBUG records
+    are sampled and each call site is held to a token-bucket rate
+    """
+
+    def __init__(self, debug_sample_rate: float, per_second: float, burst: float):
+        super().__init__()
+        self.debug_sample_rate = debug_sample_rate
+        self.per_second = per_second
+        self.burst = burst
+        self._buckets: Dict[tuple, list] = {}
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno <= logging.DEBUG and random.random() >= self.debug_sample_rate:
+            self.dropped += 1
+            return False
+
+        if record.levelno < logging.WARNING:
+            key = (record.name, record.lineno)
+            now = time.monotonic()
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.burst, now, 0]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.per_second)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                bucket[2] += 1
+                self.dropped += 1
+                return False
+            bucket[0] = tokens - 1
+            if bucket[2]:
+                record.suppressed = bucket[2]
+                bucket[2] = 0
+
+        record.session_id = SESSION_ID.get()
+        return True
+
+
+class _TimedQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that defers all formatting to the listener and times its own cost"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.emitted = 0
+        self.queue_full = 0
+        self.total_ns = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # the listener lives in this process, so the record can cross as-is
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.queue_full += 1
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        start = time.perf_counter_ns()
+        try:
+            return super().handle(record)
+        finally:
+            self.total_ns += time.perf_counter_ns() - start
+            self.emitted += 1
+
+
+class _RedactingListener(logging.handlers.QueueListener):
+    """
+    Redacts everything a handler could write: the message with its args
+    applied, every extra attribute, and the formatted exception and stack
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = redact(record.getMessage())
+        record.args = None
+        for key, value in list(record.__dict__.items()):
+            if key not in _STANDARD_ATTRS:
+                record.__dict__[key] = _redact_value(value)
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            # formatters print exc_text; without exc_info none can re-format the raw traceback
+            record.exc_info = None
+        if record.exc_text:
+            record.exc_text = redact(record.exc_text)
+        if record.stack_info:
+            record.stack_info = redact(record.stack_info)
+        return record
+
+
+def setup_logging(level: str = LOG_LEVEL, json_output: bool = True):
+    """
+    Route all agent logging through a background thread
+
+    Existing root handlers (including the ones LiveKit installs in job
+    processes) are moved behind a QueueListener, so formatting, redaction and
+    I/O happen off the event loop. Safe to call more than once.
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    if not handlers:
+        stream = logging.StreamHandler()
+        if json_output:
+            stream.setFormatter(JsonFormatter())
+        handlers = [stream]
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    log_queue: queue.Queue = queue.Queue(maxsize=QUEUE_SIZE)
+    _queue_handler = _TimedQueueHandler(log_queue)
+    _queue_handler.addFilter(
+        _SamplingFilter(DEBUG_SAMPLE_RATE, RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)
+    )
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = _RedactingListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging():
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    for handler in _listener.handlers:
+        root.addHandler(handler)
+    _listener = None
+    _queue_handler = None
+
+
+def overhead_stats() -> Dict[str, Any]:
+    """Time spent on the calling thread handing records to the log queue"""
+    if _queue_handler is None:
+        return {}
+    emitted = _queue_handler.emitted
+    sampler = next(iter(_queue_handler.filters), None)
+    return {
+        "records": emitted,
+        "dropped": getattr(sampler, "dropped", 0),
+        "queue_full": _queue_handler.queue_full,
+        "total_ms": round(_queue_handler.total_ns / 1e6, 3),
+        "avg_us": round(_queue_handler.total_ns / emitted / 1e3, 2) if emitted else 0.0,
+    }
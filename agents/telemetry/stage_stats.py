@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import tempfile
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger("stage-stats")
+
+_DEFAULT_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+STATS_DIR = os.environ.get("PIPELINE_STATS_DIR", os.path.join(_DEFAULT_ROOT, "convomate-stage-stats"))
+WINDOW = float(os.environ.get("PIPELINE_STATS_WINDOW", "300"))
+MAX_SAMPLES = 200
+# Fewer samples than this across the host say nothing about the tail
+MIN_SAMPLES = 5
+FLUSH_INTERVAL = 1.0
+# Host-wide decisions taken from these stats, e.g. the active pipeline profile
+STATE_FILE = "state"
+
+
+def _write_json(directory: str, name: str, data: Any):
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, os.path.join(directory, name))
+
+
+class StageLatencyStats:
+    """
+    Recent per-stage latencies of every job process on the host
+
+    Each job process only lives for one session, so its own samples are
+    gone by the time the next session picks a profile. Every process
+    writes its recent samples to its own small file in a shared directory
+    (RAM-backed where available), and percentiles are computed over the
+    files of all processes, within the last WINDOW seconds.
+    """
+
+    def __init__(self, stats_dir: str = STATS_DIR, window: float = WINDOW):
+        self.stats_dir = stats_dir
+        self.window = window
+        self._samples: Dict[str, Deque[Tuple[float, float]]] = {}
+        self._last_flush = 0.0
+
+    def add(self, stage: str, value: float, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._samples.setdefault(stage, deque(maxlen=MAX_SAMPLES)).append((now, value))
+        if now - self._last_flush >= FLUSH_INTERVAL:
+            self.flush(now)
+
+    def flush(self, now: Optional[float] = None):
+        now = time.time() if now is None else now
+        self._last_flush = now
+        data = {
+            stage: [[ts, value] for ts, value in samples if now - ts <= self.window]
+            for stage, samples in self._samples.items()
+        }
+        try:
+            # the pid is read here, not at import: job processes are forked from the worker
+            _write_json(self.stats_dir, f"{os.getpid()}.json", data)
+        except OSError as e:
+            logger.warning(f"Could not write stage latency stats: {e}")
+
+    def load_state(self) -> Dict[str, Any]:
+        """What the last job process on the host decided from these stats"""
+        try:
+            with open(os.path.join(self.stats_dir, STATE_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, state: Dict[str, Any]):
+        try:
+            _write_json(self.stats_dir, STATE_FILE, state)
+        except OSError as e:
+            logger.warning(f"Could not write stage stats state: {e}")
+
+    def percentiles(self, q: float = 95, now: Optional[float] = None) -> Dict[str, float]:
+        now = time.time() if now is None else now
+        merged: Dict[str, list] = {}
+        try:
+            names = os.listdir(self.stats_dir)
+        except FileNotFoundError:
+            return {}
+        for name in names:
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.stats_dir, name)
+            try:
+                # a process that exited long ago
+                if time.time() - os.path.getmtime(path) > self.window:
+                    os.unlink(path)
+                    continue
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for stage, samples in data.items():
+                merged.setdefault(stage, []).extend(
+                    value for ts, value in samples if now - ts <= self.window
+                )
+        return {
+            stage: float(np.percentile(values, q))
+            for stage, values in merged.items()
+            if len(values) >= MIN_SAMPLES
+        }
@@ -0,0 +1,47 @@
+import pytest
+
+from rag.answer_cache import INTENT_RULES_VERSION, AnswerCache, detect_intent
+
+
+@pytest.mark.parametrize(
+    "query,intent",
+    [
+        ("What is the asking price?", "price"),
+        ("how much is it", "price"),
+        ("where is the house located", "location"),
+        ("how many bedrooms does it have", "bedrooms"),
+        ("is it near good schools", "schools"),
+        ("does it have a garage", "parking"),
+        ("how big is the lot", "lot_size"),
+        ("when was it built", "year_built"),
+    ],
+)
+def test_detects_whole_question_intents(query, intent):
+    assert detect_intent(query) == intent
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "where is the laundry room",
+        "how much are property taxes",
+        "how old is the roof",
+        "is the garage heated",
+        "what is the price per square foot",
+        "how big is the lot and how many beds",
+    ],
+)
+def test_other_questions_fall_through_to_retrieval(query):
+    assert detect_intent(query) is None
+
+
+def test_intents_from_older_rules_are_not_loaded(tmp_path):
+    cache = AnswerCache(cache_dir=str(tmp_path))
+    cache.put("listing-1", "v1", "how many bedrooms does it have", "Three bedrooms.")
+    assert AnswerCache(cache_dir=str(tmp_path)).get_by_intent("listing-1", "v1", "how many beds") == "Three bedrooms."
+
+    path = tmp_path / "listing-1.json"
+    path.write_text(path.read_text().replace(
+        f'"intent_rules": {INTENT_RULES_VERSION}', f'"intent_rules": {INTENT_RULES_VERSION - 1}'
+    ))
+    assert AnswerCache(cache_dir=str(tmp_path)).get_by_intent("listing-1", "v1", "how many beds") is None
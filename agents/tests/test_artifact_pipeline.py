@@ -0,0 +1,69 @@
+import gzip
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+from artifacts import pipeline
+from artifacts.pipeline import ArtifactSink, start_artifact_writer
+from shared_cache import ipc
+
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    # JSONL output whether or not pyarrow is installed
+    monkeypatch.setattr(pipeline, "_load_parquet_writer", lambda: None)
+    artifact_dir = str(tmp_path / "artifacts")
+    process = start_artifact_writer(artifact_dir)
+    for _ in range(50):
+        if ipc.running(artifact_dir):
+            break
+        time.sleep(0.05)
+    yield artifact_dir, process
+    if process.is_alive():
+        process.terminate()
+        process.join()
+
+
+def _rows(artifact_dir, process):
+    # close() returned once the writer acknowledged every batch, and the
+    # writer writes what it acknowledged when the worker terminates it
+    process.terminate()
+    process.join()
+    rows = []
+    for path in sorted(Path(artifact_dir).rglob("*.jsonl.gz")):
+        with gzip.open(path, "rt") as f:
+            rows.extend(json.loads(line) for line in f)
+    return rows
+
+
+def test_close_delivers_everything_still_queued(writer):
+    artifact_dir, process = writer
+    sink = ArtifactSink(artifact_dir)
+    artifacts = sink.session("room-1")
+    for turn in range(200):
+        artifacts.emit("transcript", role="user", text="how big is the backyard", turn=turn)
+    artifacts.emit("session_end")
+
+    assert sink.close(timeout=10)
+    assert sink.undelivered == 0
+    rows = _rows(artifact_dir, process)
+    assert len(rows) == 201
+    assert rows[-1]["kind"] == "session_end"
+
+
+def test_a_bad_event_does_not_stop_delivery(writer):
+    artifact_dir, process = writer
+    sink = ArtifactSink(artifact_dir)
+    artifacts = sink.session("room-1")
+    artifacts.emit("tool", callback=lambda: None)
+    for _ in range(50):
+        if sink.undelivered:
+            break
+        time.sleep(0.1)
+    assert sink.undelivered == 1
+
+    artifacts.emit("session_end")
+    assert sink.close(timeout=10)
+    assert [row["kind"] for row in _rows(artifact_dir, process)] == ["session_end"]
@@ -0,0 +1,84 @@
+import threading
+
+from rag.context_packer import ContextPacker, count_tokens, dedupe_sentences, pack_sentences
+
+
+def test_matching_sentences_come_first_in_original_order():
+    chunks = [
+        "The home was built in 1998. The backyard has a pool. Taxes are moderate.",
+        "The pool is heated in winter.",
+    ]
+    budget = count_tokens("The backyard has a pool.") + count_tokens("The pool is heated in winter.") + 2
+    assert pack_sentences("tell me about the pool", chunks, budget) == [
+        "The backyard has a pool.",
+        "The pool is heated in winter.",
+    ]
+
+
+def test_budget_left_over_is_filled_with_other_retrieved_sentences():
+    chunks = ["The backyard has a pool. The home was built in 1998. Taxes are moderate."]
+    packed = pack_sentences("tell me about the pool", chunks, token_budget=1000)
+    assert packed == ["The backyard has a pool.", "The home was built in 1998.", "Taxes are moderate."]
+
+
+def test_sentences_over_budget_are_skipped_not_the_rest():
+    long_sentence = "The pool " + "really " * 100 + "is big."
+    chunks = [f"{long_sentence} The pool has a slide."]
+    assert pack_sentences("pool", chunks, token_budget=20) == ["The pool has a slide."]
+
+
+def test_repeats_from_chunk_overlap_are_dropped():
+    chunks = [
+        "Three bedrooms upstairs. The kitchen has granite counters and a large island.",
+        "granite counters and a large island. The garage fits two cars.",
+    ]
+    assert dedupe_sentences(chunks) == [
+        "Three bedrooms upstairs.",
+        "The kitchen has granite counters and a large island.",
+        "The garage fits two cars.",
+    ]
+
+
+def test_a_sentence_cut_at_a_chunk_boundary_is_kept_whole():
+    chunks = [
+        "Three bedrooms upstairs. The kitchen has granite",
+        "The kitchen has granite counters and a large island. The garage fits two cars.",
+    ]
+    assert dedupe_sentences(chunks) == [
+        "Three bedrooms upstairs.",
+        "The kitchen has granite counters and a large island.",
+        "The garage fits two cars.",
+    ]
+
+
+def test_pieces_of_a_long_sentence_are_joined():
+    chunks = [
+        "The primary suite on the upper floor has a walk in closet",
+        "suite on the upper floor has a walk in closet and a soaking tub.",
+    ]
+    assert dedupe_sentences(chunks) == [
+        "The primary suite on the upper floor has a walk in closet and a soaking tub."
+    ]
+
+
+def test_cache_survives_concurrent_packing_and_lookups():
+    packer = ContextPacker(cache_size=8)
+    errors = []
+
+    def work(n):
+        try:
+            for i in range(300):
+                packer.pack("listing-1", f"question {n} {i}", ["The backyard has a pool."])
+                packer.get_cached("listing-1", f"question {n} {i - 1}")
+                if i % 50 == 0:
+                    packer.invalidate("listing-1")
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(n,)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert packer.stats()["entries"] <= 8
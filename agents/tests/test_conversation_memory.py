@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("livekit.agents")
+pytest.importorskip("livekit.plugins.openai")
+
+from livekit.agents import llm
+
+from memory.conversation import ConversationMemory
+
+
+class _FailingLLM:
+    def chat(self, chat_ctx):
+        raise RuntimeError("summary model unavailable")
+
+
+class _StalledLLM:
+    """Never answers, like a summary request stuck on the network"""
+
+    def chat(self, chat_ctx):
+        return self
+
+    async def __aenter__(self):
+        await asyncio.Event().wait()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _call(memory, chat_ctx, turns):
+    for i in range(turns):
+        role = "user" if i % 2 == 0 else "assistant"
+        text = f"turn {i} about the backyard"
+        chat_ctx.add_message(role=role, content=text)
+        memory.add_turn(role, text)
+
+
+def _conversation(trimmed):
+    return [item.text_content for item in trimmed.items if item.role in ("user", "assistant")]
+
+
+def test_only_the_window_of_turns_is_sent():
+    async def run():
+        memory = ConversationMemory(window_turns=4, summarize_every=2, summary_llm=_FailingLLM())
+        chat_ctx = llm.ChatContext()
+        chat_ctx.add_message(role="system", content="You are a real estate agent.")
+        _call(memory, chat_ctx, 6)
+        await asyncio.sleep(0)
+
+        trimmed = memory.trim_chat_ctx(chat_ctx)
+        assert trimmed.items[0].text_content == "You are a real estate agent."
+        assert _conversation(trimmed) == [f"turn {i} about the backyard" for i in range(2, 6)]
+
+    asyncio.run(run())
+
+
+def test_failed_summaries_fall_back_to_extractive_notes():
+    async def run():
+        memory = ConversationMemory(window_turns=4, summarize_every=2, summary_llm=_FailingLLM())
+        _call(memory, llm.ChatContext(), 6)
+        await asyncio.sleep(0)
+
+        assert "turn 0 about the backyard" in memory.summary
+        assert memory.unsummarized_turns == 4
+
+    asyncio.run(run())
+
+
+def test_a_stalled_summary_does_not_let_the_window_grow():
+    async def run():
+        memory = ConversationMemory(window_turns=4, summarize_every=2, summary_llm=_StalledLLM())
+        chat_ctx = llm.ChatContext()
+        _call(memory, chat_ctx, 30)
+        await asyncio.sleep(0)
+
+        trimmed = memory.trim_chat_ctx(chat_ctx)
+        assert len(_conversation(trimmed)) <= 4 + 2
+        assert "turn 20 about the backyard" in memory.summary
+        assert memory.stats()["fallback_summaries"] == 1
+        await memory.aclose()
+
+    asyncio.run(run())
+
+
+def test_pinned_facts_survive_trimming():
+    memory = ConversationMemory(window_turns=2, summarize_every=2)
+    memory.pin("photos", 12)
+    memory.pin("videos", 0)
+    memory.pin("photos show", "")
+    chat_ctx = llm.ChatContext()
+    chat_ctx.add_message(role="user", content="how many photos are there")
+
+    memory_message = memory.trim_chat_ctx(chat_ctx).items[0]
+    assert memory_message.role == "system"
+    assert memory_message.text_content == "Pinned listing facts:\n- photos: 12\n- videos: 0"
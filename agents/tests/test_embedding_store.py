@@ -0,0 +1,23 @@
+import numpy as np
+
+from rag.embedding_store import EmbeddingStore
+
+
+def _store(tmp_path, version):
+    store = EmbeddingStore(str(tmp_path), dims=8)
+    vectors = np.eye(16, dtype=np.float32)
+    store.write("listing-1", vectors, [{"text": f"chunk {i}"} for i in range(16)], version=version)
+    return store, vectors
+
+
+def test_search_finds_the_nearest_chunk(tmp_path):
+    store, vectors = _store(tmp_path, "2026-01-01T00:00:00")
+    matches = store.search("listing-1", vectors[3], k=2, version="2026-01-01T00:00:00")
+    assert matches[0]["text"] == "chunk 3"
+
+
+def test_store_of_an_edited_listing_is_not_searched(tmp_path):
+    store, vectors = _store(tmp_path, "2026-01-01T00:00:00")
+    assert store.search("listing-1", vectors[3], k=2, version="2026-02-01T00:00:00") is None
+    # without a version to compare against, the store is used
+    assert store.search("listing-1", vectors[3], k=2) is not None
@@ -0,0 +1,108 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+
+from database import listing_notify
+from database.listing_cache import ListingCache
+from shared_cache import ipc
+
+
+def test_invalidate_drops_the_listings_rows():
+    async def run():
+        cache = ListingCache()
+        loads = []
+
+        async def loader():
+            loads.append(1)
+            return {"id": "listing-1", "price": len(loads)}
+
+        assert (await cache.get_or_load("content", "listing-1", loader))["price"] == 1
+        assert (await cache.get_or_load("content", "listing-1", loader))["price"] == 1
+        cache.invalidate("listing-1")
+        assert (await cache.get_or_load("content", "listing-1", loader))["price"] == 2
+        assert cache.stats()["invalidations"] == 1
+
+    asyncio.run(run())
+
+
+def test_a_load_overlapping_an_invalidation_is_not_stored():
+    async def run():
+        cache = ListingCache()
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_loader():
+            started.set()
+            await release.wait()
+            return {"price": "stale"}
+
+        load = asyncio.ensure_future(cache.get_or_load("content", "listing-1", slow_loader))
+        await started.wait()
+        cache.invalidate("listing-1")
+        release.set()
+        assert (await load)["price"] == "stale"
+
+        async def fresh_loader():
+            return {"price": "fresh"}
+
+        assert (await cache.get_or_load("content", "listing-1", fresh_loader))["price"] == "fresh"
+
+    asyncio.run(run())
+
+
+def test_the_relay_forwards_changes_to_every_subscriber(tmp_path):
+    relay_dir = str(tmp_path / "relay")
+    relay = listing_notify.ListingNotifyRelay("postgres://unused", relay_dir)
+    assert ipc.claim(relay_dir)
+    listener = ipc.listen(relay_dir, ipc.create_authkey(relay_dir))
+    threading.Thread(target=relay._accept_forever, args=(listener,), daemon=True).start()
+
+    async def run():
+        received = [[], []]
+        followers = [
+            asyncio.ensure_future(listing_notify.follow(lambda *m, r=r: r.append(m), relay_dir))
+            for r in received
+        ]
+        for _ in range(100):
+            if len(relay._subscribers) == 2:
+                break
+            await asyncio.sleep(0.02)
+        relay._set_listening(True)
+        relay._on_listing_changed(None, 0, listing_notify.LISTING_CHANNEL, "listing-1")
+        for _ in range(100):
+            if all(len(r) >= 3 for r in received):
+                break
+            await asyncio.sleep(0.02)
+        for follower in followers:
+            follower.cancel()
+        return received
+
+    for messages in asyncio.run(run()):
+        assert messages[:3] == [("listening", False), ("listening", True), ("changed", "listing-1")]
+
+
+def test_a_second_relay_leaves_the_running_one_alone(tmp_path):
+    relay_dir = str(tmp_path / "relay")
+    authkey = ipc.create_authkey(relay_dir)
+    # nothing listens there; the relay keeps serving subscribers while it retries
+    args = ("postgresql://127.0.0.1:1/none", relay_dir, authkey)
+    first = multiprocessing.Process(target=listing_notify._run_relay, args=args, daemon=True)
+    first.start()
+    try:
+        for _ in range(100):
+            if ipc.running(relay_dir):
+                break
+            time.sleep(0.05)
+        socket_inode = os.stat(ipc.socket_path(relay_dir)).st_ino
+
+        second = multiprocessing.Process(target=listing_notify._run_relay, args=args)
+        second.start()
+        second.join(timeout=10)
+        assert second.exitcode == 0
+        assert os.stat(ipc.socket_path(relay_dir)).st_ino == socket_inode
+        assert ipc.running(relay_dir)
+    finally:
+        first.terminate()
+        first.join()
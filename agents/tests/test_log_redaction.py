@@ -0,0 +1,65 @@
+import json
+import logging
+import queue
+import sys
+
+from telemetry.logs import JsonFormatter, _RedactingListener
+
+API_KEY = "sk-proj1234abcdefghijklmnop"
+
+
+class _Capture(logging.Handler):
+    def __init__(self, formatter: logging.Formatter):
+        super().__init__()
+        self.setFormatter(formatter)
+        self.lines = []
+
+    def emit(self, record):
+        self.lines.append(self.format(record))
+
+
+def _through_listener(msg="failed", args=(), exc_info=None, extra=None, formatter=None) -> str:
+    """Hand one record to the redacting listener, as setup_logging wires it, and return the output"""
+    capture = _Capture(formatter or JsonFormatter())
+    log_queue: queue.Queue = queue.Queue()
+    listener = _RedactingListener(log_queue, capture)
+    logger = logging.getLogger("test-redaction")
+    log_queue.put(logger.makeRecord(logger.name, logging.ERROR, __file__, 1, msg, args, exc_info, extra=extra))
+    listener.start()
+    listener.stop()
+    return capture.lines[-1]
+
+
+def _raised():
+    try:
+        raise RuntimeError(f"bad key {API_KEY}")
+    except RuntimeError:
+        return sys.exc_info()
+
+
+def test_formatted_args_are_redacted():
+    payload = json.loads(_through_listener("calling with %s", args=(API_KEY,)))
+    assert API_KEY not in payload["msg"]
+    assert "sk-proj1234***" in payload["msg"]
+
+
+def test_extras_are_redacted():
+    payload = json.loads(_through_listener(extra={
+        "request": {"headers": {"Authorization": f"OPENAI_API_KEY={API_KEY}"}, "retries": 2},
+        "urls": ["postgres://agent:hunter2@db/listings"],
+    }))
+    assert API_KEY not in json.dumps(payload)
+    assert payload["request"]["retries"] == 2
+    assert payload["urls"] == ["postgres://agent:***@db/listings"]
+
+
+def test_exceptions_are_redacted():
+    payload = json.loads(_through_listener(exc_info=_raised()))
+    assert "RuntimeError" in payload["exc"]
+    assert API_KEY not in payload["exc"]
+
+
+def test_plain_handlers_get_the_redacted_traceback():
+    line = _through_listener(exc_info=_raised(), formatter=logging.Formatter("%(message)s"))
+    assert "RuntimeError" in line
+    assert API_KEY not in line
@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+pytest.importorskip("livekit.agents")
+pytest.importorskip("psutil")
+
+import pipeline_profiles
+from livekit.agents import metrics
+from pipeline_profiles import FALLBACK_PROFILE, STAGE_BUDGETS, ProfileSelector
+from telemetry.stage_stats import StageLatencyStats
+
+
+@pytest.fixture
+def selector(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_profiles.psutil, "cpu_percent", lambda interval=None: 0.0)
+    return ProfileSelector("balanced", stage_stats=StageLatencyStats(str(tmp_path)))
+
+
+def _finished_session(tmp_path, monkeypatch, pid, ttft):
+    """Samples left behind by another, already finished job process"""
+    monkeypatch.setattr(os, "getpid", lambda: pid)
+    stats = StageLatencyStats(str(tmp_path))
+    for _ in range(20):
+        stats.add("llm_ttft", ttft)
+    stats.flush()
+
+
+def test_switches_once_host_p95_crosses_the_budget(selector, tmp_path, monkeypatch):
+    assert selector.select().name == "balanced"
+
+    _finished_session(tmp_path, monkeypatch, 101, STAGE_BUDGETS["llm_ttft"] * 0.5)
+    assert selector.select().name == "balanced"
+
+    _finished_session(tmp_path, monkeypatch, 102, STAGE_BUDGETS["llm_ttft"] * 2)
+    assert selector.select().name == FALLBACK_PROFILE
+    assert selector.last_switch["reasons"] == ["llm_ttft"]
+
+
+def test_recovers_once_every_stage_is_back_under_budget(selector, tmp_path, monkeypatch):
+    _finished_session(tmp_path, monkeypatch, 101, STAGE_BUDGETS["llm_ttft"] * 2)
+    assert selector.select().name == FALLBACK_PROFILE
+    # every session runs in a fresh job process with a fresh selector
+    selector = ProfileSelector("balanced", stage_stats=StageLatencyStats(str(tmp_path)))
+
+    (tmp_path / "101.json").unlink()
+    _finished_session(tmp_path, monkeypatch, 102, STAGE_BUDGETS["llm_ttft"] * 0.9)
+    assert selector.select().name == FALLBACK_PROFILE
+
+    (tmp_path / "102.json").unlink()
+    _finished_session(tmp_path, monkeypatch, 103, STAGE_BUDGETS["llm_ttft"] * 0.5)
+    assert selector.select().name == "balanced"
+    assert selector.stats()["switches"] == 2
+
+
+def test_busy_host_cpu_switches_to_the_fallback(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_profiles.psutil, "cpu_percent", lambda interval=None: 99.0)
+    selector = ProfileSelector("balanced", stage_stats=StageLatencyStats(str(tmp_path)))
+    for ttfb in [0.1] * 10:
+        selector.observe(metrics.TTSMetrics.model_construct(ttfb=ttfb))
+    selector.flush()
+
+    fresh = ProfileSelector("balanced", stage_stats=StageLatencyStats(str(tmp_path)))
+    assert fresh.select().name == FALLBACK_PROFILE
+    assert fresh.last_switch["reasons"] == ["cpu"]
@@ -0,0 +1,70 @@
+import pytest
+
+from rag.context_packer import count_tokens, pack_sentences
+from rag.query_planner import merge_results, split_query
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        (
+            "what's the price, how big is the lot and is it near schools",
+            ["what's the price", "how big is the lot", "is it near schools"],
+        ),
+        (
+            "what's the price, how big is the lot and are the schools good",
+            ["what's the price", "how big is the lot", "are the schools good"],
+        ),
+        ("does it have a pool? And what about the hoa fees", ["does it have a pool", "what about the hoa fees"]),
+        ("how much is it and how big is the lot and also", ["how much is it", "how big is the lot"]),
+    ],
+)
+def test_compound_questions_are_split(query, expected):
+    assert split_query(query) == expected
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "how many bedrooms does it have",
+        "tell me about the kitchen. Also, where is it?",
+        "what's the price, and the hoa",
+    ],
+)
+def test_single_questions_come_back_unchanged(query):
+    assert split_query(query) == [query]
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        (
+            "what is the price, how big are the bedrooms and are they carpeted",
+            ["what is the price", "how big are the bedrooms and are they carpeted"],
+        ),
+        (
+            "what is the price, tell me about the garage. Where is it",
+            ["what is the price", "tell me about the garage and Where is it"],
+        ),
+    ],
+)
+def test_parts_that_point_back_stay_with_what_they_refer_to(query, expected):
+    assert split_query(query) == expected
+
+
+def test_merge_takes_every_part_best_match_first():
+    merged = merge_results([["a1", "a2", "a3"], ["b1", "a1"]], key=lambda doc: doc)
+    assert merged == ["a1", "b1", "a2", "a3"]
+
+
+def test_packing_keeps_the_best_sentence_of_every_part():
+    pool = ["The backyard pool is heated.", "The backyard pool has a slide.", "The backyard pool is salt water."]
+    school = "The school district nearby is rated very well by parents."
+    chunks = [" ".join(pool), school]
+    query = "tell me about the backyard pool and the school"
+    # room for one pool sentence and the school sentence, or for two pool sentences
+    budget = count_tokens(pool[0]) + count_tokens(school) + 2
+    assert school not in pack_sentences(query, chunks, budget)
+
+    packed = pack_sentences(query, chunks, budget, sub_queries=["tell me about the backyard pool", "the school"])
+    assert packed == [pool[0], school]
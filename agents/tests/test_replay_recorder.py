@@ -0,0 +1,46 @@
+import asyncio
+from datetime import datetime
+
+from database.db import DatabaseManager
+from replay.recorder import SessionRecorder, bind_recorder, load_trace
+
+
+class _Connection:
+    async def fetchrow(self, query, content_id):
+        return {
+            "id": content_id, "url": "https://example.com/1", "name": "1 Main St", "mainImage": None,
+            "description": "A house.", "price": "$500,000", "createdAt": datetime(2026, 1, 1),
+            "updatedAt": datetime(2026, 2, 1), "createdById": "user-1", "image_count": 3, "video_count": 0,
+            "has_images": True, "has_videos": False,
+        }
+
+
+class _Acquire:
+    async def __aenter__(self):
+        return _Connection()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class _Pool:
+    def acquire(self):
+        return _Acquire()
+
+
+def test_database_lookups_are_recorded_for_the_bound_session(tmp_path):
+    recorder = SessionRecorder("room-1", record_dir=str(tmp_path))
+    db = DatabaseManager()
+    db.pool = _Pool()
+
+    async def session():
+        bind_recorder(recorder)
+        # the second lookup is served by the listing cache and recorded all the same
+        for _ in range(2):
+            await db.get_scraped_content_with_media_info("listing-1")
+
+    asyncio.run(session())
+    _, events = load_trace(recorder.save())
+    assert [event["name"] for event in events] == ["listing_snapshot", "listing_snapshot"]
+    assert events[0]["attrs"] == {"content_id": "listing-1"}
+    assert events[0]["result"]["price"] == "$500,000"
@@ -0,0 +1,97 @@
+import asyncio
+import time
+
+import pytest
+
+from resilience.fake_backend import SlowBackend
+from resilience.guard import CLOSED, HALF_OPEN, MIN_HEDGE_SAMPLES, OPEN, DependencyGuard, DependencyUnavailable
+
+
+async def _call(guard, backend, tick):
+    backend.tick = tick
+    return await guard.call(backend.call)
+
+
+def test_breaker_opens_goes_half_open_and_closes():
+    async def run():
+        guard = DependencyGuard("fake", budget=0.5, failure_threshold=3, reset_after=0.1)
+        backend = SlowBackend(base=0.01, tail=0.01, tail_rate=0.0, outage=(0, 3))
+        for tick in range(3):
+            with pytest.raises(ConnectionError):
+                await _call(guard, backend, tick)
+        assert guard.state == OPEN
+
+        # fails fast without reaching the backend
+        requests = backend.requests
+        with pytest.raises(DependencyUnavailable):
+            await _call(guard, backend, 3)
+        assert backend.requests == requests
+        assert guard.short_circuits == 1
+
+        await asyncio.sleep(0.12)
+        backend.base = 0.1
+        trial = asyncio.ensure_future(_call(guard, backend, 3))
+        await asyncio.sleep(0.02)
+        assert guard.state == HALF_OPEN
+        # only the one trial call goes through
+        with pytest.raises(DependencyUnavailable):
+            await _call(guard, backend, 3)
+        assert await trial == "ok"
+        assert guard.state == CLOSED
+
+    asyncio.run(run())
+
+
+def test_a_failed_trial_reopens_the_breaker():
+    async def run():
+        guard = DependencyGuard("fake", budget=0.5, failure_threshold=2, reset_after=0.1)
+        backend = SlowBackend(base=0.01, tail=0.01, tail_rate=0.0, outage=(0, None))
+        for tick in range(2):
+            with pytest.raises(ConnectionError):
+                await _call(guard, backend, tick)
+        await asyncio.sleep(0.12)
+        with pytest.raises(ConnectionError):
+            await _call(guard, backend, 2)
+        assert guard.state == OPEN
+        with pytest.raises(DependencyUnavailable):
+            await _call(guard, backend, 3)
+
+    asyncio.run(run())
+
+
+def test_calls_over_budget_fall_through_to_the_caller():
+    async def run():
+        guard = DependencyGuard("fake", budget=0.05)
+        backend = SlowBackend(base=0.01, tail=1.0, tail_rate=1.0)
+        started = time.monotonic()
+        with pytest.raises(DependencyUnavailable):
+            await _call(guard, backend, 0)
+        assert time.monotonic() - started < 0.5
+        assert guard.timeouts == 1
+        assert guard.state == CLOSED
+
+    asyncio.run(run())
+
+
+def test_a_hedge_wins_over_a_slow_primary():
+    async def run():
+        guard = DependencyGuard("fake", budget=2.0, hedge=True)
+        backend = SlowBackend(base=0.01, tail=1.0, tail_rate=0.0)
+        for tick in range(MIN_HEDGE_SAMPLES):
+            await _call(guard, backend, tick)
+
+        attempts = []
+
+        async def slow_then_fast():
+            # the original request hits the slow tail, the hedge does not
+            backend.tail_rate = 0.0 if attempts else 1.0
+            attempts.append(time.monotonic())
+            return await backend.call()
+
+        started = time.monotonic()
+        assert await guard.call(slow_then_fast) == "ok"
+        assert time.monotonic() - started < 0.5
+        assert len(attempts) == 2
+        assert guard.hedges == 1 and guard.hedge_wins == 1
+
+    asyncio.run(run())
@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+import stat
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import numpy as np
+import pytest
+
+from shared_cache import ipc
+from shared_cache.cache import FRAMES, SharedCache, _run_writer, start_cache_writer
+
+
+@pytest.fixture
+def writer(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    process = start_cache_writer(cache_dir, max_bytes=1024 * 1024)
+    for _ in range(50):
+        if os.path.exists(ipc.socket_path(cache_dir)):
+            break
+        time.sleep(0.05)
+    yield cache_dir
+    process.terminate()
+    process.join()
+
+
+def test_entries_round_trip_through_the_writer(writer):
+    cache = SharedCache(writer)
+    cache.put(FRAMES, "room-1", np.arange(6, dtype=np.float32))
+    for _ in range(50):
+        array = cache.get(FRAMES, "room-1")
+        if array is not None:
+            break
+        time.sleep(0.05)
+    assert array is not None and array.tolist() == [0, 1, 2, 3, 4, 5]
+
+
+def test_socket_and_key_are_private(writer):
+    mode = os.stat(os.path.dirname(ipc.socket_path(writer))).st_mode
+    assert stat.S_IMODE(mode) == 0o700
+
+
+class _Payload:
+    """Unpickling this runs code in the receiving process"""
+
+    def __init__(self, marker: str):
+        self.marker = marker
+
+    def __reduce__(self):
+        return os.mkdir, (self.marker,)
+
+
+def test_connections_without_the_authkey_are_never_unpickled(writer, tmp_path):
+    marker = str(tmp_path / "unpickled")
+    try:
+        Client(ipc.socket_path(writer), family="AF_UNIX").send(_Payload(marker))
+    except OSError:
+        pass
+    with pytest.raises(AuthenticationError):
+        Client(ipc.socket_path(writer), family="AF_UNIX", authkey=b"guess")
+    time.sleep(0.2)
+    assert not os.path.exists(marker)
+    # the writer keeps serving everyone else
+    ipc.connect(writer).close()
+
+
+def test_a_second_writer_leaves_the_running_one_alone(writer):
+    socket_inode = os.stat(ipc.socket_path(writer)).st_ino
+    # what two workers booting together would do, both past the running check
+    second = multiprocessing.Process(target=_run_writer, args=(writer, 1024 * 1024, ipc.read_authkey(writer)))
+    second.start()
+    second.join(timeout=10)
+    assert second.exitcode == 0
+    assert os.stat(ipc.socket_path(writer)).st_ino == socket_inode
+    ipc.connect(writer).close()
@@ -0,0 +1,44 @@
+import os
+import time
+
+from telemetry.stage_stats import MIN_SAMPLES, StageLatencyStats
+
+
+def _record(stats, monkeypatch, pid, stage, values, now=None):
+    # each job process writes its own file, named after its pid
+    monkeypatch.setattr(os, "getpid", lambda: pid)
+    for value in values:
+        stats.add(stage, value, now=now)
+    stats.flush(now)
+
+
+def test_percentiles_merge_every_process(tmp_path, monkeypatch):
+    _record(StageLatencyStats(str(tmp_path)), monkeypatch, 101, "llm_ttft", [0.2] * 10)
+    _record(StageLatencyStats(str(tmp_path)), monkeypatch, 102, "llm_ttft", [3.0] * 10)
+
+    p95 = StageLatencyStats(str(tmp_path)).percentiles(95)
+    assert p95["llm_ttft"] == 3.0
+    assert StageLatencyStats(str(tmp_path)).percentiles(50)["llm_ttft"] > 0.2
+
+
+def test_too_few_samples_say_nothing(tmp_path, monkeypatch):
+    _record(StageLatencyStats(str(tmp_path)), monkeypatch, 101, "tts_ttfb", [5.0] * (MIN_SAMPLES - 1))
+    assert StageLatencyStats(str(tmp_path)).percentiles(95) == {}
+
+
+def test_samples_outside_the_window_are_ignored(tmp_path, monkeypatch):
+    stats = StageLatencyStats(str(tmp_path), window=60)
+    _record(stats, monkeypatch, 101, "eou_delay", [4.0] * 10, now=time.time() - 120)
+    _record(StageLatencyStats(str(tmp_path), window=60), monkeypatch, 102, "eou_delay", [0.5] * 10)
+
+    assert stats.percentiles(95)["eou_delay"] == 0.5
+
+
+def test_files_of_long_gone_processes_are_removed(tmp_path, monkeypatch):
+    _record(StageLatencyStats(str(tmp_path)), monkeypatch, 101, "llm_ttft", [0.2] * 10)
+    path = tmp_path / "101.json"
+    stale = time.time() - 1000
+    os.utime(path, (stale, stale))
+
+    assert StageLatencyStats(str(tmp_path), window=300).percentiles(95) == {}
+    assert not path.exists()
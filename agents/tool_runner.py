@@ -0,0 +1,165 @@
+import asyncio
+import functools
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from artifacts.pipeline import null_artifacts
+from media.phrase_cache import Phrase, phrase_cache
+
+logger = logging.getLogger("tool-runner")
+
+# Silence longer than this after a tool call starts is dead air worth covering
+FILLER_THRESHOLD = float(os.environ.get("TOOL_FILLER_THRESHOLD", "0.5"))
+# Calls per tool before its own latency history replaces the default timer
+MIN_SAMPLES = 5
+LATENCY_WINDOW = 50
+
+FILLER_PHRASES = [
+    "Hold on, I'm pulling that up for you right now!",
+    "One second, this is going to be worth it!",
+    "Give me just a moment, I'm on it!",
+]
+
+
+class ToolLatency:
+    """Recent durations of one tool and what its fillers did"""
+
+    def __init__(self):
+        self.samples: deque = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.fillers = 0
+        self.fillers_cut = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        return float(np.percentile(self.samples, q))
+
+    def filler_delay(self, threshold: float) -> Optional[float]:
+        """When to start a filler for the next call, or None for a tool that reliably answers in time"""
+        p50 = self.quantile(50)
+        if p50 is None:
+            return threshold
+        if p50 >= threshold:
+            # usually slow: fill straight away rather than after a gap
+            return 0.0
+        if self.quantile(90) >= threshold:
+            return threshold
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        p50, p90 = self.quantile(50), self.quantile(90)
+        return {
+            "calls": self.calls,
+            "p50_ms": round(p50 * 1000) if p50 is not None else None,
+            "p90_ms": round(p90 * 1000) if p90 is not None else None,
+            "fillers": self.fillers,
+            "fillers_cut": self.fillers_cut,
+        }
+
+
+class FillerAudio:
+    """Filler phrases for each voice, loaded from the phrase cache and kept in memory"""
+
+    def __init__(self, phrases: List[str] = FILLER_PHRASES):
+        self.phrases = phrases
+        self._clips: Dict[str, List[Phrase]] = {}
+        self._warming: Dict[str, asyncio.Task] = {}
+
+    def warm(self, voice_key: str, tts) -> None:
+        """Load the phrases in the background; fillers are skipped until they are ready"""
+        if voice_key in self._clips or voice_key in self._warming:
+            return
+        task = asyncio.create_task(self._load(voice_key, tts))
+        self._warming[voice_key] = task
+        task.add_done_callback(lambda _: self._warming.pop(voice_key, None))
+
+    async def _load(self, voice_key: str, tts):
+        clips = []
+        for text in self.phrases:
+            try:
+                phrase = await phrase_cache.load(voice_key, tts, text)
+            except Exception as e:
+                logger.warning(f"Could not synthesize filler '{text}': {e}")
+                continue
+            if phrase is not None:
+                clips.append(phrase)
+        if clips:
+            self._clips[voice_key] = clips
+            logger.info(f"Loaded {len(clips)} filler phrases for {voice_key}")
+
+    def pick(self, voice_key: Optional[str]) -> Optional[Phrase]:
+        clips = self._clips.get(voice_key)
+        return random.choice(clips) if clips else None
+
+
+class _Filler:
+    def __init__(self, agent, latency: ToolLatency, delay: float):
+        self.agent = agent
+        self.latency = latency
+        self.handle = None
+        self.task = asyncio.create_task(self._run(delay))
+
+    async def _run(self, delay: float):
+        await asyncio.sleep(delay)
+        phrase = filler_audio.pick(getattr(self.agent, "voice_key", None))
+        if phrase is None:
+            return
+        # kept out of the chat context so the LLM never sees or repeats it
+        self.handle = self.agent.session.say(
+            phrase.text, audio=phrase.frames(), allow_interruptions=True, add_to_chat_ctx=False
+        )
+        self.latency.fillers += 1
+
+    def stop(self):
+        self.task.cancel()
+        if self.handle is not None and not self.handle.done():
+            self.handle.interrupt()
+            self.latency.fillers_cut += 1
+
+
+def with_filler(fn):
+    """
+    Time a tool and cover its silence with a cached filler phrase
+
+    Goes under @function_tool. Each tool's recent durations decide whether
+    a call gets a filler and when it starts; the filler is interrupted as
+    soon as the tool returns.
+    """
+    name = fn.__name__
+
+    @functools.wraps(fn)
+    async def wrapper(self, *args, **kwargs):
+        latency = tool_latency.setdefault(name, ToolLatency())
+        latency.calls += 1
+        delay = latency.filler_delay(FILLER_THRESHOLD)
+        filler = _Filler(self, latency, delay) if delay is not None else None
+        started = time.monotonic()
+        try:
+            return await fn(self, *args, **kwargs)
+        finally:
+            duration = time.monotonic() - started
+            latency.samples.append(duration)
+            if filler is not None:
+                filler.stop()
+            getattr(self, "artifacts", null_artifacts).emit(
+                "tool", name=name, duration_s=round(duration, 4),
+                filler=filler is not None and filler.handle is not None,
+            )
+
+    return wrapper
+
+
+def tool_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: latency.stats() for name, latency in tool_latency.items()}
+
+
+# Shared by every session in the job process
+tool_latency: Dict[str, ToolLatency] = {}
+filler_audio = FillerAudio()
@@ -0,0 +1,36 @@
+-- Notify the agents' listing cache when a listing or its media change.
+-- The payload is the affected "ScrapedContent".id.
+CREATE OR REPLACE FUNCTION "public"."notify_listing_changed"() RETURNS trigger AS $$
+BEGIN
+    IF TG_TABLE_NAME = 'ScrapedContent' THEN
+        IF TG_OP = 'DELETE' THEN
+            PERFORM pg_notify('listing_changed', OLD."id");
+        ELSE
+            PERFORM pg_notify('listing_changed', NEW."id");
+        END IF;
+    ELSE
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM pg_notify('listing_changed', OLD."scrapedContentId");
+        END IF;
+        IF TG_OP <> 'DELETE' THEN
+            PERFORM pg_notify('listing_changed', NEW."scrapedContentId");
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- CreateTrigger
+CREATE TRIGGER "ScrapedContent_notify_listing_changed"
+AFTER INSERT OR UPDATE OR DELETE ON "public"."ScrapedContent"
+FOR EACH ROW EXECUTE FUNCTION "public"."notify_listing_changed"();
+
+-- CreateTrigger
+CREATE TRIGGER "Image_notify_listing_changed"
+AFTER INSERT OR UPDATE OR DELETE ON "public"."Image"
+FOR EACH ROW EXECUTE FUNCTION "public"."notify_listing_changed"();
+
+-- CreateTrigger
+CREATE TRIGGER "Video_notify_listing_changed"
+AFTER INSERT OR UPDATE OR DELETE ON "public"."Video"
+FOR EACH ROW EXECUTE FUNCTION "public"."notify_listing_changed"();